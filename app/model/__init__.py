@@ -1,22 +1,53 @@
-
 from app.model.vocabulary import Vocabulary
 from app.model.syllabary import Syllabary
+from app.model.dbms import data_version, cache_version, set_cache_version, update_rows
 from typing import Optional
 
 
 class Model:
 
+    # The vocabulary and syllabary are loaded once and shared by every Model. They are reloaded when the database
+    # has changed since they were loaded (e.g. by store.update_database()), going by app.model.dbms.data_version();
+    # the app's own writes (see app.model.dbms.update_rows()) don't count, since what they write is already in
+    # memory. Quiz results that haven't been saved yet are carried over to the reloaded vocabulary and syllabary.
+
     _vocabulary: Optional[Vocabulary] = None
     _syllabary: Optional[Syllabary] = None
 
+    @staticmethod
+    def _refresh() -> None:
+
+        version = data_version()
+        if version == cache_version():
+            return
+
+        # The version is taken before anything is reloaded, so a change made while reloading is picked up next time
+        set_cache_version(version)
+        vocabulary, syllabary = Model._vocabulary, Model._syllabary
+        Model._vocabulary = None
+        Model._syllabary = None
+        Vocabulary.invalidate()
+        Syllabary.invalidate()
+
+        if vocabulary is not None and vocabulary.is_dirty:
+            Model._vocabulary = Vocabulary()
+            Model._vocabulary.keep_statistics(vocabulary.dirty_words)
+        if syllabary is not None and syllabary.is_dirty:
+            Model._syllabary = Syllabary()
+            Model._syllabary.keep_statistics(syllabary.dirty_characters)
+
+        return
+
     @property
     def vocabulary(self) -> Vocabulary:
+        Model._refresh()
         if Model._vocabulary is None:
             Model._vocabulary = Vocabulary()
         return Model._vocabulary
 
     @property
     def syllabary(self) -> Syllabary:
+        Model._refresh()
         if Model._syllabary is None:
             Model._syllabary = Syllabary()
         return Model._syllabary
@@ -27,9 +58,17 @@ class Model:
 
     def save(self) -> None:
 
-        if self.syllabary.is_dirty:
-            self.syllabary.save()
-        if self.vocabulary.is_dirty:
-            self.vocabulary.save()
+        # The statistics of every dirty character and word are written in one transaction (one executemany per
+        # table) and only marked as saved once it has committed. Characters and words that have been deleted from
+        # the database in the meantime are skipped and dropped from the caches.
+        characters = self.syllabary.dirty_characters
+        words = self.vocabulary.dirty_words
+        if characters or words:
+            missing = update_rows({'kana': [(c.id, c.statistic_columns) for c in characters],
+                                   'vocab': [(w.id, w.statistic_columns) for w in words]})
+            self.syllabary.drop(missing.get('kana', []))
+            self.vocabulary.drop(missing.get('vocab', []))
+            for item in characters + words:
+                item.statistics.synced()
 
         return
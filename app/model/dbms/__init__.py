@@ -1,7 +1,10 @@
 
 import os
+import json
 import sqlite3
 from sqlite3 import Connection, Cursor
+from threading import Lock
+from typing import Optional
 from app import app
 from app.utils import FilePaths as files, debug_msg, tracer
 from app.utils.exceptions import DatabaseExists
@@ -43,10 +46,14 @@ class _Schemas:
     )
 
 
+def _database_path() -> str:
+    return files.test_database.full_path if app.config['USE_TEST_DB'] else files.prod_database.full_path
+
+
 @tracer
 def _connect() -> Connection:
 
-    db_path = files.test_database.full_path if app.config['USE_TEST_DB'] else files.prod_database.full_path
+    db_path = _database_path()
     dbcon = sqlite3.connect(db_path)
     dbcon.execute('PRAGMA foreign_keys=ON;')
 
@@ -121,7 +128,7 @@ def _insert_test_rows(csr: Cursor):
 @tracer
 def create():
 
-    dbms_path = files.test_database.full_path if app.config['USE_TEST_DB'] else files.prod_database.full_path
+    dbms_path = _database_path()
 
     debug_msg('creating database')
     debug_msg(f'app.config["USE_TEST_DB"] = {app.config["USE_TEST_DB"]}')
@@ -150,6 +157,70 @@ def create():
     return
 
 
+# PRAGMA data_version only changes for commits made by *other* connections, and its values are only comparable
+# on the connection they were read from, so one connection is kept open just for reading it. (Every other
+# function here opens a connection of its own, so their commits count.) The database file's identity is part of
+# the version too: a database that is deleted and recreated, or replaced by a restored backup, is a new file that
+# the version connection has to be reopened on.
+_version_lock = Lock()
+_version_connection: Optional[Connection] = None
+_version_file: Optional[tuple] = None  # (path, device, inode) of the file _version_connection is open on
+
+
+def data_version() -> Optional[tuple]:
+
+    # Returns a value that changes whenever the contents of the database may have changed since it was last
+    # called, or None if there is no database. Cheap enough to call on every request: a stat and a pragma.
+    global _version_connection, _version_file
+
+    db_path = _database_path()
+    try:
+        stat = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    file = (db_path, stat.st_dev, stat.st_ino)
+
+    with _version_lock:
+        if _version_connection is None or _version_file != file:
+            if _version_connection is not None:
+                _version_connection.close()
+            _version_connection = sqlite3.connect(db_path, check_same_thread=False)
+            _version_file = file
+        version = _version_connection.execute('PRAGMA data_version').fetchone()[0]
+
+    return file + (version,)
+
+
+# The data version the model's caches (see app.model.Model) are current with. A write made here doesn't make
+# them stale, since what it writes is already in them; so long as the database was at the caches' version when
+# the write started (i.e. nothing else had changed it), the caches are moved on to the version after the write.
+_cache_version: Optional[tuple] = None
+
+
+def cache_version() -> Optional[tuple]:
+    return _cache_version
+
+
+def set_cache_version(version: Optional[tuple]) -> None:
+    global _cache_version
+    _cache_version = version
+    return
+
+
+def _begin_write(dbcon: Connection) -> Optional[tuple]:
+    # Takes the write lock straight away, so that nothing else can commit between reading the version and
+    # committing the write; returns the version the write starts from
+    dbcon.execute('BEGIN IMMEDIATE')
+    return data_version()
+
+
+def _written(version: Optional[tuple]) -> None:
+    # Called once a write that started from version has committed
+    if version is not None and version == _cache_version:
+        set_cache_version(data_version())
+    return
+
+
 @tracer
 def _fetch_all(select_stmt: str) -> list[tuple]:
 
@@ -206,6 +277,7 @@ def update_row(table: str, rec_id: int, col_value_map: dict[str, int]) -> None:
     stmt = f'UPDATE {table} SET {column_set} WHERE _ROWID_ = {rec_id}'
 
     dbcon = _connect()
+    version = _begin_write(dbcon)
     csr = dbcon.cursor()
 
     csr.execute(stmt)
@@ -214,5 +286,48 @@ def update_row(table: str, rec_id: int, col_value_map: dict[str, int]) -> None:
     csr.close()
     dbcon.commit()
     dbcon.close()
+    _written(version)
 
     return
+
+
+@tracer
+def update_rows(table_rows: dict[str, list[tuple[int, dict[str, int]]]]) -> dict[str, list[int]]:
+
+    # Updates many rows, of one or more tables, in a single transaction: table_rows maps a table name to a list of
+    # (row id, column value map) pairs, and each table's rows are written with one parameterized executemany
+    # (so every row for a table must set the same columns). A row that is no longer in its table (e.g. a word
+    # deleted by a sync since it was loaded) is skipped and the rest are still written; the ids of the rows
+    # skipped are returned by table.
+    for table, rows in table_rows.items():
+        if rows and any(list(cols.keys()) != list(rows[0][1].keys()) for _, cols in rows):
+            raise ValueError(f'update_rows(): the rows for table {table} do not all set the same columns')
+
+    dbcon = _connect()
+    version = _begin_write(dbcon)
+    csr = dbcon.cursor()
+    missing: dict[str, list[int]] = {}
+
+    try:
+        for table, rows in table_rows.items():
+            if not rows:
+                continue
+            columns = list(rows[0][1].keys())
+            column_set = ', '.join([f'{col_name} = ?' for col_name in columns])
+            stmt = f'UPDATE {table} SET {column_set} WHERE _ROWID_ = ?'
+            csr.executemany(stmt, [[cols[c] for c in columns] + [rec_id] for rec_id, cols in rows])
+            if csr.rowcount != len(rows):
+                csr.execute(f'SELECT j.value FROM json_each(?) AS j '
+                            f'WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE _ROWID_ = j.value)',
+                            [json.dumps([rec_id for rec_id, _ in rows])])
+                missing[table] = [r[0] for r in csr.fetchall()]
+        dbcon.commit()
+    except BaseException:
+        dbcon.rollback()
+        raise
+    finally:
+        csr.close()
+        dbcon.close()
+    _written(version)
+
+    return missing
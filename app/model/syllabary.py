@@ -1,6 +1,6 @@
 
 from app.model.statistic import Statistic
-from app.model.dbms import fetch_kana, update_row, fetch_kana_categories
+from app.model.dbms import fetch_kana, update_row, update_rows, fetch_kana_categories
 from app.utils import debug_msg
 from collections import UserList
 from typing import Optional
@@ -58,14 +58,17 @@ class Character:
     def is_dirty(self) -> bool:
         return self._stats.is_dirty
 
-    def update(self) -> None:
-        cols = {
+    @property
+    def statistic_columns(self) -> dict[str, int]:
+        return {
             'quizzed': self.statistics.quizzed,
             'correct': self.statistics.correct,
             'consecutive_correct': self.statistics.consecutive_correct,
             'consecutive_wrong': self.statistics.consecutive_incorrect
         }
-        update_row('kana', self.id, cols)
+
+    def update(self) -> None:
+        update_row('kana', self.id, self.statistic_columns)
         self.statistics.synced()
         return
 
@@ -96,20 +99,50 @@ class Syllabary(UserList):
     def categories(self) -> list[str]:
         raise NotImplementedError('syllabary.py/Syllabary.categories')
 
+    @staticmethod
+    def invalidate() -> None:
+        # The next Syllabary created loads the characters from the database again
+        Syllabary._characters = None
+        return
+
     @property
     def is_dirty(self) -> bool:
         return any([c.is_dirty for c in self.data])
 
+    @property
+    def dirty_characters(self) -> list[Character]:
+        return [c for c in self.data if c.is_dirty]
+
+    def keep_statistics(self, characters: list[Character]) -> None:
+        # Carries the statistics of characters loaded before a reload (e.g. quiz results not saved yet) over to the
+        # same characters, going by row id and romaji, in this syllabary; characters no longer in the database are
+        # left behind
+        statistics = {(c.id, c.romaji): c.statistics for c in characters}
+        for character in self.data:
+            if (character.id, character.romaji) in statistics:
+                character._stats = statistics[(character.id, character.romaji)]
+        return
+
+    def drop(self, character_ids: list[int]) -> None:
+        # Forgets characters that are no longer in the database (e.g. deleted by a sync since they were loaded)
+        ids = set(character_ids)
+        self.data[:] = [c for c in self.data if c.id not in ids]
+        if Syllabary._characters is not None:
+            Syllabary._characters[:] = [c for c in Syllabary._characters if c.id not in ids]
+        return
+
     def save(self) -> None:
 
-        n = 0
         debug_msg('saving alphabet')
 
-        for character in self.data:
-            if character.is_dirty:
-                character.update()
-                n += 1
+        # All the dirty characters are written in one transaction, and only marked as saved once it has committed;
+        # characters that have been deleted from the database in the meantime are dropped
+        characters = self.dirty_characters
+        missing = update_rows({'kana': [(c.id, c.statistic_columns) for c in characters]}) if characters else {}
+        self.drop(missing.get('kana', []))
+        for character in characters:
+            character.statistics.synced()
 
-        debug_msg(f'done saving alphabet; {n} characters updated')
+        debug_msg(f'done saving alphabet; {len(characters)} characters updated')
 
         return
@@ -1,6 +1,6 @@
 
 from app.model.statistic import Statistic
-from app.model.dbms import fetch_vocab, fetch_parts_of_speech, fetch_word_tags, update_row
+from app.model.dbms import fetch_vocab, fetch_parts_of_speech, fetch_word_tags, update_row, update_rows
 from collections import UserList
 from typing import Optional
 from app.utils import debug_msg
@@ -64,14 +64,17 @@ class Word:
     def is_dirty(self) -> bool:
         return self.statistics.is_dirty
 
-    def update(self) -> None:
-        cols = {
+    @property
+    def statistic_columns(self) -> dict[str, int]:
+        return {
             'quizzed': self.statistics.quizzed,
             'correct': self.statistics.correct,
             'consecutive_correct': self.statistics.consecutive_correct,
             'consecutive_wrong': self.statistics.consecutive_incorrect
         }
-        update_row('vocab', self.id, cols)
+
+    def update(self) -> None:
+        update_row('vocab', self.id, self.statistic_columns)
         self.statistics.synced()
         return
 
@@ -115,20 +118,49 @@ class Vocabulary(UserList):
         tags = sorted(list(set(tags)))
         return tags
 
+    @staticmethod
+    def invalidate() -> None:
+        # The next Vocabulary created loads the words from the database again
+        Vocabulary._words = None
+        return
+
     @property
     def is_dirty(self) -> bool:
         return any([w.is_dirty for w in self.data])
 
+    @property
+    def dirty_words(self) -> list[Word]:
+        return [w for w in self.data if w.is_dirty]
+
+    def keep_statistics(self, words: list[Word]) -> None:
+        # Carries the statistics of words loaded before a reload (e.g. quiz results not saved yet) over to the same
+        # words, going by row id and kana, in this vocabulary; words no longer in the database are left behind
+        statistics = {(w.id, w.kana): w.statistics for w in words}
+        for word in self.data:
+            if (word.id, word.kana) in statistics:
+                word._statistics = statistics[(word.id, word.kana)]
+        return
+
+    def drop(self, word_ids: list[int]) -> None:
+        # Forgets words that are no longer in the database (e.g. deleted by a sync since they were loaded)
+        ids = set(word_ids)
+        self.data[:] = [w for w in self.data if w.id not in ids]
+        if Vocabulary._words is not None:
+            Vocabulary._words[:] = [w for w in Vocabulary._words if w.id not in ids]
+        return
+
     def save(self) -> None:
 
-        n = 0
         debug_msg('saving vocabulary')
 
-        for word in self.data:
-            if word.is_dirty:
-                word.update()
-                n += 1
+        # All the dirty words are written in one transaction, and only marked as saved once it has committed; words
+        # that have been deleted from the database in the meantime are dropped
+        words = self.dirty_words
+        missing = update_rows({'vocab': [(w.id, w.statistic_columns) for w in words]}) if words else {}
+        self.drop(missing.get('vocab', []))
+        for word in words:
+            word.statistics.synced()
 
-        debug_msg(f'done saving vocabulary; {n} characters updated')
+        debug_msg(f'done saving vocabulary; {len(words)} words updated')
 
         return
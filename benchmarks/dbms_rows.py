@@ -0,0 +1,68 @@
+# Benchmark: memory and throughput of fetch_all('vocab') with the list-based Row vs. the tuple-based Record.
+#
+# Run from the repository root:
+#     python -m benchmarks.dbms_rows [number-of-rows]
+
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from store._data_files import DataFiles as _files
+from store._schema import TABLE_SCHEMAS
+import store.dbms as dbms
+
+
+def _populate(num_rows: int) -> None:
+    dbms.create_database()
+    dbms.create_table('vocab', TABLE_SCHEMAS['vocab'])
+    width = len(TABLE_SCHEMAS['vocab'])
+    rows = [dbms.Row([f'english {i}', f'romaji {i}', f'kana {i}', f'kanji {i}', f'pos-{i % 5}'] +
+                     [0] * (width - 5)) for i in range(num_rows)]
+    dbms.insert_many('vocab', TABLE_SCHEMAS['vocab'], rows)
+    return
+
+
+def _measure(row_type: type, repeat: int = 3) -> tuple[float, int]:
+
+    # Throughput: best of a few runs
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = dbms.fetch_all('vocab', row_type=row_type)
+        best = min(best, time.perf_counter() - start)
+        del rows
+
+    # Memory: peak traced allocation while fetching (the fetched rows are still alive at that point)
+    gc.collect()
+    tracemalloc.start()
+    rows = dbms.fetch_all('vocab', row_type=row_type)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+
+    return best, peak
+
+
+def main(num_rows: int) -> None:
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _files.database = os.path.join(tmp, 'bench.sqlite3')
+        _populate(num_rows)
+
+        results = {name: _measure(row_type) for name, row_type in (('Row', dbms.Row), ('Record', dbms.Record))}
+        dbms.close_connections()
+
+    print(f"fetch_all('vocab') with {num_rows} rows")
+    for name, (elapsed, peak) in results.items():
+        print(f'  {name:<8} {elapsed:7.3f}s  ({num_rows / elapsed:9.0f} rows/s)  peak memory {peak / 2 ** 20:7.1f} MiB')
+    (row_time, row_peak), (record_time, record_peak) = results['Row'], results['Record']
+    print(f'  Record vs Row: {row_time / record_time:.2f}x faster, {record_peak / row_peak:.0%} of the memory')
+
+    return
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,85 @@
+# Micro-benchmark: string-interpolated vs. parameterized UPDATE statements.
+#
+# The interpolated form is the statement store.dbms.update() used to build (every row id and value baked into
+# the SQL text, so every statement is unique and has to be prepared from scratch). The parameterized form is
+# what it builds now (one SQL text per table/column set, prepared once per connection and reused).
+#
+# Run from the repository root:
+#     python -m benchmarks.dbms_statements [number-of-rows]
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from store._data_files import DataFiles as _files
+import store.dbms as dbms
+
+
+_COLS = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT,
+                                'col2': dbms.ColumnTypes.TEXT,
+                                'col3': dbms.ColumnTypes.INTEGER})
+
+
+def _interpolated_update(crs: sqlite3.Cursor, row_id: int, row: list) -> None:
+    columns = []
+    for col_name, value in zip(_COLS.keys(), row):
+        if value is None:
+            columns.append(f'{col_name} = NULL')
+        elif _COLS[col_name] == dbms.ColumnTypes.TEXT:
+            columns.append(f'{col_name} = "{value}"')
+        else:
+            columns.append(f'{col_name} = {value}')
+    crs.execute(f'UPDATE bench SET {", ".join(columns)} WHERE _ROWID_ = {row_id}')
+
+
+def _parameterized_update(crs: sqlite3.Cursor, row_id: int, row: list) -> None:
+    crs.execute('UPDATE bench SET col1 = ?, col2 = ?, col3 = ? WHERE _ROWID_ = ?', row + [row_id])
+
+
+def _time_raw(path: str, update, num_rows: int) -> float:
+    connection = sqlite3.connect(path)
+    crs = connection.cursor()
+    start = time.perf_counter()
+    for i in range(1, num_rows + 1):
+        update(crs, i, [f'updated {i}', f'value {i}', i * 2])
+    connection.commit()
+    elapsed = time.perf_counter() - start
+    connection.close()
+    return elapsed
+
+
+def _time_dbms(num_rows: int) -> float:
+    start = time.perf_counter()
+    with dbms.transaction():
+        for i in range(1, num_rows + 1):
+            dbms.update('bench', _COLS, row_id=i, row=dbms.Row([f'again {i}', f'value {i}', i * 3]))
+    return time.perf_counter() - start
+
+
+def main(num_rows: int) -> None:
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _files.database = os.path.join(tmp, 'bench.sqlite3')
+        dbms.create_database()
+        dbms.create_table('bench', _COLS)
+        dbms.insert_many('bench', _COLS, [dbms.Row([f'row {i}', f'value {i}', i]) for i in range(num_rows)])
+        dbms.close_connections()
+
+        interpolated = _time_raw(_files.database, _interpolated_update, num_rows)
+        parameterized = _time_raw(_files.database, _parameterized_update, num_rows)
+        through_dbms = _time_dbms(num_rows)
+        dbms.close_connections()
+
+    print(f'{num_rows} single-row updates in one transaction')
+    print(f'  interpolated SQL text:        {interpolated:8.3f}s  ({num_rows / interpolated:10.0f} rows/s)')
+    print(f'  parameterized SQL text:       {parameterized:8.3f}s  ({num_rows / parameterized:10.0f} rows/s)')
+    print(f'  store.dbms.update (pooled):   {through_dbms:8.3f}s  ({num_rows / through_dbms:10.0f} rows/s)')
+    print(f'  parameterized speedup:        {interpolated / parameterized:8.2f}x')
+
+    return
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
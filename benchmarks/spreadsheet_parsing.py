@@ -0,0 +1,83 @@
+# Benchmark: parsing a multi-sheet vocabulary workbook serially (import_spreadsheet), with its sheets spread
+# over a pool of worker processes (import_spreadsheets) and from the on-disk cache.
+#
+# Run from the repository root:
+#     python -m benchmarks.spreadsheet_parsing [number-of-sheets] [rows-per-sheet]
+#
+# The speedup from the process pool is bounded by the number of CPUs (and the number of sheets).
+
+import os
+import sys
+import tempfile
+import time
+
+from numbers_parser import Document
+
+from store.spreadsheet import import_spreadsheet
+from store.spreadsheet import import_spreadsheets
+
+_COLUMNS = ['english', 'romaji', 'kana', 'kanji', 'part of speech', 'tags', 'note']
+
+
+def _write_workbook(path: str, num_sheets: int, rows_per_sheet: int) -> None:
+
+    doc = Document(num_header_rows=1, num_header_cols=0, num_rows=rows_per_sheet + 1, num_cols=len(_COLUMNS))
+
+    for s in range(num_sheets):
+        if s:
+            doc.add_sheet(f'Sheet {s}', 'Words', num_rows=rows_per_sheet + 1, num_cols=len(_COLUMNS))
+        sheet = doc.sheets[s]
+        sheet.name = f'Vocabulary {s + 1}'
+        table = sheet.tables[0]
+        table.name = 'Words'
+        for c, column in enumerate(_COLUMNS):
+            table.write(0, c, column)
+        for r in range(1, rows_per_sheet + 1):
+            i = s * rows_per_sheet + r
+            word = [f'english {i}', f'romaji {i}', f'kana {i}', f'kanji {i}', f'pos-{i % 5}',
+                    f'tag-{i % 3};tag-{i % 7}', f'note {i}' if i % 3 else None]
+            for c, value in enumerate(word):
+                if value is not None:
+                    table.write(r, c, value)
+
+    doc.save(path)
+    return
+
+
+def _time(fn, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(num_sheets: int, rows_per_sheet: int) -> None:
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'vocabulary.numbers')
+        print(f'writing a {num_sheets} sheet x {rows_per_sheet} row workbook...')
+        _write_workbook(path, num_sheets, rows_per_sheet)
+
+        serial = _time(lambda: import_spreadsheet(path, use_cache=False))
+        parallel = _time(lambda: import_spreadsheets([path], use_cache=False))
+        import_spreadsheet(path)
+        cached = _time(lambda: import_spreadsheet(path))
+
+        # The workbooks are identical whichever way they were parsed
+        workbook = import_spreadsheet(path, use_cache=False)
+        assert [[t.rows for t in s.tables] for s in import_spreadsheets([path], use_cache=False)[0].sheets] == \
+               [[t.rows for t in s.tables] for s in workbook.sheets]
+
+    print(f'parsing {num_sheets} sheets x {rows_per_sheet} rows on {os.cpu_count()} CPUs')
+    print(f'  serial            {serial:7.3f}s')
+    print(f'  process pool      {parallel:7.3f}s  ({serial / parallel:.2f}x)')
+    print(f'  from the cache    {cached:7.3f}s  ({serial / cached:.0f}x)')
+
+    return
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
@@ -19,6 +19,8 @@ def pytest_collection_modifyitems(session, config, items):
         'test_words_read',
         'test_model_vocabulary_read',
         'test_model_alphabet_read',
+        'test_model_reload_on_commit',
+        'test_model_reload_on_replaced_database',
         'test_statistic',
         'test_statistics_word',
         'test_statistics_character',
@@ -27,6 +29,11 @@ def pytest_collection_modifyitems(session, config, items):
         'test_vocabulary_update',
         'test_alphabet_update',
         'test_model_update',
+        'test_model_save_in_one_transaction',
+        'test_model_save_keeps_cache',
+        'test_model_reload_keeps_dirty_statistics',
+        'test_model_save_deleted_row',
+        'test_update_rows_mismatched_columns',
         'test_mcq_vocab',
         'test_mcq_kana',
     ]
@@ -1,5 +1,9 @@
 
+import os
+import shutil
+import sqlite3
 from app.model import Model
+from app.utils import FilePaths as files
 
 
 def test_model_vocabulary_read(expected_vocab_rows):
@@ -98,3 +102,57 @@ def test_model_alphabet_read():
     assert characters[i].statistics.consecutive_incorrect == 0
 
     return
+
+
+def _set_english(path: str, word_id: int, english: str) -> None:
+    # Changes a word through a connection of its own, as store.update_database() would
+    with sqlite3.connect(path) as conn:
+        conn.execute('UPDATE vocab SET english_w = ? WHERE _ROWID_ = ?', (english, word_id))
+    conn.close()
+    return
+
+
+def test_model_reload_on_commit():
+
+    m = Model()
+    words = m.vocabulary
+    word_id = words[0].id
+
+    # Nothing has changed, so the vocabulary isn't loaded again
+    assert Model().vocabulary is words
+
+    # Another connection commits a change; the next Model sees it
+    _set_english(files.test_database.full_path, word_id, 'CHANGED english')
+    assert m.vocabulary is not words
+    assert m.vocabulary[0].english == 'CHANGED english'
+
+    _set_english(files.test_database.full_path, word_id, 'W1 english')
+    assert Model().vocabulary[0].english == 'W1 english'
+
+    return
+
+
+def test_model_reload_on_replaced_database(tmp_path):
+
+    database = files.test_database.full_path
+    original = str(tmp_path / 'original.sqlite3')
+    replacement = str(tmp_path / 'replacement.sqlite3')
+    shutil.copyfile(database, original)
+    shutil.copyfile(database, replacement)
+
+    m = Model()
+    words, characters = m.vocabulary, m.syllabary
+
+    # A database put in place of the one loaded (e.g. a restored backup) is a new file whose data version may
+    # well be the same as the old one's
+    _set_english(replacement, words[0].id, 'RESTORED english')
+    try:
+        os.replace(replacement, database)
+        assert m.vocabulary is not words and m.syllabary is not characters
+        assert m.vocabulary[0].english == 'RESTORED english'
+    finally:
+        os.replace(original, database)
+
+    assert Model().vocabulary[0].english == 'W1 english'
+
+    return
@@ -2,8 +2,9 @@
 from contextlib import closing
 import sqlite3
 import os
+import pytest
 from app.model import Model
-from app.model.dbms import create
+from app.model.dbms import create, update_rows
 from app.utils import FilePaths as files
 
 _NUM_CHARACTERS = 107
@@ -232,3 +233,165 @@ def test_model_update():
                     assert rows[0][3] == _NUM_UPDATES * 3
 
     return
+
+
+def test_model_save_in_one_transaction():
+
+    m = Model()
+    word, character = m.vocabulary[0], m.syllabary[0]
+    quizzed = word.statistics.quizzed, character.statistics.quizzed
+    word.statistics.increment(correct=True)
+    character.statistics.increment(correct=True)
+
+    # The kana rows are written first; when writing the vocab rows fails, the kana rows are rolled back and
+    # nothing is marked as saved
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        conn.execute("CREATE TRIGGER fail_vocab_update BEFORE UPDATE ON vocab BEGIN SELECT RAISE(ABORT, 'no'); END")
+    conn.close()
+    try:
+        with pytest.raises(sqlite3.IntegrityError):
+            m.save()
+    finally:
+        with sqlite3.connect(files.test_database.full_path) as conn:
+            conn.execute('DROP TRIGGER fail_vocab_update')
+        conn.close()
+
+    assert word.is_dirty and character.is_dirty
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        with closing(conn.cursor()) as crs:
+            crs.execute(f'SELECT quizzed FROM vocab WHERE _ROWID_ = {word.id}')
+            assert crs.fetchall()[0][0] == quizzed[0]
+            crs.execute(f'SELECT quizzed FROM kana WHERE _ROWID_ = {character.id}')
+            assert crs.fetchall()[0][0] == quizzed[1]
+    conn.close()
+
+    # Once it can, the save writes both
+    m.save()
+    assert m.is_dirty is False
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        with closing(conn.cursor()) as crs:
+            crs.execute(f'SELECT quizzed FROM vocab WHERE _ROWID_ = {word.id}')
+            assert crs.fetchall()[0][0] == quizzed[0] + 1
+            crs.execute(f'SELECT quizzed FROM kana WHERE _ROWID_ = {character.id}')
+            assert crs.fetchall()[0][0] == quizzed[1] + 1
+    conn.close()
+
+    return
+
+
+def test_model_save_keeps_cache():
+
+    # Saving, whichever way, doesn't make the model load the vocabulary or syllabary again
+    m = Model()
+    words, characters = m.vocabulary, m.syllabary
+
+    words[0].statistics.increment(correct=True)
+    words.save()
+    characters[0].statistics.increment(correct=True)
+    characters.save()
+    words[1].statistics.increment(correct=True)
+    words[1].update()
+    words[2].statistics.increment(correct=True)
+    characters[1].statistics.increment(correct=True)
+    m.save()
+
+    assert m.vocabulary is words and m.syllabary is characters
+    assert Model().vocabulary is words and Model().syllabary is characters
+
+    return
+
+
+def test_model_reload_keeps_dirty_statistics():
+
+    m = Model()
+    words = m.vocabulary
+    word, other = words[0], words[1]
+    word.statistics.increment(correct=False)
+    expected = word.statistic_columns
+
+    # Another connection commits a change while a quiz result is waiting to be saved; the vocabulary is loaded
+    # again, with the result carried over
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        conn.execute(f'UPDATE vocab SET english_w = "CHANGED english" WHERE _ROWID_ = {word.id}')
+        conn.execute(f'UPDATE vocab SET quizzed = quizzed + 100 WHERE _ROWID_ = {other.id}')
+    conn.close()
+
+    assert m.vocabulary is not words
+    reloaded = {w.id: w for w in m.vocabulary}
+    assert reloaded[word.id].english == 'CHANGED english'
+    assert reloaded[word.id].is_dirty and reloaded[word.id].statistic_columns == expected
+    assert not reloaded[other.id].is_dirty and reloaded[other.id].statistics.quizzed == other.statistics.quizzed + 100
+
+    m.save()
+    assert m.is_dirty is False
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        with closing(conn.cursor()) as crs:
+            crs.execute(f'SELECT quizzed, correct, consecutive_correct, consecutive_wrong FROM vocab '
+                        f'WHERE _ROWID_ = {word.id}')
+            assert list(crs.fetchall()[0]) == list(expected.values())
+        conn.execute(f'UPDATE vocab SET english_w = "W1 english" WHERE _ROWID_ = {word.id}')
+    conn.close()
+
+    return
+
+
+def test_model_save_deleted_row():
+
+    m = Model()
+
+    # A sync deletes a word, and a character, while their statistics are dirty in memory
+    deleted_word, kept_word = m.vocabulary[-1], m.vocabulary[0]
+    deleted_character, kept_character = m.syllabary[-1], m.syllabary[0]
+    for item in (deleted_word, kept_word, deleted_character, kept_character):
+        item.statistics.increment(correct=True)
+
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        conn.execute(f'DELETE FROM vocab WHERE _ROWID_ = {deleted_word.id}')
+        conn.execute(f'DELETE FROM kana WHERE _ROWID_ = {deleted_character.id}')
+    conn.close()
+
+    # update_rows() skips the missing rows, still writes the rest and says which rows it skipped
+    assert update_rows({'kana': [(deleted_character.id, deleted_character.statistic_columns),
+                                 (kept_character.id, kept_character.statistic_columns)],
+                        'vocab': [(deleted_word.id, deleted_word.statistic_columns)]}) == \
+        {'kana': [deleted_character.id], 'vocab': [deleted_word.id]}
+
+    # Saving the model doesn't fail either; the deleted word and character are dropped and the others are saved
+    m.save()
+
+    assert m.is_dirty is False
+    assert deleted_word.id not in [w.id for w in m.vocabulary]
+    assert deleted_character.id not in [c.id for c in m.syllabary]
+    assert len(m.vocabulary) == _NUM_WORDS - 1
+    assert len(m.syllabary) == _NUM_CHARACTERS - 1
+
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        with closing(conn.cursor()) as crs:
+            crs.execute(f'SELECT quizzed FROM vocab WHERE _ROWID_ = {kept_word.id}')
+            assert crs.fetchall()[0][0] == kept_word.statistics.quizzed
+            crs.execute(f'SELECT quizzed FROM kana WHERE _ROWID_ = {kept_character.id}')
+            assert crs.fetchall()[0][0] == kept_character.statistics.quizzed
+    conn.close()
+
+    return
+
+
+def test_update_rows_mismatched_columns():
+
+    # Every row for a table has to set the same columns; if they don't, nothing is written
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        with closing(conn.cursor()) as crs:
+            crs.execute('SELECT _ROWID_, quizzed FROM kana ORDER BY _ROWID_ LIMIT 2')
+            rows = crs.fetchall()
+    conn.close()
+
+    with pytest.raises(ValueError):
+        update_rows({'kana': [(rows[0][0], {'quizzed': 1000}), (rows[1][0], {'correct': 1000})]})
+
+    with sqlite3.connect(files.test_database.full_path) as conn:
+        with closing(conn.cursor()) as crs:
+            crs.execute('SELECT _ROWID_, quizzed FROM kana ORDER BY _ROWID_ LIMIT 2')
+            assert crs.fetchall() == rows
+    conn.close()
+
+    return
@@ -1,7 +1,11 @@
 
 from ._impl import create_database
 from ._impl import create_tables
+from ._impl import create_indexes
+from ._impl import upgrade_tables
 from ._impl import populate_tables
 from ._impl import update_database
+from ._impl import wait_for_backups
+from ._impl import restore_backup
 
 from ._exceptions import *
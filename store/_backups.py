@@ -0,0 +1,329 @@
+import os as _os
+import gzip as _gzip
+import json as _json
+import lzma as _lzma
+import queue as _queue
+import shutil as _shutil
+import hashlib as _hashlib
+import threading as _threading
+from glob import glob as _glob
+from typing import Callable as _Callable
+from typing import Optional as _Optional
+
+import store.dbms as _dbms
+
+
+# Backups of the data directory's databases and spreadsheets are kept in a content-addressed store. Each distinct
+# version of a file is stored once, compressed, under the SHA-256 of its (uncompressed) content in backups/objects;
+# the "<name>-<time>.<extension>.<compression>" backup files in the backups directory are hard links to those
+# objects, so backing up a file whose content is already in the store costs a directory entry rather than a copy.
+# A manifest (backups/manifest.json) records each file's backups, newest last, along with the size and mtime of
+# the file when it was last backed up. A file whose size and mtime haven't changed since its last backup is
+# skipped without being read, and retention is worked out from the manifest rather than by rescanning the backups
+# directory.
+#
+# Backups are made in two parts (see BackupJob). The databases that need backing up are snapshotted straight
+# away, in the calling thread, so that the backup is of them as they were before whatever the caller goes on to
+# do; the caller waits for that copy. The rest of the work (copying spreadsheets, compressing, hashing, linking
+# and pruning) can be left to a BackupWorker.
+#
+# Backup files made before there was a manifest, or with an older manifest format, aren't in the manifest and are
+# left alone.
+
+_MANIFEST = 'manifest.json'
+_MANIFEST_FORMAT = 2
+_OBJECTS_DIRECTORY = 'objects'
+_BACKUP_PATTERNS = ['*.sqlite3', '*.numbers']
+_BLOCK_SIZE = 1 << 20
+_COMPRESSION = 'xz'
+_COMPRESSORS = {'xz': _lzma.open, 'gz': _gzip.open}
+
+
+def _backup_name(name: str, time: str, compression: str) -> str:
+    stem, extension = name.split('.')[0], name.split('.')[-1]
+    return f'{stem}-{time}.{extension}.{compression}'
+
+
+def _object_name(content_hash: str, extension: str, compression: str) -> str:
+    return _os.path.join(_OBJECTS_DIRECTORY, content_hash[:2], f'{content_hash}.{extension}.{compression}')
+
+
+def read_manifest(backup_path: str) -> dict:
+
+    # A missing or unreadable manifest is treated as an empty one, i.e. nothing has been backed up yet
+    try:
+        with open(_os.path.join(backup_path, _MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = _json.load(f)
+    except (OSError, ValueError):
+        return {'format': _MANIFEST_FORMAT, 'files': {}}
+
+    if not isinstance(manifest, dict) or manifest.get('format') != _MANIFEST_FORMAT:
+        return {'format': _MANIFEST_FORMAT, 'files': {}}
+
+    return manifest
+
+
+def _write_manifest(backup_path: str, manifest: dict) -> None:
+
+    # Written to a temporary file first and moved into place so an interrupted backup never leaves half a manifest
+    manifest_file = _os.path.join(backup_path, _MANIFEST)
+    temp_file = f'{manifest_file}.{_os.getpid()}.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        _json.dump(manifest, f, indent=1)
+    _os.replace(temp_file, manifest_file)
+
+    return
+
+
+def _link(source: str, target: str) -> None:
+    # Falls back to a copy on file systems that don't do hard links
+    try:
+        _os.link(source, target)
+    except OSError:
+        _shutil.copyfile(source, target)
+    return
+
+
+def _add_object(backup_path: str, source: str, temp_name: str, extension: str, compression: str) -> str:
+
+    # Streams the file at source through the compressor into the store (or discards the result if the store
+    # already holds that content) and returns the hash of its content
+    temp_file = _os.path.join(backup_path, _OBJECTS_DIRECTORY, f'{temp_name}.{compression}.tmp')
+    digest = _hashlib.sha256()
+    try:
+        with open(source, 'rb') as src, _COMPRESSORS[compression](temp_file, 'wb') as dst:
+            for block in iter(lambda: src.read(_BLOCK_SIZE), b''):
+                digest.update(block)
+                dst.write(block)
+        content_hash = digest.hexdigest()
+        object_file = _os.path.join(backup_path, _object_name(content_hash, extension, compression))
+        if not _os.path.exists(object_file):
+            _os.makedirs(_os.path.dirname(object_file), exist_ok=True)
+            _os.replace(temp_file, object_file)
+    finally:
+        if _os.path.exists(temp_file):
+            _os.remove(temp_file)
+
+    return content_hash
+
+
+def _prune(backup_path: str, manifest: dict, keep: int) -> list[str]:
+
+    # Drops all but the newest keep backups of each file, along with the objects that no backup refers to any
+    # more; returns the names of the backup files removed
+    removed: list[dict] = []
+    for name, backups in manifest['files'].items():
+        removed += backups[:-keep]
+        manifest['files'][name] = backups[-keep:]
+
+    in_use = {e['object'] for backups in manifest['files'].values() for e in backups}
+    for entry in removed:
+        for file in [entry['file']] + ([] if entry['object'] in in_use else [entry['object']]):
+            if _os.path.exists(_os.path.join(backup_path, file)):
+                _os.remove(_os.path.join(backup_path, file))
+
+    return [e['file'] for e in removed]
+
+
+class _Source:
+
+    def __init__(self, name: str, path: str, stat: _os.stat_result, snapshot: _Optional[str] = None):
+        self.name: str = name  # e.g. "rosetta.sqlite3"
+        self.path: str = path
+        self.stat: _os.stat_result = stat  # of the file at path when the job was made
+        self.snapshot: _Optional[str] = snapshot  # copy of a database taken when the job was made
+        return
+
+
+class BackupJob:
+
+    # A backup of the files in a data directory that have changed since their last backup, keeping the newest
+    # keep backups of each. Making a job snapshots the databases that need backing up; run() does the rest,
+    # either directly or on a BackupWorker. Once the job is done, made holds the names of the backup files made
+    # and error whatever stopped the job, if anything did.
+
+    def __init__(self, data_path: str, time: str, keep: int, backup_path: _Optional[str] = None,
+                 compression: str = _COMPRESSION, on_done: _Optional[_Callable[['BackupJob'], None]] = None):
+
+        if compression not in _COMPRESSORS:
+            raise ValueError(f'unsupported backup compression: {compression}')
+
+        self.time: str = time
+        self.keep: int = keep
+        self.backup_path: str = backup_path if backup_path else _os.path.join(data_path, 'backups')
+        self.compression: str = compression
+        self.made: list[str] = []
+        self.error: _Optional[BaseException] = None
+        self._on_done = on_done
+        self._done = _threading.Event()
+
+        _os.makedirs(_os.path.join(self.backup_path, _OBJECTS_DIRECTORY), exist_ok=True)
+
+        # The manifest may be behind if a worker has yet to run an earlier job; at worst a file is snapshotted
+        # that didn't need to be, and run() (which checks against the manifest again) throws the snapshot away
+        manifest = read_manifest(self.backup_path)
+        self._sources: list[_Source] = []
+        try:
+            for path in sorted(p for pattern in _BACKUP_PATTERNS for p in _glob(_os.path.join(data_path, pattern))):
+                source = _Source(_os.path.basename(path), path, _os.stat(path))
+                if not self._changed(manifest, source):
+                    continue
+                if source.name.endswith('.sqlite3'):
+                    source.snapshot = _os.path.join(self.backup_path, _OBJECTS_DIRECTORY,
+                                                    f'{source.name}.{time}.snapshot')
+                    # In one step rather than a few pages at a time: the caller is waiting on it, and nothing else
+                    # should be writing to the database while it is
+                    _dbms.backup_database(source.snapshot, source=path, pages=-1)
+                self._sources.append(source)
+        except BaseException:
+            self._discard_snapshots()
+            raise
+
+        return
+
+    @staticmethod
+    def _changed(manifest: dict, source: _Source) -> bool:
+        # Going by size and mtime, as the spreadsheet cache does
+        backups = manifest['files'].get(source.name, [])
+        return not backups or backups[-1]['size'] != source.stat.st_size or \
+            backups[-1]['mtime'] != source.stat.st_mtime_ns
+
+    def _discard_snapshots(self) -> None:
+        for source in self._sources:
+            if source.snapshot and _os.path.exists(source.snapshot):
+                _os.remove(source.snapshot)
+        return
+
+    def _backup(self) -> None:
+
+        # The manifest is written even if a file fails part way, so what was backed up before it is kept track of
+        manifest = read_manifest(self.backup_path)
+        try:
+            for source in self._sources:
+                self._backup_source(manifest, source)
+        finally:
+            _prune(self.backup_path, manifest, self.keep)
+            _write_manifest(self.backup_path, manifest)
+
+        return
+
+    def _backup_source(self, manifest: dict, source: _Source) -> None:
+
+        if not self._changed(manifest, source):
+            return
+
+        extension = source.name.split('.')[-1]
+        content_hash = _add_object(self.backup_path, source.snapshot if source.snapshot else source.path,
+                                   f'{source.name}.{self.time}', extension, self.compression)
+        backups = manifest['files'].setdefault(source.name, [])
+
+        # Touched but not changed; just remember the new mtime
+        if backups and backups[-1]['sha256'] == content_hash:
+            backups[-1]['size'], backups[-1]['mtime'] = source.stat.st_size, source.stat.st_mtime_ns
+            return
+
+        backup_name = _backup_name(source.name, self.time, self.compression)
+        object_name = _object_name(content_hash, extension, self.compression)
+        _link(_os.path.join(self.backup_path, object_name), _os.path.join(self.backup_path, backup_name))
+        backups.append({'file': backup_name, 'object': object_name, 'sha256': content_hash,
+                        'size': source.stat.st_size, 'mtime': source.stat.st_mtime_ns})
+        self.made.append(backup_name)
+
+        return
+
+    def run(self) -> None:
+
+        try:
+            self._backup()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._discard_snapshots()
+            self._done.set()
+
+        if self._on_done:
+            self._on_done(self)
+
+        return
+
+    @property
+    def done(self) -> bool: return self._done.is_set()
+
+    def wait(self, timeout: _Optional[float] = None) -> list[str]:
+
+        # Returns the names of the backup files made, or raises whatever stopped the job
+        if not self._done.wait(timeout):
+            raise TimeoutError(f'backup {self.time} still running')
+        if self.error:
+            raise self.error
+
+        return self.made
+
+
+class BackupWorker:
+
+    # Runs backup jobs on a background thread, one at a time in the order they were submitted (so the worker is
+    # the only writer of the manifest). The thread is started with the first job.
+
+    def __init__(self):
+        self._lock = _threading.Lock()
+        self._jobs: _queue.Queue = _queue.Queue()
+        self._thread: _Optional[_threading.Thread] = None
+        return
+
+    def _run(self) -> None:
+        # A job's own failures are recorded on the job; anything else (e.g. from an on_done callback) mustn't stop
+        # the jobs queued behind it from running
+        while True:
+            job = self._jobs.get()
+            try:
+                job.run()
+            except Exception:
+                pass
+            finally:
+                self._jobs.task_done()
+
+    def submit(self, job: BackupJob) -> BackupJob:
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = _threading.Thread(target=self._run, name='store-backups', daemon=True)
+                self._thread.start()
+        self._jobs.put(job)
+
+        return job
+
+    def wait(self) -> None:
+        # Blocks until every job submitted so far is done
+        self._jobs.join()
+        return
+
+
+def backup(data_path: str, time: str, keep: int, backup_path: _Optional[str] = None,
+           compression: str = _COMPRESSION) -> list[str]:
+
+    # Backs up data_path in the calling thread; returns the names of the backup files made
+    job = BackupJob(data_path, time, keep, backup_path=backup_path, compression=compression)
+    job.run()
+
+    return job.wait()
+
+
+def restore(backup_file: str, target: str) -> None:
+
+    # Decompresses the backup file at backup_file to target. The file is written next to target first and moved
+    # into place once it is complete, so target is never left half restored.
+    compression = backup_file.split('.')[-1]
+    if compression not in _COMPRESSORS:
+        raise ValueError(f'not a compressed backup file: {backup_file}')
+
+    temp_file = f'{target}.{_os.getpid()}.tmp'
+    try:
+        with _COMPRESSORS[compression](backup_file, 'rb') as src, open(temp_file, 'wb') as dst:
+            _shutil.copyfileobj(src, dst, _BLOCK_SIZE)
+        _os.replace(temp_file, target)
+    finally:
+        if _os.path.exists(temp_file):
+            _os.remove(temp_file)
+
+    return
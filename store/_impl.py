@@ -1,28 +1,50 @@
-
 import os
-from glob import glob
+import atexit
 import datetime
-import shutil
 
 from app import app
 from app.utils.exceptions import RosettaError
 import store.dbms as _dbms
+from . import _backups
 from ._schema import TABLE_SCHEMAS as _TABLE_SCHEMAS
-from ._schema import QUIZ_METRIC_COLUMNS as _QUIZ_METRIC_COLUMNS
+from ._schema import QUIZ_METRIC_VALUES as _QUIZ_METRIC_VALUES
 from ._types import VocabWorkbook as _VocabWorkbook
 from ._types import KanaWorkbook as _KanaWorkbook
 from ._types import VocabDatabase as _VocabDatabase
-from ._types import DatabaseWordRecord as _DatabaseWordRecord
 from ._types import VocabWorkbookRecord as _VocabWorkbookRecord
+from ._plan import VocabularyChangePlan as _VocabularyChangePlan
+from ._plan import plan_vocabulary_changes as _plan_vocabulary_changes
+from ._plan import KanaChangePlan as _KanaChangePlan
+from ._plan import plan_kana_changes as _plan_kana_changes
+from ._plan import kana_note_values as _kana_note_values
+from ._plan import DatabaseChangePlan as _DatabaseChangePlan
+from ._staging import sync_vocabulary as _sync_vocabulary_in_sql
+from ._pipeline import populate_vocabulary as _populate_vocabulary_pipelined
+from ._tags import tag_ids as _tag_ids
+from ._data_files import DataFiles as _files
+from .spreadsheet import import_spreadsheets as _import_spreadsheets
+from typing import Optional as _Optional
+
+
 _NUM_BACKUP_COPIES = 2  # set this variable to one less than the desired number of backups to keep around
-_quiz_metric_values = [0, 0, 0, 0]
+_fingerprint_column = _dbms.ColumnDefinitions({'fingerprint': _dbms.ColumnTypes.TEXT})
+_backup_worker = _backups.BackupWorker()
+atexit.register(lambda: _backup_worker.wait())  # don't let the interpreter exit part way through a backup
 
 
 def _now() -> str:
     return datetime.datetime.now().strftime('%Y%m%d.%H%M%S.%f')
 
 
-def _backup():
+def _report_backup(job: _backups.BackupJob) -> None:
+    if job.error:
+        print(f'>>>>> store._backup(): backup {job.time} failed: {job.error!r}')
+    else:
+        print(f'>>>>> store._backup(): backup {job.time} done; {len(job.made)} files backed up')
+    return
+
+
+def _backup() -> _backups.BackupJob:
 
     # confirm the data directory exists
     if 'DATA_PATH' not in app.config.keys():
@@ -30,34 +52,45 @@ def _backup():
     if not os.path.exists(app.config['DATA_PATH']):
         raise FileNotFoundError(f'data directory does not exist: {app.config["DATA_PATH"]}')
 
-    # create the backup directory if it doesn't exist
-    backup_path = f'{app.config["DATA_PATH"]}/backups'
-    if not os.path.exists(backup_path):
-        os.makedirs(backup_path)
+    # Only files that have changed since their last backup are backed up (see store._backups). Databases are
+    # snapshotted here, before the caller changes them, so this blocks for as long as copying the changed
+    # databases takes (a snapshot taken on the worker could catch the caller's changes); compressing and
+    # storing the snapshots (and the spreadsheets) is left to the background worker.
+    job = _backups.BackupJob(app.config['DATA_PATH'], _now(), keep=_NUM_BACKUP_COPIES + 1, on_done=_report_backup)
 
-    now = _now()
-    files_to_backup = glob(f'{app.config["DATA_PATH"]}/*.sqlite3') + glob(f'{app.config["DATA_PATH"]}/*.numbers')
+    return _backup_worker.submit(job)
 
-    for next_file in files_to_backup:
 
-        # How many versions of this file do we have in the backup directory?.
-        next_file_name = next_file.split('/')[-1]
-        next_file_extension = next_file_name.split('.')[-1]
-        next_file_name = next_file_name.split('.')[0]
-        existing_backups = glob(f'{backup_path}/{next_file_name}-*.{next_file_extension}')
-        if len(existing_backups) > _NUM_BACKUP_COPIES:
-            # We only want to keep three backup copies of a file; delete the oldest one.
-            oldest_backup = sorted(existing_backups)[0]
-            os.remove(oldest_backup)
+def wait_for_backups() -> None:
+    _backup_worker.wait()
+    return
 
-        # now make the backup copy
-        backup_file = f'{backup_path}/{next_file_name}-{now}.{next_file_extension}'
-        shutil.copy(next_file, backup_file)
 
-    return
+def restore_backup(backup_file: str, target: _Optional[str] = None) -> str:
+
+    # Restores the backup at backup_file (a path, or the name of a file in the backups directory) to target, by
+    # default the data directory file it is a backup of; returns the path restored to. Pending backups are
+    # finished first so a backup being restored over can't still be in progress.
+
+    wait_for_backups()
+    if not os.path.dirname(backup_file):
+        backup_file = os.path.join(app.config['DATA_PATH'], 'backups', backup_file)
+    if not os.path.exists(backup_file):
+        raise FileNotFoundError(backup_file)
+    if target is None:
+        # "<name>-<time>.<extension>.<compression>" is a backup of "<name>.<extension>"
+        name, extension = os.path.basename(backup_file).rsplit('-', 1)[0], backup_file.split('.')[-2]
+        target = os.path.join(app.config['DATA_PATH'], f'{name}.{extension}')
+
+    _backups.restore(backup_file, target)
 
+    # Pooled connections may still be open on the file that was just replaced
+    _dbms.close_connections()
 
-def _populate_kana():
+    return target
+
+
+def _populate_kana(workbook: _Optional[_KanaWorkbook] = None):
     # There are two kana tables in the database to populate: kana and kana_notes. The data comes from
     # the associated spreadsheet which contains two sheets. The first sheet contains all the kana grouped
     # by category. Each category is a table on the first sheet. The second sheet contains a single table
@@ -65,37 +98,26 @@ def _populate_kana():
     #
     # To populate the kana database tables..
     #   1. read the kana data from the associated spreadsheet and prepare it for insertion into the database
-    #   2. insert the kana data from the first sheet into the kana table in the database
-    #   3. get the row_ids from the new kana table in the database all the "Basic" category kana
-    #   4. insert the "Basic" kana notes into the kana_notes table in the database (using the row_ids fetched
-    #      in step 3
+    #   2. insert the kana data from the first sheet into the kana table in the database, getting back the
+    #      row_ids of the new rows keyed by romaji
+    #   3. insert the "Basic" kana notes into the kana_notes table in the database (using the row_ids returned
+    #      in step 2)
 
-    workbook = _KanaWorkbook()
+    workbook = workbook if workbook else _KanaWorkbook()
 
     # Populate the database's "kana" table
     rows: list[_dbms.Row] = []
     for kana in workbook.kana.values():
-        rows.append(_dbms.Row([kana.romaji, kana.hiragana, kana.katakana, kana.category] + _quiz_metric_values))
-    _dbms.insert_many(table_name='kana', column_definitions=_TABLE_SCHEMAS['kana'], rows=rows)
-
-    # Get the row_ids of the "Basic" kana items and create a dict to map those items to row ids
-    col_defs = _dbms.ColumnDefinitions({'hiragana': _dbms.ColumnTypes.TEXT, 'katakana': _dbms.ColumnTypes.TEXT})
-    rows_from_db = _dbms.fetch_where(table_name='kana', column_definitions=col_defs,
-                                     where_clause='category = "Basic" and romaji != "n/m"')
+        rows.append(_dbms.Row([kana.romaji, kana.hiragana, kana.katakana, kana.category] + _QUIZ_METRIC_VALUES))
+    kana_id_map = _dbms.insert_many(table_name='kana', column_definitions=_TABLE_SCHEMAS['kana'], rows=rows,
+                                    return_ids=True)
 
-    katakana_id_map: dict[str, int] = {}
-    hiragana_id_map: dict[str, int] = {}
-    for row in rows_from_db:
-        hiragana_id_map[row[1]] = row[0]
-        katakana_id_map[row[2]] = row[0]
-
-    # Prepare the set of rows to insert into the database's "kana_notes" table
+    # Prepare the set of rows to insert into the database's "kana_notes" table; as with a sync (see
+    # store._plan.KanaChangePlan), a kana without notes gets no kana_notes row
     rows: list[_dbms.Row] = []
     for kana in workbook.kana.values():
-        if kana.category == 'Basic' and kana.romaji != 'n/m':
-            row_id = hiragana_id_map[kana.hiragana] if kana.hiragana in hiragana_id_map.keys() \
-                else katakana_id_map[kana.katakana]
-            rows.append(_dbms.Row([row_id, kana.hiragana_note, kana.katakana_note]))
+        if kana.category == 'Basic' and kana.romaji != 'n/m' and _kana_note_values(kana) is not None:
+            rows.append(_dbms.Row([kana_id_map[kana.romaji]] + _kana_note_values(kana)))
 
     # Insert the prepared rows into the kana_notes table
     _dbms.insert_many('kana_notes', column_definitions=_TABLE_SCHEMAS['kana_notes'], rows=rows)
@@ -103,9 +125,9 @@ def _populate_kana():
     return
 
 
-def _populate_vocabulary():
+def _populate_vocabulary(workbook: _Optional[_VocabWorkbook] = None):
 
-    workbook = _VocabWorkbook()
+    workbook = workbook if workbook else _VocabWorkbook()
     rows = []
     wb_word_map: dict[str, _VocabWorkbookRecord] = {}  # key is the associated word's kana value
 
@@ -113,17 +135,12 @@ def _populate_vocabulary():
     for wb_word in workbook.words:
         wb_word_map[wb_word.kana] = wb_word
         rows.append(_dbms.Row([wb_word.english, wb_word.romaji, wb_word.kana, wb_word.kanji, wb_word.part_of_speech] +
-                              _quiz_metric_values))
-
-    _dbms.insert_many(table_name='vocab', column_definitions=_TABLE_SCHEMAS['vocab'], rows=rows)
+                              _QUIZ_METRIC_VALUES + [wb_word.fingerprint]))
 
-    # Get the row_ids of the records just created; they are needed to populate the remaining vocab tables.
-    # Will place them into a dict (word_id_map) whose keys are each word's kana form and whose values are
-    # the associated row id
-    col_defs = _dbms.ColumnDefinitions({'kana_w': _dbms.ColumnTypes.TEXT})
-    rows_from_db = _dbms.fetch_where(table_name='vocab', column_definitions=col_defs,
-                                     where_clause='1 = 1')
-    db_word_id_map = {r[1]: r[0] for r in rows_from_db}
+    # The row_ids of the records created are needed to populate the remaining vocab tables; they come back in
+    # a dict (db_word_id_map) whose keys are each word's kana form and whose values are the associated row id
+    db_word_id_map = _dbms.insert_many(table_name='vocab', column_definitions=_TABLE_SCHEMAS['vocab'], rows=rows,
+                                       return_ids=True)
 
     # Next, build the row sets for the vocab_notes and vocab_tags tables
     note_rows = []
@@ -133,166 +150,63 @@ def _populate_vocabulary():
         if wb_word.note:
             note_rows.append(_dbms.Row([word_id, wb_word.note]))
         if wb_word.tags:
-            tag_rows += [_dbms.Row([word_id, tag]) for tag in wb_word.tags]
+            tag_rows += [(word_id, tag) for tag in wb_word.tags]
 
-    # Populate the vocab_notes and vocab_tags tables
+    # Populate the vocab_notes, tags and vocab_tags tables
     _dbms.insert_many('vocab_notes', _TABLE_SCHEMAS['vocab_notes'], note_rows)
-    _dbms.insert_many('vocab_tags', _TABLE_SCHEMAS['vocab_tags'], tag_rows)
+    tag_ids = _tag_ids([tag for _, tag in tag_rows])
+    _dbms.insert_many('vocab_tags', _TABLE_SCHEMAS['vocab_tags'],
+                      [_dbms.Row([word_id, tag_ids[tag]]) for word_id, tag in tag_rows])
 
     return
 
 
-def _delete_word(db_word: _DatabaseWordRecord):
+def _update_vocabulary(dry_run: bool = False) -> _VocabularyChangePlan:
 
-    # First delete any note this word has from the vocab_notes table.
-    # We do that by querying for a record in the vocab_notes table whose word_id matches the word_id
-    # of the vocab word record we're deleting.
-    col_defs = _dbms.ColumnDefinitions({'word_id': _dbms.ColumnTypes.INTEGER})
-    rows = _dbms.fetch_where('vocab_notes', col_defs, where_clause=f'word_id = {db_word.word_id}')
-
-    if db_word.note:
-        assert len(rows) == 1
-        _dbms.delete('vocab_notes', row_id=rows[0][0])
-    else:
-        assert len(rows) == 0
+    plan = _plan_vocabulary_changes()
 
-    # Next delete any tags this word has from the vocab_tags table.
-    # Again, we need to rowids of all records in this table whose word_id matches that of the word we're deleting.
-    rows = _dbms.fetch_where('vocab_tags', col_defs, where_clause=f'word_id = {db_word.word_id}')
-    tag_row_ids: list[int] = [int(row[0]) for row in rows]
+    print('')
 
-    if db_word.tags:
-        assert len(rows) == len(db_word.tags)
-        for tag_row_id in tag_row_ids:
-            _dbms.delete('vocab_tags', tag_row_id)
+    if dry_run:
+        print(f'>>>>> store._update_vocabulary(): dry run; no changes applied')
+        print(plan)
     else:
-        assert len(rows) == 0
-
-    # Finally, we delete the word's record in the vocab table
-    _dbms.delete('vocab', db_word.word_id)
-
-    return
+        plan.apply()
 
+    print(f'>>>>> store._update_vocabulary(): {len(plan.adds)} words added')
+    print(f'>>>>> store._update_vocabulary(): {len(plan.deletes)} words deleted')
+    print(f'>>>>> store._update_vocabulary(): {len(plan.updates)} words updated')
 
-def _add_word(wb_word: _VocabWorkbookRecord):
+    return plan
 
-    # First we need to add the vocab table record for this word; we will need the rowid of this new
-    # record when we add any note and tag records.
-    row = _dbms.Row([wb_word.english, wb_word.romaji, wb_word.kana, wb_word.kanji, wb_word.part_of_speech] +
-                    _quiz_metric_values)
-    new_word_id = _dbms.insert('vocab', _TABLE_SCHEMAS['vocab'], row)
 
-    if wb_word.note:
-        # Add a record to the vocab_notes table for this word
-        row = _dbms.Row([new_word_id, wb_word.note])
-        _dbms.insert('vocab_notes', _TABLE_SCHEMAS['vocab_notes'], row)
+def _update_kana(dry_run: bool = False) -> _KanaChangePlan:
 
-    if wb_word.tags:
-        # Add records to the vocab_tags table for each of this word's tags
-        for tag in wb_word.tags:
-            row = _dbms.Row([new_word_id, tag])
-            _dbms.insert('vocab_tags', _TABLE_SCHEMAS['vocab_tags'], row)
-
-    return
+    plan = _plan_kana_changes()
 
+    print('')
 
-def _update_word(db_word: _DatabaseWordRecord, wb_word: _VocabWorkbookRecord):
-    assert db_word.kana == wb_word.kana
-
-    # Set up the row to be updated in the vocab table
-    # Note we don't have to explicitly deal with this word's quiz metrics beyond making sure they are
-    # not referenced in the dbms.ColumnDefinitions parameter passed to dbms.update().
-    col_defs = _dbms.ColumnDefinitions({k: v for k, v in _TABLE_SCHEMAS['vocab'].items()
-                                        if k not in _QUIZ_METRIC_COLUMNS})
-    row = _dbms.Row([wb_word.english, wb_word.romaji, wb_word.kana, wb_word.kanji, wb_word.part_of_speech])
-    _dbms.update('vocab', col_defs, row_id=db_word.word_id, row=row)
-
-    if wb_word.note:
-        # There is a note for this row in the workbook.
-        if db_word.note:
-            # There is also a note for this row in the database.  Are they different?
-            if wb_word.note != db_word.note:
-                # Yes! This word's note is being updated. So we will need to get the rowid of the existing
-                # note in the vocab_notes table.
-                col_defs = _dbms.ColumnDefinitions({'word_id': _dbms.ColumnTypes.INTEGER})
-                rows = _dbms.fetch_where('vocab_notes', column_definitions=col_defs,
-                                         where_clause=f'word_id = {db_word.word_id}')
-                assert len(rows) == 1
-                note_rowid = rows[0][0]
-                _dbms.update('vocab_notes', _TABLE_SCHEMAS['vocab_notes'],
-                             row_id=note_rowid, row=_dbms.Row([db_word.word_id, wb_word.note]))
-        else:
-            # The note in wb_word is new for this word in the database; we need to do an insert instead of an
-            # update
-            row = _dbms.Row([db_word.word_id, wb_word.note])
-            _dbms.insert('vocab_notes', _TABLE_SCHEMAS['vocab_notes'], row)
-
-    if wb_word.tags:
-        # There are tags for this row in the workbook. Do any need to be updated in the database?
-        if db_word.tags:
-            # Tags for this word in the database record and not in the workbook record need to be deleted
-            # from vocab_tags.
-            rows = _dbms.fetch_where('vocab_tags', _TABLE_SCHEMAS['vocab_tags'],
-                                     where_clause=f'word_id = {db_word.word_id}')
-            tag_to_rowid_map = {str(row[2]): int(row[0]) for row in rows}
-            for tag in db_word.tags:
-                if tag.value not in wb_word.tags:
-                    _dbms.delete('vocab_tags', row_id=tag_to_rowid_map[tag.value])
-
-            # Tags for this word in the workbook record and not in the database record need
-            # to be added to the vocab_tags table.
-            for tag in wb_word.tags:
-                if tag not in [t.value for t in db_word.tags]:
-                    _dbms.insert('vocab_tags', _TABLE_SCHEMAS['vocab_tags'], row=_dbms.Row([db_word.word_id, tag]))
+    if dry_run:
+        print(f'>>>>> store._update_kana(): dry run; no changes applied')
+        print(plan)
+    else:
+        plan.apply()
 
-        else:
-            # There are no existing tags for this word in the database; we can simply insert all the
-            # tags contained in the workbook record.
-            for tag in wb_word.tags:
-                row = _dbms.Row([db_word.word_id, tag])
-                _dbms.insert('vocab_tags', _TABLE_SCHEMAS['vocab_tags'], row)
+    print(f'>>>>> store._update_kana(): {len(plan.adds)} kana added')
+    print(f'>>>>> store._update_kana(): {len(plan.deletes)} kana deleted')
+    print(f'>>>>> store._update_kana(): {len(plan.updates)} kana updated')
 
-    return
+    return plan
 
 
-def _update_vocabulary():
+def _update_vocabulary_in_sql() -> None:
 
-    workbook = _VocabWorkbook()
-    database = _VocabDatabase()
-    num_words_updated = 0
-    num_words_added = 0
-    num_words_deleted = 0
+    num_words_added, num_words_deleted, num_words_updated = _sync_vocabulary_in_sql(_VocabWorkbook())
 
     print('')
-
-    # Identify records to delete
-    # Are there any words that need to be deleted? I.e., are there any words in the database that do not
-    # appear in the workbook?
-    for db_word in database.words:
-        if db_word.kana not in workbook.word_map.keys():
-            num_words_deleted += 1
-            _delete_word(db_word)
-
-    # Are there any words that need to be added or updated? Answering both of these questions involves
-    # visiting every word in the spreadsheet, so we'll answer both questions together.
-    db_kana_list = [w.kana for w in database.words]
-    for wb_word in workbook.words:
-
-        # Does this spreadsheet word need to be added to the database?
-        if wb_word.kana not in db_kana_list:
-            num_words_added += 1
-            _add_word(wb_word)
-
-        # Does this spreadsheet word need to be updated in the database?
-        else:
-            db_word = database.word_map[wb_word.kana]
-            if not db_word.is_equal(wb_word):
-                num_words_updated += 1
-                _update_word(db_word, wb_word)
-
-    print(f'>>>>> store._update_vocabulary(): {num_words_added} words added')
-    print(f'>>>>> store._update_vocabulary(): {num_words_deleted} words deleted')
-    print(f'>>>>> store._update_vocabulary(): {num_words_updated} words updated')
+    print(f'>>>>> store._update_vocabulary_in_sql(): {num_words_added} words added')
+    print(f'>>>>> store._update_vocabulary_in_sql(): {num_words_deleted} words deleted')
+    print(f'>>>>> store._update_vocabulary_in_sql(): {num_words_updated} words updated')
 
     return
 
@@ -314,18 +228,124 @@ def create_tables():
     return
 
 
-def populate_tables():
+def create_indexes() -> list[str]:
+
+    # Adds any indexes declared in the table schemas that an existing database is missing (e.g. a database
+    # created before the indexes were declared); returns the names of the indexes created.
+    created: list[str] = []
+    for table_name, column_definitions in _TABLE_SCHEMAS.items():
+        created += _dbms.create_indexes(table_name, column_definitions)
+
+    return created
+
+
+def _backfill_fingerprints() -> int:
+
+    # Fingerprints the words that don't have one yet (i.e. those added before the vocab table had a fingerprint
+    # column) from their contents in the database; returns how many words were fingerprinted
+    rows = [(w.word_id, _dbms.Row([w.content_fingerprint()])) for w in _VocabDatabase().words if w.fingerprint is None]
+    _dbms.update_many('vocab', _fingerprint_column, rows)
+
+    return len(rows)
+
+
+# A database created before tags were interned has vocab_tags (word_id, tag); its tags are moved into the tags
+# table and vocab_tags is rebuilt as (word_id, tag_id), keeping each row's row id.
+_MIGRATE_VOCAB_TAGS = [
+    'INSERT OR IGNORE INTO tags (tag) SELECT tag FROM vocab_tags WHERE tag IS NOT NULL ORDER BY _ROWID_',
+    'ALTER TABLE vocab_tags RENAME TO vocab_tags_legacy',
+    'DROP INDEX IF EXISTS vocab_tags_word_id_idx',
+]
+_MIGRATE_VOCAB_TAG_ROWS = [
+    'INSERT INTO vocab_tags (_ROWID_, word_id, tag_id) '
+    'SELECT o._ROWID_, o.word_id, t._ROWID_ FROM vocab_tags_legacy AS o JOIN tags AS t ON t.tag = o.tag '
+    'ORDER BY o._ROWID_',
+    'DROP TABLE vocab_tags_legacy',
+]
+
+
+def _migrate_vocab_tags() -> bool:
+
+    columns = [r[0] for r in _dbms.iter_query("SELECT name FROM pragma_table_info('vocab_tags')")]
+    if 'tag' not in columns:
+        return False
+
+    for stmt in _MIGRATE_VOCAB_TAGS:
+        _dbms.execute(stmt)
+    _dbms.create_table('vocab_tags', _TABLE_SCHEMAS['vocab_tags'])
+    for stmt in _MIGRATE_VOCAB_TAG_ROWS:
+        _dbms.execute(stmt)
+
+    return True
+
+
+def upgrade_tables() -> list[str]:
+
+    # Brings a database created from an older version of the table schemas up to date: missing tables are
+    # created, vocab_tags is moved over to interned tags, missing columns are added (as "table.column"),
+    # missing indexes are created and words without a fingerprint get one. Returns the names of the tables,
+    # columns and indexes that were added.
 
     _backup()
-    _populate_kana()
-    _populate_vocabulary()
+    added: list[str] = []
+    with _dbms.transaction():
+        existing = [r[0] for r in _dbms.iter_query("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table_name, column_definitions in _TABLE_SCHEMAS.items():
+            if table_name not in existing:
+                _dbms.create_table(table_name, column_definitions)
+                added.append(table_name)
+        if _migrate_vocab_tags():
+            added.append('vocab_tags.tag_id')
+        for table_name, column_definitions in _TABLE_SCHEMAS.items():
+            added += [f'{table_name}.{c}' for c in _dbms.add_columns(table_name, column_definitions)]
+        added += create_indexes()
+        _backfill_fingerprints()
+
+    return added
+
+
+def populate_tables(parallel: bool = False, pipelined: bool = False):
+
+    # With parallel set, the kana and vocabulary spreadsheets (and their sheets) are parsed concurrently in worker
+    # processes before the tables are populated. With pipelined set, the vocabulary tables are instead written
+    # while the vocabulary spreadsheet is still being parsed (see store._pipeline).
+    kana_workbook = None
+    vocab_workbook = None
+    if parallel:
+        workbooks = _import_spreadsheets([_files.kana_spreadsheet] + ([] if pipelined else [_files.vocab_spreadsheet]))
+        kana_workbook = _KanaWorkbook(workbooks[0])
+        vocab_workbook = None if pipelined else _VocabWorkbook(workbooks[1])
+
+    _backup()
+    with _dbms.transaction():
+        _populate_kana(kana_workbook)
+        if pipelined:
+            _populate_vocabulary_pipelined()
+        else:
+            _populate_vocabulary(vocab_workbook)
 
     return
 
 
-def update_database():
+def update_database(dry_run: bool = False, in_sql: bool = False) -> _DatabaseChangePlan:
+
+    # Brings the kana and vocabulary tables in line with their workbooks, keeping the quiz metrics of the
+    # characters and words that are still there, and returns the kana and vocabulary plans. The kana changes are
+    # always worked out in Python (see store._plan). By default so are the vocabulary changes. With dry_run set,
+    # the plans are printed but not applied. With in_sql set, the vocabulary workbook is staged in TEMP tables and
+    # SQLite works out and applies the changes itself (see store._staging); the returned plan has no vocabulary
+    # plan in that case.
+
+    if dry_run:
+        return _DatabaseChangePlan(_update_kana(dry_run=True), _update_vocabulary(dry_run=True))
 
     _backup()
-    _update_vocabulary()
+    vocabulary_plan = None
+    with _dbms.transaction():
+        kana_plan = _update_kana()
+        if in_sql:
+            _update_vocabulary_in_sql()
+        else:
+            vocabulary_plan = _update_vocabulary()
 
-    return
+    return _DatabaseChangePlan(kana_plan, vocabulary_plan)
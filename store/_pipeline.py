@@ -0,0 +1,133 @@
+import gc as _gc
+import queue as _queue
+import threading as _threading
+from typing import Iterator as _Iterator
+from typing import Optional as _Optional
+
+import store.dbms as _dbms
+from ._exceptions import StoreException
+from ._data_files import DataFiles as _files
+from ._schema import TABLE_SCHEMAS as _TABLE_SCHEMAS
+from ._schema import QUIZ_METRIC_VALUES as _QUIZ_METRIC_VALUES
+from ._tags import tag_ids as _tag_ids
+from ._types import VocabWorkbookRecord as _VocabWorkbookRecord
+from .spreadsheet import open_spreadsheet as _open_spreadsheet
+
+
+# A pipelined alternative to store._impl._populate_vocabulary(): a parser thread streams the vocabulary
+# spreadsheet's rows (sheet by sheet, see store.spreadsheet.open_spreadsheet) into a bounded queue in chunks,
+# and the calling thread drains the queue, writing each chunk's words, notes and tags with executemany while the
+# parser carries on with the next chunks. The writer is the calling thread so that its inserts join whatever
+# dbms transaction the caller has open (populate_tables() populates all the tables in one). Memory use doesn't
+# grow with the size of the vocabulary: at most _QUEUE_SIZE chunks of _CHUNK_SIZE words are ever waiting, and the
+# parser has one sheet of the spreadsheet decoded at a time (numbers_parser decodes a sheet's tables all at once),
+# each sheet being let go of once its rows have been chunked (see store.spreadsheet.LazyWorkbook).
+
+_CHUNK_SIZE = 500  # words per chunk
+_QUEUE_SIZE = 4  # chunks
+_PUT_TIMEOUT = 0.1  # seconds between checks on whether the writer has given up
+
+
+class _ParserFailed:
+
+    def __init__(self, exception: BaseException):
+        self.exception: BaseException = exception
+
+
+_DONE = None  # put on the queue after the last chunk
+
+
+def _words(path: str) -> _Iterator[_VocabWorkbookRecord]:
+    # A sheet's decoded tables are only referenced from the tables list taken here, so they can go (along with the
+    # numbers_parser model they were decoded from) once its rows have been read. numbers_parser's objects refer to
+    # each other, though, so they are only freed by the cycle collector; run it before decoding the next sheet
+    # rather than leaving the next sheet to be decoded on top of this one.
+    for sheet in _open_spreadsheet(path).sheets:
+        tables = sheet.tables
+        for table in tables:
+            for row in table.iter_rows():
+                yield _VocabWorkbookRecord(row)
+        del tables
+        _gc.collect()
+    return
+
+
+def _parse(path: str, chunks: _queue.Queue, stop: _threading.Event) -> None:
+
+    def put(item) -> bool:
+        # Blocks while the queue is full, but gives up if the writer has stopped draining it
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except _queue.Full:
+                pass
+        return False
+
+    try:
+        chunk: list[_VocabWorkbookRecord] = []
+        for word in _words(path):
+            chunk.append(word)
+            if len(chunk) == _CHUNK_SIZE:
+                if not put(chunk):
+                    return
+                chunk = []
+        if chunk and not put(chunk):
+            return
+        put(_DONE)
+    except BaseException as e:
+        put(_ParserFailed(e))
+
+    return
+
+
+def _write(chunk: list[_VocabWorkbookRecord]) -> None:
+
+    rows = [_dbms.Row([w.english, w.romaji, w.kana, w.kanji, w.part_of_speech] + _QUIZ_METRIC_VALUES +
+                      [w.fingerprint]) for w in chunk]
+
+    # The row ids of the words just inserted are needed for their notes and tags
+    word_ids = _dbms.insert_many('vocab', _TABLE_SCHEMAS['vocab'], rows, return_ids=True)
+
+    _dbms.insert_many('vocab_notes', _TABLE_SCHEMAS['vocab_notes'],
+                      [_dbms.Row([word_ids[w.kana], w.note]) for w in chunk if w.note])
+    tag_ids = _tag_ids([t for w in chunk for t in w.tags])
+    _dbms.insert_many('vocab_tags', _TABLE_SCHEMAS['vocab_tags'],
+                      [_dbms.Row([word_ids[w.kana], tag_ids[t]]) for w in chunk for t in w.tags])
+
+    return
+
+
+def populate_vocabulary(path: _Optional[str] = None) -> int:
+
+    # Returns the number of words written. Unlike the non-pipelined populate (which keeps the last of any
+    # duplicated words), a word whose kana appears more than once in the spreadsheet is an error since an
+    # earlier copy may already have been written by the time the duplicate is read.
+
+    path = path if path else _files.vocab_spreadsheet
+    chunks: _queue.Queue = _queue.Queue(maxsize=_QUEUE_SIZE)
+    stop = _threading.Event()
+    parser = _threading.Thread(target=_parse, args=(path, chunks, stop), name='populate-vocabulary-parser',
+                               daemon=True)
+
+    seen: set[str] = set()
+    parser.start()
+    try:
+        with _dbms.transaction():
+            while True:
+                chunk = chunks.get()
+                if chunk is _DONE:
+                    break
+                if isinstance(chunk, _ParserFailed):
+                    raise chunk.exception
+                for word in chunk:
+                    if word.kana in seen:
+                        raise StoreException(f'kana "{word.kana}" occurs more than once in the vocabulary '
+                                             f'spreadsheet')
+                    seen.add(word.kana)
+                _write(chunk)
+    finally:
+        stop.set()
+        parser.join()
+
+    return len(seen)
@@ -0,0 +1,385 @@
+import store.dbms as _dbms
+from ._schema import TABLE_SCHEMAS as _TABLE_SCHEMAS
+from ._schema import QUIZ_METRIC_COLUMNS as _QUIZ_METRIC_COLUMNS
+from ._schema import QUIZ_METRIC_VALUES as _QUIZ_METRIC_VALUES
+from ._tags import tag_ids as _tag_ids
+from ._tags import delete_unused_tags as _delete_unused_tags
+from ._types import VocabWorkbook as _VocabWorkbook
+from ._types import VocabDatabase as _VocabDatabase
+from ._types import DatabaseWordRecord as _DatabaseWordRecord
+from ._types import VocabDatabaseTagRecord as _VocabDatabaseTagRecord
+from ._types import VocabWorkbookRecord as _VocabWorkbookRecord
+from ._types import KanaWorkbook as _KanaWorkbook
+from ._types import KanaWorkbookRecord as _KanaWorkbookRecord
+from ._types import KanaDatabase as _KanaDatabase
+from ._types import KanaDatabaseRecord as _KanaDatabaseRecord
+from typing import Optional
+
+
+# The vocab columns a sync may change; a word's quiz metrics are never touched by an update
+_VOCAB_UPDATE_COLUMNS = _dbms.ColumnDefinitions({k: v for k, v in _TABLE_SCHEMAS['vocab'].items()
+                                                 if k not in _QUIZ_METRIC_COLUMNS})
+
+
+# The kana columns a sync may change (as with vocab, never the quiz metrics)
+_KANA_UPDATE_COLUMNS = _dbms.ColumnDefinitions({k: v for k, v in _TABLE_SCHEMAS['kana'].items()
+                                                if k not in _QUIZ_METRIC_COLUMNS})
+
+
+def _vocab_values(word: _DatabaseWordRecord | _VocabWorkbookRecord) -> list:
+    return [word.english, word.romaji, word.kana, word.kanji, word.part_of_speech]
+
+
+class WordUpdate:
+
+    # The differences between a word in the database and the same word (i.e., the same kana) in the workbook
+
+    def __init__(self, db_word: _DatabaseWordRecord, wb_word: _VocabWorkbookRecord):
+        assert db_word.kana == wb_word.kana
+
+        self._db_word: _DatabaseWordRecord = db_word
+        self._wb_word: _VocabWorkbookRecord = wb_word
+        self._vocab_changed: bool = _vocab_values(db_word) != _vocab_values(wb_word)
+
+        db_note = db_word.note.value if db_word.note else None
+        self._note_changed: bool = db_note != wb_word.note
+
+        db_tags = {t.value: t for t in db_word.tags} if db_word.tags else {}
+        wb_tags = set(wb_word.tags)
+        self._tags_added: list[str] = [t for t in wb_word.tags if t not in db_tags]
+        self._tags_deleted: list[_VocabDatabaseTagRecord] = [t for v, t in db_tags.items() if v not in wb_tags]
+        return
+
+    @property
+    def db_word(self) -> _DatabaseWordRecord: return self._db_word
+
+    @property
+    def wb_word(self) -> _VocabWorkbookRecord: return self._wb_word
+
+    @property
+    def vocab_changed(self) -> bool: return self._vocab_changed
+
+    @property
+    def note_changed(self) -> bool: return self._note_changed
+
+    @property
+    def tags_added(self) -> list[str]: return self._tags_added
+
+    @property
+    def tags_deleted(self) -> list[_VocabDatabaseTagRecord]: return self._tags_deleted
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self._vocab_changed or self._note_changed or self._tags_added or self._tags_deleted)
+
+    def __str__(self):
+        changes = []
+        if self._vocab_changed:
+            changes.append(f'{_vocab_values(self._db_word)} -> {_vocab_values(self._wb_word)}')
+        if self._note_changed:
+            changes.append(f'note {self._db_word.note.value if self._db_word.note else None!r} -> '
+                           f'{self._wb_word.note!r}')
+        if self._tags_added:
+            changes.append(f'tags added {self._tags_added}')
+        if self._tags_deleted:
+            changes.append(f'tags deleted {[t.value for t in self._tags_deleted]}')
+        return f'{self._wb_word.kana}: {"; ".join(changes)}'
+
+
+class VocabularyChangePlan:
+
+    # The complete set of changes needed to bring the vocab, vocab_notes and vocab_tags tables in line with
+    # the vocabulary workbook. Planning only reads; nothing changes in the database until apply() is called,
+    # so printing a plan without applying it gives a dry run of the sync.
+
+    def __init__(self, workbook: _VocabWorkbook, database: _VocabDatabase):
+
+        wb_words = workbook.word_map
+        db_words = database.word_map
+        db_fingerprints = database.fingerprints
+
+        self._deletes: list[_DatabaseWordRecord] = [w for k, w in db_words.items() if k not in wb_words]
+        self._adds: list[_VocabWorkbookRecord] = []
+        self._updates: list[WordUpdate] = []
+        self._stale: list[WordUpdate] = []  # unchanged words whose stored fingerprint is missing or out of date
+
+        for kana, wb_word in wb_words.items():
+            if kana not in db_fingerprints:
+                self._adds.append(wb_word)
+            elif db_fingerprints[kana] != wb_word.fingerprint:
+                # Only words whose fingerprints differ need to be compared field by field (and only they are
+                # loaded in full by a VocabDatabase built from the workbook)
+                update = WordUpdate(db_words[kana], wb_word)
+                if update.is_empty:
+                    self._stale.append(update)
+                else:
+                    self._updates.append(update)
+
+        return
+
+    @property
+    def adds(self) -> list[_VocabWorkbookRecord]: return self._adds
+
+    @property
+    def deletes(self) -> list[_DatabaseWordRecord]: return self._deletes
+
+    @property
+    def updates(self) -> list[WordUpdate]: return self._updates
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self._adds or self._deletes or self._updates)
+
+    def __str__(self):
+        lines = [f'{len(self._adds)} words to add, {len(self._deletes)} words to delete, '
+                 f'{len(self._updates)} words to update']
+        lines += [f'  + {w.kana}' for w in self._adds]
+        lines += [f'  - {w.kana}' for w in self._deletes]
+        lines += [f'  ~ {u}' for u in self._updates]
+        return '\n'.join(lines)
+
+    def _apply_deletes(self) -> None:
+
+        note_ids = [w.note.row_id for w in self._deletes if w.note]
+        tag_ids = [t.row_id for w in self._deletes if w.tags for t in w.tags]
+
+        _dbms.delete_many('vocab_notes', note_ids)
+        _dbms.delete_many('vocab_tags', tag_ids)
+        _dbms.delete_many('vocab', [w.word_id for w in self._deletes])
+
+        return
+
+    def _apply_updates(self) -> None:
+
+        # Every updated word gets its new fingerprint, so its vocab row is rewritten even when only its note or
+        # tags changed
+        vocab_rows = [(u.db_word.word_id, _dbms.Row(_vocab_values(u.wb_word) + [u.wb_word.fingerprint]))
+                      for u in self._updates + self._stale]
+        _dbms.update_many('vocab', _VOCAB_UPDATE_COLUMNS, vocab_rows)
+
+        # A changed note is either new, different or gone
+        notes = [u for u in self._updates if u.note_changed]
+        _dbms.insert_many('vocab_notes', _TABLE_SCHEMAS['vocab_notes'],
+                          [_dbms.Row([u.db_word.word_id, u.wb_word.note]) for u in notes if not u.db_word.note])
+        _dbms.update_many('vocab_notes', _TABLE_SCHEMAS['vocab_notes'],
+                          [(u.db_word.note.row_id, _dbms.Row([u.db_word.word_id, u.wb_word.note])) for u in notes
+                           if u.db_word.note and u.wb_word.note])
+        _dbms.delete_many('vocab_notes', [u.db_word.note.row_id for u in notes if not u.wb_word.note])
+
+        _dbms.delete_many('vocab_tags', [t.row_id for u in self._updates for t in u.tags_deleted])
+        tag_ids = _tag_ids([t for u in self._updates for t in u.tags_added])
+        _dbms.insert_many('vocab_tags', _TABLE_SCHEMAS['vocab_tags'],
+                          [_dbms.Row([u.db_word.word_id, tag_ids[t]]) for u in self._updates for t in u.tags_added])
+
+        return
+
+    def _apply_adds(self) -> None:
+
+        # The new words' row ids are needed for their notes and tags
+        rows = [_dbms.Row(_vocab_values(w) + _QUIZ_METRIC_VALUES + [w.fingerprint]) for w in self._adds]
+        word_ids = _dbms.insert_many('vocab', _TABLE_SCHEMAS['vocab'], rows, return_ids=True)
+
+        _dbms.insert_many('vocab_notes', _TABLE_SCHEMAS['vocab_notes'],
+                          [_dbms.Row([word_ids[w.kana], w.note]) for w in self._adds if w.note])
+        tag_ids = _tag_ids([t for w in self._adds for t in w.tags])
+        _dbms.insert_many('vocab_tags', _TABLE_SCHEMAS['vocab_tags'],
+                          [_dbms.Row([word_ids[w.kana], tag_ids[t]]) for w in self._adds for t in w.tags])
+
+        return
+
+    def apply(self) -> None:
+
+        with _dbms.transaction():
+            if self._deletes:
+                self._apply_deletes()
+            if self._updates or self._stale:
+                self._apply_updates()
+            if self._adds:
+                self._apply_adds()
+            if self._deletes or self._updates:
+                _delete_unused_tags()
+
+        return
+
+
+def plan_vocabulary_changes(workbook: Optional[_VocabWorkbook] = None,
+                            database: Optional[_VocabDatabase] = None) -> VocabularyChangePlan:
+
+    # By default only the database words whose fingerprints don't match the workbook are loaded in full
+    workbook = workbook if workbook else _VocabWorkbook()
+    return VocabularyChangePlan(workbook, database if database else _VocabDatabase(workbook))
+
+
+def _kana_values(kana: _KanaDatabaseRecord | _KanaWorkbookRecord) -> list:
+    return [kana.romaji, kana.hiragana, kana.katakana, kana.category]
+
+
+def kana_note_values(kana: _KanaWorkbookRecord) -> Optional[list]:
+    # A workbook kana's notes as they go in the kana_notes table's note columns (in the same order
+    # store._impl._populate_kana() has always written them); None if the kana has no notes
+    if kana.hiragana_note is None and kana.katakana_note is None:
+        return None
+    return [kana.hiragana_note, kana.katakana_note]
+
+
+class KanaUpdate:
+
+    # The differences between a kana character in the database and the same character (i.e., the same romaji)
+    # in the workbook
+
+    def __init__(self, db_kana: _KanaDatabaseRecord, wb_kana: _KanaWorkbookRecord):
+        assert db_kana.romaji == wb_kana.romaji
+
+        self._db_kana: _KanaDatabaseRecord = db_kana
+        self._wb_kana: _KanaWorkbookRecord = wb_kana
+        self._kana_changed: bool = _kana_values(db_kana) != _kana_values(wb_kana)
+        self._note_changed: bool = db_kana.note_values != kana_note_values(wb_kana)
+        return
+
+    @property
+    def db_kana(self) -> _KanaDatabaseRecord: return self._db_kana
+
+    @property
+    def wb_kana(self) -> _KanaWorkbookRecord: return self._wb_kana
+
+    @property
+    def kana_changed(self) -> bool: return self._kana_changed
+
+    @property
+    def note_changed(self) -> bool: return self._note_changed
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self._kana_changed or self._note_changed)
+
+    def __str__(self):
+        changes = []
+        if self._kana_changed:
+            changes.append(f'{_kana_values(self._db_kana)} -> {_kana_values(self._wb_kana)}')
+        if self._note_changed:
+            changes.append(f'notes {self._db_kana.note_values} -> {kana_note_values(self._wb_kana)}')
+        return f'{self._wb_kana.romaji}: {"; ".join(changes)}'
+
+
+class KanaChangePlan:
+
+    # The changes needed to bring the kana and kana_notes tables in line with the kana workbook, matching
+    # characters on romaji. Like VocabularyChangePlan, nothing changes until apply() is called and the quiz
+    # metrics of characters that are kept are left alone.
+
+    def __init__(self, workbook: _KanaWorkbook, database: _KanaDatabase):
+
+        wb_kana = workbook.kana
+        db_kana = database.kana
+
+        self._deletes: list[_KanaDatabaseRecord] = [k for r, k in db_kana.items() if r not in wb_kana]
+        self._adds: list[_KanaWorkbookRecord] = [k for r, k in wb_kana.items() if r not in db_kana]
+        self._updates: list[KanaUpdate] = []
+
+        for romaji, kana in wb_kana.items():
+            if romaji in db_kana:
+                update = KanaUpdate(db_kana[romaji], kana)
+                if not update.is_empty:
+                    self._updates.append(update)
+
+        return
+
+    @property
+    def adds(self) -> list[_KanaWorkbookRecord]: return self._adds
+
+    @property
+    def deletes(self) -> list[_KanaDatabaseRecord]: return self._deletes
+
+    @property
+    def updates(self) -> list[KanaUpdate]: return self._updates
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self._adds or self._deletes or self._updates)
+
+    def __str__(self):
+        lines = [f'{len(self._adds)} kana to add, {len(self._deletes)} kana to delete, '
+                 f'{len(self._updates)} kana to update']
+        lines += [f'  + {k.romaji}' for k in self._adds]
+        lines += [f'  - {k.romaji}' for k in self._deletes]
+        lines += [f'  ~ {u}' for u in self._updates]
+        return '\n'.join(lines)
+
+    def _apply_deletes(self) -> None:
+
+        _dbms.delete_many('kana_notes', [k.note_id for k in self._deletes if k.note_id is not None])
+        _dbms.delete_many('kana', [k.kana_id for k in self._deletes])
+
+        return
+
+    def _apply_updates(self) -> None:
+
+        _dbms.update_many('kana', _KANA_UPDATE_COLUMNS,
+                          [(u.db_kana.kana_id, _dbms.Row(_kana_values(u.wb_kana))) for u in self._updates
+                           if u.kana_changed])
+
+        # A changed note is either new, different or gone
+        notes = [(u.db_kana, kana_note_values(u.wb_kana)) for u in self._updates if u.note_changed]
+        _dbms.insert_many('kana_notes', _TABLE_SCHEMAS['kana_notes'],
+                          [_dbms.Row([k.kana_id] + n) for k, n in notes if k.note_id is None])
+        _dbms.update_many('kana_notes', _TABLE_SCHEMAS['kana_notes'],
+                          [(k.note_id, _dbms.Row([k.kana_id] + n)) for k, n in notes
+                           if k.note_id is not None and n is not None])
+        _dbms.delete_many('kana_notes', [k.note_id for k, n in notes if n is None])
+
+        return
+
+    def _apply_adds(self) -> None:
+
+        rows = [_dbms.Row(_kana_values(k) + _QUIZ_METRIC_VALUES) for k in self._adds]
+        kana_ids = _dbms.insert_many('kana', _TABLE_SCHEMAS['kana'], rows, return_ids=True)
+
+        _dbms.insert_many('kana_notes', _TABLE_SCHEMAS['kana_notes'],
+                          [_dbms.Row([kana_ids[k.romaji]] + kana_note_values(k)) for k in self._adds
+                           if kana_note_values(k) is not None])
+
+        return
+
+    def apply(self) -> None:
+
+        with _dbms.transaction():
+            if self._deletes:
+                self._apply_deletes()
+            if self._updates:
+                self._apply_updates()
+            if self._adds:
+                self._apply_adds()
+
+        return
+
+
+def plan_kana_changes(workbook: Optional[_KanaWorkbook] = None,
+                      database: Optional[_KanaDatabase] = None) -> KanaChangePlan:
+
+    return KanaChangePlan(workbook if workbook else _KanaWorkbook(), database if database else _KanaDatabase())
+
+
+class DatabaseChangePlan:
+
+    # The kana and vocabulary plans that store.update_database() worked out. vocabulary is None when the
+    # vocabulary changes were worked out and applied in SQL (see store._staging), in which case there is no plan
+    # to show for them.
+
+    def __init__(self, kana: KanaChangePlan, vocabulary: Optional[VocabularyChangePlan]):
+        self._kana: KanaChangePlan = kana
+        self._vocabulary: Optional[VocabularyChangePlan] = vocabulary
+        return
+
+    @property
+    def kana(self) -> KanaChangePlan: return self._kana
+
+    @property
+    def vocabulary(self) -> Optional[VocabularyChangePlan]: return self._vocabulary
+
+    @property
+    def is_empty(self) -> bool:
+        # Without a vocabulary plan there's no telling whether the vocabulary changed
+        return self._kana.is_empty and self._vocabulary is not None and self._vocabulary.is_empty
+
+    def __str__(self):
+        return '\n'.join([str(self._kana), str(self._vocabulary) if self._vocabulary else 'vocabulary synced in SQL'])
@@ -10,6 +10,7 @@ _QUIZ_METRICS = {
 }
 
 QUIZ_METRIC_COLUMNS = _QUIZ_METRICS.keys()
+QUIZ_METRIC_VALUES = [0] * len(_QUIZ_METRICS)  # of a character or word that has never been quizzed
 
 TABLE_SCHEMAS = {
     'vocab':
@@ -20,7 +21,9 @@ TABLE_SCHEMAS = {
                 'kana_w': ColumnTypes.TEXT,
                 'kanji_w': ColumnTypes.TEXT,
                 'part_of_speech': ColumnTypes.TEXT
-            } | _QUIZ_METRICS,
+            } | _QUIZ_METRICS | {
+                'fingerprint': ColumnTypes.TEXT  # see store._types.word_fingerprint()
+            },
             unique_column='kana_w'
         ),
     'vocab_notes':
@@ -28,14 +31,23 @@ TABLE_SCHEMAS = {
             {
                 'word_id': ColumnTypes.INTEGER,
                 'note': ColumnTypes.TEXT,
-            }
+            },
+            indexes=['word_id']
+        ),
+    'tags':
+        ColumnDefinitions(
+            {
+                'tag': ColumnTypes.TEXT,
+            },
+            unique_column='tag'
         ),
     'vocab_tags':
         ColumnDefinitions(
             {
                 'word_id': ColumnTypes.INTEGER,
-                'tag': ColumnTypes.TEXT,
-            }
+                'tag_id': ColumnTypes.INTEGER,  # row id in tags
+            },
+            indexes=[('word_id', 'tag_id'), 'tag_id']
         ),
     'kana':
         ColumnDefinitions(
@@ -45,7 +57,8 @@ TABLE_SCHEMAS = {
                 'katakana': ColumnTypes.TEXT,
                 'category': ColumnTypes.TEXT
             } | _QUIZ_METRICS,
-            unique_column='romaji'
+            unique_column='romaji',
+            indexes=['category']
         ),
     'kana_notes':
         ColumnDefinitions(
@@ -53,8 +66,7 @@ TABLE_SCHEMAS = {
                 'kana_id': ColumnTypes.INTEGER,
                 'katakana_note': ColumnTypes.TEXT,
                 'hiragana_note': ColumnTypes.TEXT,
-            }
+            },
+            indexes=['kana_id']
         ),
 }
-
-
@@ -0,0 +1,137 @@
+import store.dbms as _dbms
+from ._schema import QUIZ_METRIC_COLUMNS as _QUIZ_METRIC_COLUMNS
+from ._schema import QUIZ_METRIC_VALUES as _QUIZ_METRIC_VALUES
+from ._types import VocabWorkbook as _VocabWorkbook
+from ._tags import delete_unused_tags as _delete_unused_tags
+
+
+# A vocabulary sync done by SQLite rather than in Python: the workbook's words and tags are bulk loaded into
+# TEMP staging tables and the vocab, vocab_notes, tags and vocab_tags tables are brought in line with them by a
+# handful of set-based statements (anti-joins, EXCEPT and UPDATE ... FROM). TEMP tables belong to the
+# connection that created them, so everything here runs inside one dbms transaction.
+
+_CREATE_STAGING_TABLES = [
+    'CREATE TEMP TABLE vocab_staging (position INTEGER, english_w TEXT, romaji_w TEXT, '
+    'kana_w TEXT NOT NULL PRIMARY KEY, kanji_w TEXT, part_of_speech TEXT, note TEXT, fingerprint TEXT)',
+    'CREATE TEMP TABLE vocab_tags_staging (position INTEGER, kana_w TEXT, tag TEXT, PRIMARY KEY (kana_w, tag))',
+]
+
+_DROP_STAGING_TABLES = [
+    'DROP TABLE IF EXISTS temp.vocab_staging',
+    'DROP TABLE IF EXISTS temp.vocab_tags_staging',
+]
+
+_INSERT_STAGED_WORD = 'INSERT INTO temp.vocab_staging VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+_INSERT_STAGED_TAG = 'INSERT OR IGNORE INTO temp.vocab_tags_staging VALUES (?, ?, ?)'
+
+_DELETED_WORDS = 'SELECT _ROWID_ FROM vocab WHERE kana_w NOT IN (SELECT kana_w FROM temp.vocab_staging)'
+
+_VOCAB_DIFFERS = \
+    '(v.english_w IS NOT s.english_w OR v.romaji_w IS NOT s.romaji_w OR v.kanji_w IS NOT s.kanji_w ' \
+    'OR v.part_of_speech IS NOT s.part_of_speech)'
+
+_NOTE_DIFFERS = '(SELECT n.note FROM vocab_notes AS n WHERE n.word_id = v._ROWID_) IS NOT s.note'
+
+_WORD_TAGS = 'SELECT tg.tag FROM vocab_tags AS vt JOIN tags AS tg ON tg._ROWID_ = vt.tag_id WHERE vt.word_id = v._ROWID_'
+
+_TAGS_DIFFER = \
+    f'(EXISTS ({_WORD_TAGS} EXCEPT SELECT tag FROM temp.vocab_tags_staging WHERE kana_w = v.kana_w) ' \
+    f' OR EXISTS (SELECT tag FROM temp.vocab_tags_staging WHERE kana_w = v.kana_w EXCEPT {_WORD_TAGS}))'
+
+_COUNT_DELETES = 'SELECT COUNT(*) FROM vocab WHERE kana_w NOT IN (SELECT kana_w FROM temp.vocab_staging)'
+_COUNT_ADDS = 'SELECT COUNT(*) FROM temp.vocab_staging WHERE kana_w NOT IN (SELECT kana_w FROM vocab)'
+_COUNT_UPDATES = \
+    f'SELECT COUNT(*) FROM vocab AS v JOIN temp.vocab_staging AS s ON s.kana_w = v.kana_w ' \
+    f'WHERE {_VOCAB_DIFFERS} OR {_NOTE_DIFFERS} OR {_TAGS_DIFFER}'
+
+_SYNC_STATEMENTS = [
+    # Words no longer in the workbook go, along with their notes and tags
+    f'DELETE FROM vocab_notes WHERE word_id IN ({_DELETED_WORDS})',
+    f'DELETE FROM vocab_tags WHERE word_id IN ({_DELETED_WORDS})',
+    'DELETE FROM vocab WHERE kana_w NOT IN (SELECT kana_w FROM temp.vocab_staging)',
+
+    # Changed words are updated in place, which leaves their quiz metrics alone; the fingerprint (worked out in
+    # Python when the word was staged) differs whenever the word, its note or its tags changed
+    'UPDATE vocab AS v SET english_w = s.english_w, romaji_w = s.romaji_w, kanji_w = s.kanji_w, '
+    'part_of_speech = s.part_of_speech, fingerprint = s.fingerprint '
+    'FROM temp.vocab_staging AS s WHERE s.kana_w = v.kana_w AND v.fingerprint IS NOT s.fingerprint',
+
+    # New words are added in workbook order with zeroed quiz metrics
+    f'INSERT INTO vocab (english_w, romaji_w, kana_w, kanji_w, part_of_speech, {", ".join(_QUIZ_METRIC_COLUMNS)}, '
+    f'fingerprint) '
+    f'SELECT english_w, romaji_w, kana_w, kanji_w, part_of_speech, {", ".join(str(v) for v in _QUIZ_METRIC_VALUES)}, '
+    f'fingerprint '
+    f'FROM temp.vocab_staging WHERE kana_w NOT IN (SELECT kana_w FROM vocab) ORDER BY position',
+
+    # Notes: removed, changed, then new (which includes the notes of the words just added)
+    'DELETE FROM vocab_notes WHERE word_id IN '
+    '(SELECT v._ROWID_ FROM vocab AS v JOIN temp.vocab_staging AS s ON s.kana_w = v.kana_w WHERE s.note IS NULL)',
+    # (the FROM side of an UPDATE ... FROM is materialised, so vocab's rowid isn't visible there; go through
+    # a correlated subquery instead)
+    'UPDATE vocab_notes SET note = s.note '
+    'FROM temp.vocab_staging AS s '
+    'WHERE s.kana_w = (SELECT kana_w FROM vocab WHERE _ROWID_ = vocab_notes.word_id) '
+    'AND s.note IS NOT NULL AND vocab_notes.note IS NOT s.note',
+    'INSERT INTO vocab_notes (word_id, note) '
+    'SELECT v._ROWID_, s.note FROM vocab AS v JOIN temp.vocab_staging AS s ON s.kana_w = v.kana_w '
+    'WHERE s.note IS NOT NULL AND NOT EXISTS (SELECT 1 FROM vocab_notes AS n WHERE n.word_id = v._ROWID_) '
+    'ORDER BY s.position',
+
+    # Tags: any new to the tags table are interned first; then a word's tags in the database but not the
+    # workbook go and the ones in the workbook but not the database are added
+    'INSERT OR IGNORE INTO tags (tag) SELECT tag FROM temp.vocab_tags_staging ORDER BY position, _ROWID_',
+    'DELETE FROM vocab_tags WHERE (word_id, tag_id) IN '
+    '(SELECT word_id, tag_id FROM vocab_tags '
+    ' EXCEPT SELECT v._ROWID_, tg._ROWID_ FROM temp.vocab_tags_staging AS st '
+    ' JOIN vocab AS v ON v.kana_w = st.kana_w JOIN tags AS tg ON tg.tag = st.tag)',
+    'INSERT INTO vocab_tags (word_id, tag_id) '
+    'SELECT v._ROWID_, tg._ROWID_ FROM temp.vocab_tags_staging AS st '
+    'JOIN vocab AS v ON v.kana_w = st.kana_w JOIN tags AS tg ON tg.tag = st.tag '
+    'WHERE NOT EXISTS (SELECT 1 FROM vocab_tags AS t WHERE t.word_id = v._ROWID_ AND t.tag_id = tg._ROWID_) '
+    'ORDER BY st.position, st._ROWID_',
+]
+
+
+def _stage(workbook: _VocabWorkbook) -> None:
+
+    words = []
+    tags = []
+    for position, wb_word in enumerate(workbook.words):
+        words.append((position, wb_word.english, wb_word.romaji, wb_word.kana, wb_word.kanji,
+                      wb_word.part_of_speech, wb_word.note or None, wb_word.fingerprint))
+        tags += [(position, wb_word.kana, tag) for tag in wb_word.tags]
+
+    _dbms.execute_many(_INSERT_STAGED_WORD, words)
+    _dbms.execute_many(_INSERT_STAGED_TAG, tags)
+
+    return
+
+
+def _count(stmt: str) -> int:
+    # Exhaust the query (rather than just taking its first row) so its cursor doesn't stay open while the
+    # statements that follow run on the same connection
+    rows = list(_dbms.iter_query(stmt))
+    return rows[0][0]
+
+
+def sync_vocabulary(workbook: _VocabWorkbook) -> tuple[int, int, int]:
+
+    # Returns the number of words added, deleted and updated
+
+    with _dbms.transaction():
+
+        for stmt in _DROP_STAGING_TABLES + _CREATE_STAGING_TABLES:
+            _dbms.execute(stmt)
+
+        _stage(workbook)
+
+        num_added = _count(_COUNT_ADDS)
+        num_deleted = _count(_COUNT_DELETES)
+        num_updated = _count(_COUNT_UPDATES)
+
+        for stmt in _SYNC_STATEMENTS + _DROP_STAGING_TABLES:
+            _dbms.execute(stmt)
+
+        _delete_unused_tags()
+
+    return num_added, num_deleted, num_updated
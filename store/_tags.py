@@ -0,0 +1,33 @@
+import json as _json
+from typing import Iterable as _Iterable
+
+import store.dbms as _dbms
+
+
+# Tags are interned: each distinct tag is stored once in the tags table and vocab_tags links words to tags by
+# their ids (the tags table's row ids), so filtering words by tag or counting words per tag are integer lookups
+# on vocab_tags' indexes.
+
+_INTERN_TAG = 'INSERT OR IGNORE INTO tags (tag) VALUES (?)'
+_TAG_IDS_QUERY = 'SELECT _ROWID_, tag FROM tags WHERE tag IN (SELECT value FROM json_each(?))'
+_DELETE_UNUSED_TAGS = 'DELETE FROM tags WHERE _ROWID_ NOT IN (SELECT tag_id FROM vocab_tags)'
+
+
+def tag_ids(tags: _Iterable[str]) -> dict[str, int]:
+
+    # Returns the ids of the given tags keyed by tag, adding any tags the tags table doesn't have yet
+
+    tags = list(dict.fromkeys(tags))
+    if not tags:
+        return {}
+
+    _dbms.execute_many(_INTERN_TAG, [(tag,) for tag in tags])
+    ids = {tag: tag_id for tag_id, tag in _dbms.iter_query(_TAG_IDS_QUERY, (_json.dumps(tags, ensure_ascii=False),))}
+
+    return ids
+
+
+def delete_unused_tags() -> int:
+
+    # Removes the tags no word has any more; returns how many were removed
+    return _dbms.execute(_DELETE_UNUSED_TAGS)
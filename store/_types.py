@@ -1,9 +1,13 @@
 
 from .spreadsheet import import_spreadsheet as _import
+from .spreadsheet import Workbook as _Workbook
+from .spreadsheet import LazyWorkbook as _LazyWorkbook
 from ._exceptions import StoreException
 from ._data_files import DataFiles as _files
 import store.dbms as _dbms
 from typing import Optional
+import json as _json
+import hashlib as _hashlib
 
 
 class KanaWorkbookRecord:
@@ -32,28 +36,32 @@ class KanaWorkbookRecord:
 
 class KanaWorkbook:
 
-    def __init__(self):
+    # workbook is the already imported (or opened) kana spreadsheet; by default it is imported here
+
+    def __init__(self, workbook: Optional[_Workbook | _LazyWorkbook] = None):
 
-        workbook = _import(_files.kana_spreadsheet)
+        workbook = workbook if workbook is not None else _import(_files.kana_spreadsheet)
 
-        if len(workbook.sheets) != 2:
-            raise StoreException(f'Kana workbook should only have two sheets; it has {len(workbook.sheets)}')
+        # (each sheet's tables are only asked for once; a lazily opened sheet is decoded every time they are)
+        sheets = workbook.sheets
+        if len(sheets) != 2:
+            raise StoreException(f'Kana workbook should only have two sheets; it has {len(sheets)}')
 
-        notes_sheet = workbook.sheets[1]
-        if len(notes_sheet.tables) != 1:
+        notes_tables = sheets[1].tables
+        if len(notes_tables) != 1:
             raise StoreException(f'Kana workbook note sheet should only have one table; '
-                                 f'it has {len(notes_sheet.tables)}')
+                                 f'it has {len(notes_tables)}')
 
-        kana_sheet = workbook.sheets[0]
-        if len(kana_sheet.tables) != 5:
+        kana_tables = sheets[0].tables
+        if len(kana_tables) != 5:
             raise StoreException(f'Kana workbook kana sheet should have exactly 5 tables; '
-                                 f'it has {len(kana_sheet.tables)}')
+                                 f'it has {len(kana_tables)}')
 
         # Put the data from the "notes" table (which is on the workbook's second sheet) into a dict (the
         # "notes_map" variable) whose keys are kana characters and whose values are that kana character's note.
-        notes_table = notes_sheet.tables[0]
+        notes_table = notes_tables[0]
         notes_map: dict[str, str] = {}  # key is kana; value is note
-        for row in notes_table.rows:
+        for row in notes_table.iter_rows():
             kana = row[0]
             note = row[1]
             if kana in notes_map.keys():
@@ -61,9 +69,9 @@ class KanaWorkbook:
             notes_map[kana] = note
 
         self._rows = {}
-        for kana_table in kana_sheet.tables:
+        for kana_table in kana_tables:
             category = kana_table.name
-            for row in kana_table.rows:
+            for row in kana_table.iter_rows():
                 romaji = row[0]
                 hiragana = row[1]
                 katakana = row[2]
@@ -82,10 +90,72 @@ class KanaWorkbook:
     def kana(self) -> dict[str, KanaWorkbookRecord]: return self._rows
 
 
+def word_fingerprint(english: str, romaji: str, kanji: str, part_of_speech: str, note: Optional[str],
+                     tags: list[str]) -> str:
+
+    # A hash of everything about a word that a sync compares (kana aside, since words are matched on it). It is
+    # stored in the vocab table's fingerprint column so that a sync can tell which words are unchanged without
+    # loading their notes and tags. Tags are sorted (and deduplicated) since their order doesn't matter.
+    content = _json.dumps([english, romaji, kanji, part_of_speech, note, sorted(set(tags))], ensure_ascii=False)
+    return _hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class KanaDatabaseRecord:
+
+    # A row of the kana table along with its kana_notes row (if it has one)
+
+    def __init__(self, row):
+        self._row = row
+        return
+
+    @property
+    def kana_id(self) -> int: return self._row[0]
+
+    @property
+    def romaji(self) -> str: return self._row[1]
+
+    @property
+    def hiragana(self) -> str: return self._row[2]
+
+    @property
+    def katakana(self) -> str: return self._row[3]
+
+    @property
+    def category(self) -> str: return self._row[4]
+
+    @property
+    def note_id(self) -> Optional[int]: return self._row[5]
+
+    @property
+    def note_values(self) -> Optional[list]:
+        # The kana_notes row's note columns, in table order; None if the kana has no notes
+        return list(self._row[6:8]) if self.note_id is not None else None
+
+
+_KANA_DATABASE_QUERY = \
+    'SELECT k._ROWID_, k.romaji, k.hiragana, k.katakana, k.category, n._ROWID_, n.katakana_note, n.hiragana_note ' \
+    'FROM kana AS k LEFT JOIN kana_notes AS n ON n.kana_id = k._ROWID_'
+
+
+class KanaDatabase:
+
+    def __init__(self):
+        self._rows: dict[str, KanaDatabaseRecord] = {}  # key is romaji
+        for row in _dbms.iter_query(_KANA_DATABASE_QUERY, row_type=_dbms.Record):
+            record = KanaDatabaseRecord(row)
+            assert record.romaji not in self._rows.keys()
+            self._rows[record.romaji] = record
+        return
+
+    @property
+    def kana(self) -> dict[str, KanaDatabaseRecord]: return self._rows
+
+
 class VocabWorkbookRecord:
 
     def __init__(self, row: list):
         self._row = row
+        self._fingerprint: Optional[str] = None
 
     @property
     def english(self) -> str: return self._row[0]
@@ -104,25 +174,38 @@ class VocabWorkbookRecord:
 
     @property
     def tags(self) -> list[str]:
+        # A tag given more than once counts once (in the order it first appears), as the vocab_tags table holds a
+        # word's tag only once whichever way the tables are populated or synced
         raw_tags = self._row[5]
         if raw_tags is None:
             return []
         tags1 = raw_tags.split(';')
         tags2 = [t.strip() for t in tags1]
-        return tags2
+        return list(dict.fromkeys(tags2))
+
+    @property
+    def note(self) -> Optional[str]:
+        # An empty note is no note; such a word gets no vocab_notes row
+        return self._row[6] if self._row[6] != '' else None
 
     @property
-    def note(self) -> str: return self._row[6]
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = word_fingerprint(self.english, self.romaji, self.kanji, self.part_of_speech,
+                                                 self.note, self.tags)
+        return self._fingerprint
 
 
 class VocabWorkbook:
 
-    def __init__(self):
-        workbook = _import(_files.vocab_spreadsheet)
+    # workbook is the already imported (or opened) vocabulary spreadsheet; by default it is imported here
+
+    def __init__(self, workbook: Optional[_Workbook | _LazyWorkbook] = None):
+        workbook = workbook if workbook is not None else _import(_files.vocab_spreadsheet)
         self._rows = {}
         for sheet in workbook.sheets:
             for table in sheet.tables:
-                for row in table.rows:
+                for row in table.iter_rows():
                     wbword = VocabWorkbookRecord(row)
                     self._rows[wbword.kana] = wbword
         return
@@ -197,64 +280,66 @@ class DatabaseWordRecord:
     @property
     def tags(self) -> Optional[list[VocabDatabaseTagRecord]]: return self._tags
 
-    def is_equal(self, wb_word: VocabWorkbookRecord) -> bool:
-
-        assert self.kana == wb_word.kana
-
-        # If any of the following properties are not the same, the database word is not equal to the spreadsheet word.
-        if self.english != wb_word.english:
-            return False
-        if self.romaji != wb_word.romaji:
-            return False
-        if self.kanji != wb_word.kanji:
-            return False
-        if self.part_of_speech != wb_word.part_of_speech:
-            return False
-        if self.note:
-            if self.note.value != wb_word.note:
-                return False
-        else:  # This database word has no note.
-            if wb_word.note is not None:
-                return False
-        if self.tags:
-            if set([t.value for t in self.tags]) != set(wb_word.tags):
-                return False
-        else:  # This database word has no tags.
-            if wb_word.tags:
-                return False
-
-        return True
+    @property
+    def fingerprint(self) -> Optional[str]: return self._row[6]  # as stored; None if never computed
 
+    def content_fingerprint(self) -> str:
+        # The fingerprint worked out from the word as it is in the database now
+        return word_fingerprint(self.english, self.romaji, self.kanji, self.part_of_speech,
+                                self.note.value if self.note else None,
+                                [t.value for t in self.tags] if self.tags else [])
 
-class VocabDatabase:
 
-    def __init__(self):
-        self._word_rows = {}  # kana: _DatabaseWordRecord
+# Hydrates every word, its note and its tags in a single pass: the note comes from a LEFT JOIN and the tags
+# (vocab_tags row id and tag) are aggregated into a JSON array by a correlated subquery on vocab_tags' word_id
+# index joined to the tags table.
+_VOCAB_DATABASE_QUERY = \
+    'SELECT v._ROWID_, v.english_w, v.romaji_w, v.kana_w, v.kanji_w, v.part_of_speech, v.fingerprint, ' \
+    'n._ROWID_, n.note, ' \
+    '(SELECT json_group_array(json_array(t.tag_id, t.tag)) ' \
+    ' FROM (SELECT vt._ROWID_ AS tag_id, tg.tag FROM vocab_tags AS vt JOIN tags AS tg ON tg._ROWID_ = vt.tag_id ' \
+    '       WHERE vt.word_id = v._ROWID_ ORDER BY vt._ROWID_) AS t) ' \
+    'FROM vocab AS v LEFT JOIN vocab_notes AS n ON n.word_id = v._ROWID_'
+
+_VOCAB_FINGERPRINT_QUERY = 'SELECT _ROWID_, kana_w, fingerprint FROM vocab'
 
-        note_rows = {}  # key is word_id; value is VocabDatabaseNoteRecord
-        tag_rows = {}   # key is word_id: value is list[VocabDatabaseTagRecord]
 
-        rows = _dbms.fetch_all('vocab_notes')
-        for row in rows:
-            db_note = VocabDatabaseNoteRecord(row)
-            assert db_note.word_id not in note_rows.keys()
-            note_rows[db_note.word_id] = db_note
+class VocabDatabase:
 
-        rows = _dbms.fetch_all('vocab_tags')
-        for row in rows:
-            db_tag = VocabDatabaseTagRecord(row)
-            if db_tag.word_id not in tag_rows.keys():
-                tag_rows[db_tag.word_id] = []
-            tag_rows[db_tag.word_id].append(db_tag)
+    # With no workbook, every word in the database is loaded along with its note and tags. Given a workbook,
+    # only the fingerprints of all the words are read at first and then just the words whose fingerprint
+    # doesn't match the workbook's (or which are not in the workbook at all) are loaded in full; those are the
+    # only words a sync has to look at. Either way "fingerprints" covers every word in the database.
 
-        rows = _dbms.fetch_all('vocab')
-        for row in rows:
+    def __init__(self, workbook: Optional[VocabWorkbook] = None):
+        self._word_rows = {}  # kana: _DatabaseWordRecord
+        self._fingerprints: dict[str, Optional[str]] = {}  # kana: fingerprint
+
+        stmt = _VOCAB_DATABASE_QUERY
+        parameters = ()
+
+        if workbook is not None:
+            wb_words = workbook.word_map
+            word_ids = []
+            for word_id, kana, fingerprint in _dbms.iter_query(_VOCAB_FINGERPRINT_QUERY):
+                self._fingerprints[kana] = fingerprint
+                wb_word = wb_words.get(kana)
+                if wb_word is None or fingerprint is None or wb_word.fingerprint != fingerprint:
+                    word_ids.append(word_id)
+            if not word_ids:
+                return
+            stmt += ' WHERE v._ROWID_ IN (SELECT value FROM json_each(?))'
+            parameters = (_json.dumps(word_ids),)
+
+        for row in _dbms.iter_query(stmt, parameters, row_type=_dbms.Record):
             word_id = row[0]
-            note = note_rows[word_id] if word_id in note_rows.keys() else None
-            tag = tag_rows[word_id] if word_id in tag_rows.keys() else None
-            db_word = DatabaseWordRecord(row, note, tag)
+            note_id, note_value, tags_json = row[7], row[8], row[9]
+            note = VocabDatabaseNoteRecord((note_id, word_id, note_value)) if note_id is not None else None
+            tags = [VocabDatabaseTagRecord((tag_id, word_id, tag)) for tag_id, tag in _json.loads(tags_json)]
+            db_word = DatabaseWordRecord(row[:7], note, tags if tags else None)
             assert db_word.kana not in self._word_rows.keys()
             self._word_rows[db_word.kana] = db_word
+            self._fingerprints[db_word.kana] = db_word.fingerprint
 
         return
 
@@ -263,3 +348,6 @@ class VocabDatabase:
 
     @property
     def word_map(self) -> dict[str, DatabaseWordRecord]: return self._word_rows
+
+    @property
+    def fingerprints(self) -> dict[str, Optional[str]]: return self._fingerprints
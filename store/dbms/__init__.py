@@ -2,15 +2,31 @@
 from ._custom_types import ColumnTypes
 from ._custom_types import ColumnDefinitions
 from ._custom_types import Row
+from ._custom_types import Record
+from ._pool import PoolStatistics
 
 from ._impl import create_database
 from ._impl import create_table
+from ._impl import create_indexes
+from ._impl import add_columns
 from ._impl import fetch_all
 from ._impl import fetch_distinct
 from ._impl import fetch_where
+from ._impl import iter_all
+from ._impl import iter_where
+from ._impl import iter_query
 from ._impl import insert
 from ._impl import insert_many
 from ._impl import update
 from ._impl import delete
+from ._impl import update_many
+from ._impl import delete_many
+from ._impl import transaction
+from ._impl import execute
+from ._impl import execute_many
+from ._impl import backup_database
+from ._impl import pool_statistics
+from ._impl import reset_pool_statistics
+from ._impl import close_connections
 
 from ._exceptions import *
@@ -0,0 +1,50 @@
+import sqlite3 as _sql
+from threading import Lock as _Lock
+from typing import Optional as _Optional
+
+
+class SchemaCatalog:
+
+    # An in-process copy of the database's table and column definitions. It is loaded from sqlite_master and
+    # "pragma table_info" the first time it is needed and reloaded only when it has been invalidated (by
+    # create_table) or when the database's schema_version has moved on, e.g. because some other connection
+    # or process changed the schema.
+
+    def __init__(self):
+        self._lock = _Lock()
+        self._database: _Optional[str] = None
+        self._schema_version: _Optional[int] = None
+        self._tables: dict[str, dict[str, str]] = {}  # key is table name; value maps column name to column type
+        return
+
+    def _load(self, crs: _sql.Cursor, database: str, schema_version: int) -> None:
+
+        crs.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        table_names = [str(row[0]) for row in crs.fetchall()]
+
+        tables: dict[str, dict[str, str]] = {}
+        for table_name in table_names:
+            crs.execute('SELECT name, type FROM pragma_table_info(?)', (table_name,))
+            tables[table_name] = {str(row[0]): str(row[1]).lower() for row in crs.fetchall()}
+
+        self._tables = tables
+        self._database = database
+        self._schema_version = schema_version
+        return
+
+    def tables(self, crs: _sql.Cursor, database: str) -> dict[str, dict[str, str]]:
+
+        crs.execute('PRAGMA schema_version')
+        schema_version = crs.fetchone()[0]
+
+        with self._lock:
+            if database != self._database or schema_version != self._schema_version:
+                self._load(crs, database, schema_version)
+            return self._tables
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._database = None
+            self._schema_version = None
+            self._tables = {}
+        return
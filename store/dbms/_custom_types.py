@@ -4,6 +4,8 @@
 from collections import UserDict as _UserDict
 from collections import UserList as _UserList
 from enum import Enum as _Enum
+from functools import lru_cache as _lru_cache
+from operator import itemgetter as _itemgetter
 from ._exceptions import UndefinedColumnName, InvalidColumnNameType, InvalidColumnType
 from typing import Optional as _Optional
 
@@ -15,7 +17,7 @@ class ColumnTypes(_Enum):
 
 class ColumnDefinitions(_UserDict):
 
-    def __init__(self, dict_inst=None, unique_column: str = None):
+    def __init__(self, dict_inst=None, unique_column: str = None, indexes: list[str | tuple[str, ...]] = None):
         super().__init__(dict_inst)
 
         if unique_column:
@@ -23,7 +25,17 @@ class ColumnDefinitions(_UserDict):
             if unique_column not in self.data.keys():
                 raise UndefinedColumnName(unique_column)
 
+        # Each index is either a single column name or, for a composite index, a tuple of column names
+        index_list: list[tuple[str, ...]] = []
+        for index in indexes or []:
+            columns = tuple([c.lower() for c in ((index,) if isinstance(index, str) else index)])
+            for column in columns:
+                if column not in self.data.keys():
+                    raise UndefinedColumnName(column)
+            index_list.append(columns)
+
         self._unique_column: str = unique_column
+        self._indexes: list[tuple[str, ...]] = index_list
         return
 
     def __setitem__(self, key, value):
@@ -40,6 +52,10 @@ class ColumnDefinitions(_UserDict):
     def unique_column(self) -> _Optional[str]:
         return self._unique_column
 
+    @property
+    def indexes(self) -> list[tuple[str, ...]]:
+        return self._indexes
+
 
 class Row(_UserList):
 
@@ -48,3 +64,46 @@ class Row(_UserList):
         if not (isinstance(value, str) or isinstance(value, int) or value is None):
             raise TypeError
         self.data[index] = value
+
+
+class Record(tuple):
+
+    # A compact, immutable alternative to Row. Records are plain tuples (no per-instance dict or list copy)
+    # whose values can also be read by column name, either as attributes or with a str index; the row id
+    # is available as "row_id". Fetch functions build them through the cursor's row_factory when they are
+    # called with row_type=Record.
+
+    __slots__ = ()
+    _fields: tuple[str, ...] = ()
+    _index: dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise UndefinedColumnName(key)
+        return tuple.__getitem__(self, key)
+
+    def __repr__(self):
+        values = ', '.join([f'{f}={v!r}' for f, v in zip(self._fields, self)])
+        return f'Record({values})'
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return self._fields
+
+    def as_row(self) -> Row:
+        return Row(self)
+
+
+@_lru_cache(maxsize=128)
+def record_type(column_names: tuple[str, ...]) -> type[Record]:
+
+    # Record subclasses are created once per distinct set of column names; each column gets a read-only
+    # attribute like a namedtuple field
+    fields = tuple(['row_id' if c.lower() in ('rowid', '_rowid_', 'oid') else c for c in column_names])
+    attrs = {name: property(_itemgetter(i)) for i, name in enumerate(fields)}
+    attrs.update({'__slots__': (), '_fields': fields, '_index': {name: i for i, name in enumerate(fields)}})
+
+    return type('Record', (Record,), attrs)
@@ -5,51 +5,182 @@ from ._exceptions import *
 from ._custom_types import ColumnDefinitions as _ColumnDefinitions
 from ._custom_types import ColumnTypes as _ColumnTypes
 from ._custom_types import Row as _Row
+from ._custom_types import Record as _Record
+from ._custom_types import record_type as _record_type
+from ._catalog import SchemaCatalog as _SchemaCatalog
+from ._pool import ConnectionPool as _ConnectionPool
+from ._pool import PoolStatistics as _PoolStatistics
+from . import _statements
 import sqlite3 as _sql
+from threading import local as _local
+from typing import Callable as _Callable
+from typing import Iterable as _Iterable
+from typing import Iterator as _Iterator
 from typing import Optional as _Optional
+from itertools import islice as _islice
+from os import getpid as _getpid
+from os import remove as _remove
+from os import replace as _replace
 from os.path import exists as _exists
+from time import sleep as _sleep
 
 
-class _connect:
+_pool = _ConnectionPool()
+_catalog = _SchemaCatalog()
+
+_ITER_ARRAYSIZE = 500  # number of rows iter_all/iter_where fetch from their cursor at a time
+_INSERT_CHUNK_SIZE = 1000  # number of rows insert_many validates and inserts at a time
+_BACKUP_PAGES = 256  # number of database pages backup_database copies per step
+_BACKUP_PAUSE = 0.005  # seconds backup_database waits between steps
+
+
+class _ActiveTransaction:
+
+    def __init__(self, connection: _sql.Connection, database: str):
+        self.connection: _sql.Connection = connection
+        self.database: str = database
+        self.depth: int = 0
+        return
+
+
+# The transaction (if any) the current thread is in; dbms functions called while one is active join it
+_thread_state = _local()
+
+
+def _active_transaction() -> _Optional[_ActiveTransaction]:
+    return getattr(_thread_state, 'transaction', None)
+
+
+class transaction:
+
+    # Groups every dbms call made in its scope into a single database transaction that is committed when the
+    # outermost transaction block exits normally and rolled back if it exits with an exception. Nested
+    # transaction blocks become savepoints, so an inner block that fails only undoes its own work.
 
     def __init__(self):
+        self._savepoint: _Optional[str] = None
+        return
+
+    def __enter__(self):
+
+        active = _active_transaction()
+
+        if active is None:
+            database = _files.database
+            connection = _pool.acquire(database)
+            connection.execute('BEGIN')
+            _thread_state.transaction = _ActiveTransaction(connection, database)
+        else:
+            active.depth += 1
+            self._savepoint = f'dbms_savepoint_{active.depth}'
+            active.connection.execute(f'SAVEPOINT {self._savepoint}')
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+
+        active = _active_transaction()
+
+        if self._savepoint:
+            if exc_type is not None:
+                active.connection.execute(f'ROLLBACK TO {self._savepoint}')
+            active.connection.execute(f'RELEASE {self._savepoint}')
+            active.depth -= 1
+        else:
+            _thread_state.transaction = None
+            try:
+                if exc_type is None:
+                    active.connection.commit()
+                else:
+                    active.connection.rollback()
+            finally:
+                _pool.release(active.connection, active.database)
+
+        return
+
+
+class _connect:
+
+    def __init__(self, savepoint: bool = True):
+        self._database: str = _files.database
+        self._savepoint: bool = savepoint
         self._connection: _Optional[_sql.Connection] = None
         self._cursor: _Optional[_sql.Cursor] = None
+        self._transaction: _Optional[transaction] = None
+        self._joined: bool = False
         return
 
     def __enter__(self):
-        self._connection = _sql.connect(_files.database)
+        if _active_transaction() is None:
+            self._connection = _pool.acquire(self._database)
+        elif self._savepoint:
+            # Join the caller's transaction; the work done here becomes a savepoint within it so that a
+            # failure only undoes this call's changes
+            self._transaction = transaction()
+            self._transaction.__enter__()
+            self._connection = _active_transaction().connection
+        else:
+            # Join the caller's transaction without a savepoint. This is for readers (iter_all/iter_where)
+            # whose cursors can outlive dbms calls made while they are open; a savepoint held open by one of
+            # them would not nest properly with the savepoints of those calls.
+            self._connection = _active_transaction().connection
+            self._joined = True
         self._cursor = self._connection.cursor()
         return self._cursor
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         self._cursor.close()
-        self._connection.commit()
-        self._connection.close()
+        if self._transaction:
+            self._transaction.__exit__(exc_type, exc_value, exc_traceback)
+        elif self._joined:
+            pass
+        else:
+            if exc_type is None:
+                self._connection.commit()
+            else:
+                self._connection.rollback()
+            _pool.release(self._connection, self._database)
         return
 
 
-def _validate_table_name(name: str) -> None:
+def pool_statistics() -> _PoolStatistics:
+    return _pool.statistics
 
-    with _connect() as crs:
-        # Verify a table with the given name exists in the database
-        stmt = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{name}'"
-        crs.execute(stmt)
-        rows = crs.fetchall()
-        if len(rows) == 0:
-            raise TableDoesNotExist(name)  # _sql.OperationalError(f'no such table: {table_name}')
 
+def reset_pool_statistics() -> None:
+    _pool.reset_statistics()
     return
 
 
-def _validate_columns(table_name: str, column_definitions: _ColumnDefinitions) -> None:
+def close_connections() -> None:
+    # Whatever the pooled connections were open on may have been replaced (e.g. by a restored backup), so the
+    # schema catalog goes too
+    _pool.clear()
+    _catalog.invalidate()
+    return
+
+
+def _table_definitions() -> dict[str, dict[str, str]]:
 
     with _connect() as crs:
-        # Fetch table_name's column definitions from the database
-        crs.execute(f"pragma table_info('{table_name}');")
-        rows = crs.fetchall()
+        tables = _catalog.tables(crs, _files.database)
+
+    return tables
+
+
+def _validate_table_name(name: str) -> None:
+
+    # Verify a table with the given name exists in the database
+    if name not in _table_definitions().keys():
+        raise TableDoesNotExist(name)  # _sql.OperationalError(f'no such table: {table_name}')
+
+    return
 
-    col_defs = {str(row[1]): str(row[2]).lower() for row in rows}
+
+def _validate_columns(table_name: str, column_definitions: _ColumnDefinitions) -> None:
+
+    # Fetch table_name's column definitions from the schema catalog
+    col_defs = _table_definitions().get(table_name, {})
 
     # Assure the column info passed in matches table_name's columns in the database
     for name, typ in column_definitions.items():
@@ -73,11 +204,12 @@ def _validate_rows(table_name: str, column_definitions: _ColumnDefinitions, rows
     if isinstance(rows, _Row):
         rows = [rows]
 
+    column_types = [ct.name.lower() for ct in column_definitions.values()]
+
     # Assure the data in the rows is of the correct type
     for row in rows:
         for j, col in enumerate(row):
-            ct = list(column_definitions.values())
-            ct = ct[j].name.lower()
+            ct = column_types[j]
             if ct == 'text':
                 if col:
                     if not isinstance(col, str):
@@ -90,11 +222,22 @@ def _validate_rows(table_name: str, column_definitions: _ColumnDefinitions, rows
                 raise TypeError  # I don't think we should ever end in this case, but...
 
 
+def _chunks(rows: _Iterable, size: int) -> _Iterator[list]:
+    rows = iter(rows)
+    while chunk := list(_islice(rows, size)):
+        yield chunk
+    return
+
+
 def create_database() -> None:
 
     if _exists(_files.database):
         raise FileExistsError(_files.database)
 
+    # Any pooled connections (and the schema catalog) refer to a database file that no longer exists
+    _pool.clear()
+    _catalog.invalidate()
+
     with _connect() as crs:
         pass
 
@@ -117,20 +260,76 @@ def create_table(name: str, column_definitions: _ColumnDefinitions) -> None:
 
     with _connect() as crs:
         crs.execute(stmt)
+        for index_columns in column_definitions.indexes:
+            crs.execute(_index_statement(table_name, index_columns))
+
+    _catalog.invalidate()
 
     return
 
 
+def _index_name(table_name: str, index_columns: tuple[str, ...]) -> str:
+    return f'{table_name}_{"_".join(index_columns)}_idx'
+
+
+def _index_statement(table_name: str, index_columns: tuple[str, ...]) -> str:
+    return f'CREATE INDEX IF NOT EXISTS {_index_name(table_name, index_columns)} ' \
+           f'ON {table_name} ({", ".join(index_columns)})'
+
+
+def create_indexes(name: str, column_definitions: _ColumnDefinitions) -> list[str]:
+
+    # Adds any of the indexes declared in column_definitions that an existing table doesn't have yet; returns
+    # the names of the indexes that were created
+
+    table_name = name.lower()
+    _validate_table_name(table_name)
+
+    created: list[str] = []
+
+    with _connect() as crs:
+        crs.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table_name,))
+        existing = [str(row[0]) for row in crs.fetchall()]
+        for index_columns in column_definitions.indexes:
+            if _index_name(table_name, index_columns) not in existing:
+                crs.execute(_index_statement(table_name, index_columns))
+                created.append(_index_name(table_name, index_columns))
+
+    return created
+
+
+def add_columns(name: str, column_definitions: _ColumnDefinitions) -> list[str]:
+
+    # Adds any of the columns in column_definitions that an existing table doesn't have yet (appended, in
+    # definition order, after its existing columns); returns the names of the columns that were added. Existing
+    # rows get NULL in the new columns.
+
+    table_name = name.lower()
+    _validate_table_name(table_name)
+
+    existing = _table_definitions()[table_name].keys()
+    added: list[str] = []
+
+    with _connect() as crs:
+        for col_name, col_type in column_definitions.items():
+            if col_name not in existing:
+                crs.execute(f'ALTER TABLE {table_name} ADD COLUMN {col_name} {col_type.value}')
+                added.append(col_name)
+
+    if added:
+        _catalog.invalidate()
+
+    return added
+
+
 def insert(table_name: str, column_definitions: _ColumnDefinitions, row: _Row) -> int:
 
     _validate_table_name(table_name)
     _validate_columns(table_name, column_definitions)
     _validate_rows(table_name, column_definitions, row)
 
-    columns = ', '.join([c for c in column_definitions.keys()])
-    values = ', '.join(['?'] * len(column_definitions))
     params = [v for v in row]
-    stmt = f"INSERT INTO {table_name.lower()} ({columns}) VALUES ({values})"
+    stmt = _statements.insert_statement(table_name.lower(), tuple(column_definitions.keys()))
 
     with _connect() as crs:
         try:
@@ -142,40 +341,68 @@ def insert(table_name: str, column_definitions: _ColumnDefinitions, row: _Row) -
     return rowid
 
 
-def insert_many(table_name: str, column_definitions: _ColumnDefinitions, rows: list[_Row]) -> None:
+def _insert_returning_ids(crs: _sql.Cursor, table_name: str, column_definitions: _ColumnDefinitions,
+                          rows: list[_Row]) -> dict:
 
-    _validate_table_name(table_name)
-    _validate_columns(table_name, column_definitions)
+    # Inserts rows with multi-row INSERT ... RETURNING statements (as many rows per statement as the parameter
+    # limit allows) and returns the new row ids keyed by the value of each row's unique column
+    columns = tuple(column_definitions.keys())
+    key_column = column_definitions.unique_column
+    rows_per_statement = max(1, _statements.MAX_PARAMETERS // len(columns))
 
-    columns = ', '.join([c for c in column_definitions.keys()])
-    values = ', '.join(['?'] * len(column_definitions))
-    params = [v for v in rows]
-    stmt = f"INSERT INTO {table_name.lower()} ({columns}) VALUES ({values})"
+    row_ids = {}
+    for i in range(0, len(rows), rows_per_statement):
+        batch = rows[i:i + rows_per_statement]
+        stmt = _statements.insert_returning_statement(table_name, columns, len(batch), key_column)
+        crs.execute(stmt, [v for row in batch for v in row])
+        row_ids.update({key: row_id for row_id, key in crs.fetchall()})
 
-    conn = _sql.connect(_files.database)
-    crs = conn.cursor()
+    return row_ids
 
-    try:
-        crs.executemany(stmt, params)
-    except _sql.IntegrityError as e:
-        conn.rollback()
-        crs.close()
-        conn.close()
-        raise IntegrityError(e)
-    except _sql.OperationalError as e:
-        conn.rollback()
-        crs.close()
-        conn.close()
-        if str(e).startswith('no such table: '):
-            raise TableDoesNotExist(table_name.lower())
-        else:
-            raise IntegrityError(e)
 
-    conn.commit()
-    crs.close()
-    conn.close()
+def insert_many(table_name: str, column_definitions: _ColumnDefinitions, rows: _Iterable[_Row],
+                chunk_size: int = _INSERT_CHUNK_SIZE, progress: _Optional[_Callable[[int], None]] = None,
+                return_ids: bool = False) -> _Optional[dict]:
 
-    return
+    # rows can be any iterable (e.g. a generator) and is consumed chunk_size rows at a time: each chunk is
+    # validated and inserted before the next one is read, so the rows never all have to be in memory at once.
+    # After each chunk, progress (if given) is called with the number of rows inserted so far. All the chunks
+    # go in as one transaction; if any row is invalid or can't be inserted, none of them are.
+    #
+    # With return_ids set, the row ids of the new rows are returned in a dict keyed by the value of each row's
+    # unique column (so column_definitions must name one), which saves fetching them back afterwards.
+
+    _validate_table_name(table_name)
+    _validate_columns(table_name, column_definitions)
+
+    if return_ids and not column_definitions.unique_column:
+        raise DatabaseException(f'insert_many() on table {table_name} can only return row ids keyed by a '
+                                f'unique column; none given')
+
+    stmt = _statements.insert_statement(table_name.lower(), tuple(column_definitions.keys()))
+    row_ids = {} if return_ids else None
+
+    with _connect() as crs:
+        num_inserted = 0
+        for chunk in _chunks(rows, chunk_size):
+            _validate_rows(table_name, column_definitions, chunk)
+            try:
+                if return_ids:
+                    row_ids.update(_insert_returning_ids(crs, table_name.lower(), column_definitions, chunk))
+                else:
+                    crs.executemany(stmt, chunk)
+            except _sql.IntegrityError as e:
+                raise IntegrityError(e)
+            except _sql.OperationalError as e:
+                if str(e).startswith('no such table: '):
+                    raise TableDoesNotExist(table_name.lower())
+                else:
+                    raise IntegrityError(e)
+            num_inserted += len(chunk)
+            if progress:
+                progress(num_inserted)
+
+    return row_ids
 
 
 def update(table_name: str, column_definitions: _ColumnDefinitions, row_id: int, row: _Row) -> None:
@@ -184,21 +411,12 @@ def update(table_name: str, column_definitions: _ColumnDefinitions, row_id: int,
     _validate_columns(table_name, column_definitions)
     _validate_rows(table_name, column_definitions, row)
 
-    columns: list[str] = []
-    for i, col_name in enumerate(column_definitions.keys()):
-        update_value = row[i]
-        if update_value is None:
-            columns.append(f'{col_name} = NULL')
-        elif column_definitions[col_name] == _ColumnTypes.TEXT:
-            columns.append(f'{col_name} = "{row[i]}"')
-        else:
-            columns.append(f'{col_name} = {row[i]}')
-    column_set = ', '.join(columns)
-    stmt = f'UPDATE {table_name} SET {column_set} WHERE _ROWID_ = {row_id}'
+    params = [v for v in row] + [row_id]
+    stmt = _statements.update_statement(table_name, tuple(column_definitions.keys()))
 
     with _connect() as crs:
         try:
-            crs.execute(stmt)
+            crs.execute(stmt, params)
             if crs.rowcount == 0:
                 raise DatabaseException(f'no updates performed on table {table_name}; '
                                         f'is there a record with a row id of {row_id}?')
@@ -213,44 +431,109 @@ def update(table_name: str, column_definitions: _ColumnDefinitions, row_id: int,
 
 def delete(table_name: str, row_id: int) -> None:
 
-    with _connect() as crs:
-        # confirm the table exists
-        stmt = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'"
-        crs.execute(stmt)
-        rows = crs.fetchall()
-        if len(rows) == 0:
-            raise TableDoesNotExist(table_name)
+    # confirm the table exists
+    _validate_table_name(table_name)
 
-        # confirm there is one and only one row in the database with row_id
-        stmt = f'SELECT _ROWID_ FROM {table_name} WHERE _ROWID_ = {row_id}'
-        crs.execute(stmt)
-        rows = crs.fetchall()
+    with _connect() as crs:
+        # delete the row, confirming there was one and only one row in the database with row_id
+        crs.execute(_statements.delete_statement(table_name), (row_id,))
 
-        if len(rows) == 0:
+        if crs.rowcount == 0:
             raise InvalidRowId(table_name, row_id)
-        if len(rows) > 1:
+        if crs.rowcount > 1:
             raise RowIdNotUnique(table_name, row_id)
 
-        # delete the row
-        stmt = f'DELETE FROM {table_name} WHERE _ROWID_ = {row_id}'
-        crs.execute(stmt)
+    return
+
+
+def update_many(table_name: str, column_definitions: _ColumnDefinitions, rows: list[tuple[int, _Row]]) -> None:
+
+    # rows is a list of (row id, row) pairs; every row is updated in one pass and either all of the updates
+    # are applied or none of them are
+
+    _validate_table_name(table_name)
+    _validate_columns(table_name, column_definitions)
+    _validate_rows(table_name, column_definitions, [row for _, row in rows])
+
+    params = [[v for v in row] + [row_id] for row_id, row in rows]
+    stmt = _statements.update_statement(table_name, tuple(column_definitions.keys()))
+
+    with _connect() as crs:
+        try:
+            crs.executemany(stmt, params)
+            num_updated = crs.rowcount
+            if num_updated != len(params):
+                # Some updates didn't hit exactly one row; find the row ids that don't exist so we can say which
+                missing = _missing_row_ids(crs, table_name, [row_id for row_id, _ in rows])
+                raise DatabaseException(f'{num_updated} of {len(params)} updates performed on table {table_name}; '
+                                        f'no records with row ids {missing}')
+        except sqlite3.OperationalError as e:
+            raise DatabaseException(f'sql operational error while updating rows of {table_name}: {e}')
+
+    return
+
+
+def delete_many(table_name: str, row_ids: list[int]) -> None:
+
+    # Every row is deleted in one pass; if any of the row ids don't exist nothing is deleted
+
+    _validate_table_name(table_name)
+
+    row_ids = list(row_ids)
+    if len(set(row_ids)) != len(row_ids):
+        raise DatabaseException(f'duplicate row ids given for deletion from table {table_name}')
+
+    with _connect() as crs:
+        # confirm every row id exists before deleting anything
+        missing = _missing_row_ids(crs, table_name, row_ids)
+        if missing:
+            raise InvalidRowId(table_name, ', '.join([str(i) for i in missing]))
+
+        crs.executemany(_statements.delete_statement(table_name), [(row_id,) for row_id in row_ids])
+        if crs.rowcount != len(row_ids):
+            raise DatabaseException(f'{crs.rowcount} rows deleted from {table_name}; expected {len(row_ids)}')
 
     return
 
 
-def fetch_all(table_name: str) -> list[_Row]:
+def _missing_row_ids(crs: _sql.Cursor, table_name: str, row_ids: list[int]) -> list[int]:
+
+    found: set[int] = set()
+    for i in range(0, len(row_ids), _statements.MAX_PARAMETERS):
+        chunk = row_ids[i:i + _statements.MAX_PARAMETERS]
+        crs.execute(_statements.row_id_in_statement(table_name, len(chunk)), chunk)
+        found.update([row[0] for row in crs.fetchall()])
+
+    return sorted(set(row_ids) - found)
+
+
+def _set_row_factory(crs: _sql.Cursor, row_type: type) -> None:
+
+    # Must be called after the cursor's statement has been executed, i.e., once its description is known
+    if row_type is _Row:
+        crs.row_factory = lambda _, row: _Row(row)
+    elif row_type is _Record:
+        record = _record_type(tuple([d[0] for d in crs.description]))
+        crs.row_factory = lambda _, row: record(row)
+    else:
+        raise TypeError(f'unsupported row type: {row_type}')
+
+    return
+
+
+def fetch_all(table_name: str, row_type: type = _Row) -> list[_Row | _Record]:
 
     _validate_table_name(table_name)
 
-    answer: list[_Row] = []
+    answer: list[_Row | _Record] = []
     stmt = f'SELECT _ROWID_, * FROM {table_name}'
 
     with _connect() as crs:
 
         try:
             crs.execute(stmt)
-            rows = crs.fetchall()
-            answer = [_Row(r) for r in rows]
+            _set_row_factory(crs, row_type)
+            answer = crs.fetchall()
         except sqlite3.OperationalError as e:
             if str(e).endswith(': syntax error'):
                 raise InvalidTableName(table_name)
@@ -260,38 +543,160 @@ def fetch_all(table_name: str) -> list[_Row]:
     return answer
 
 
-def fetch_where(table_name: str, column_definitions: _ColumnDefinitions, where_clause: str) -> list[_Row]:
+def fetch_where(table_name: str, column_definitions: _ColumnDefinitions, where_clause: str,
+                parameters: tuple = (), row_type: type = _Row) -> list[_Row | _Record]:
+
+    # where_clause may contain "?" placeholders whose values are given in parameters
 
     _validate_table_name(table_name)
     _validate_columns(table_name, column_definitions)
 
-    answer: list[_Row] = []
-    col_names = ', '.join([c for c in column_definitions.keys()])
-    stmt = f'SELECT _ROWID_, {col_names} FROM {table_name} WHERE {where_clause}'
+    answer: list[_Row | _Record] = []
+    stmt = _statements.select_statement(table_name, tuple(column_definitions.keys()), where_clause)
 
     with _connect() as crs:
         try:
-            crs.execute(stmt)
-            rows = crs.fetchall()
-            answer = [_Row(r) for r in rows]
+            crs.execute(stmt, parameters)
+            _set_row_factory(crs, row_type)
+            answer = crs.fetchall()
         except sqlite3.OperationalError as e:
             raise DatabaseException(f'store.dbms.fetch_where() sqlite3.OperationalError: {e}')
 
     return answer
 
 
-def fetch_distinct(table_name: str, column_name: str) -> list:
+def _iter_rows(stmt: str, parameters: tuple, arraysize: int, row_type: type) -> _Iterator[_Row | _Record]:
+
+    with _connect(savepoint=False) as crs:
+        crs.arraysize = arraysize
+        crs.execute(stmt, parameters)
+        _set_row_factory(crs, row_type)
+        while True:
+            rows = crs.fetchmany()
+            if not rows:
+                break
+            yield from rows
+
+    return
+
+
+def iter_all(table_name: str, arraysize: int = _ITER_ARRAYSIZE,
+             row_type: type = _Row) -> _Iterator[_Row | _Record]:
+
+    # Like fetch_all but streams the rows from an open cursor, arraysize rows at a time, instead of
+    # materializing the whole table. The connection (and its read lock on the database) is held until the
+    # iterator is exhausted or closed, so outside of a transaction don't write to the database while
+    # iterating; inside one, the iterator shares the transaction's connection.
 
     _validate_table_name(table_name)
 
+    stmt = f'SELECT _ROWID_, * FROM {table_name}'
+
+    return _iter_rows(stmt, (), arraysize, row_type)
+
+
+def iter_where(table_name: str, column_definitions: _ColumnDefinitions, where_clause: str,
+               parameters: tuple = (), arraysize: int = _ITER_ARRAYSIZE,
+               row_type: type = _Row) -> _Iterator[_Row | _Record]:
+
+    # The streaming counterpart of fetch_where
+
+    _validate_table_name(table_name)
+    _validate_columns(table_name, column_definitions)
+
+    stmt = _statements.select_statement(table_name, tuple(column_definitions.keys()), where_clause)
+
+    return _iter_rows(stmt, parameters, arraysize, row_type)
+
+
+def iter_query(stmt: str, parameters: tuple = (), arraysize: int = _ITER_ARRAYSIZE,
+               row_type: type = _Row) -> _Iterator[_Row | _Record]:
+
+    # Streams the result of an arbitrary read-only query, e.g. a join across several tables, that can't be
+    # expressed through iter_all/iter_where; the statement's tables and columns are not validated
+
+    if not stmt.lstrip().upper().startswith(('SELECT', 'WITH')):
+        raise DatabaseException(f'store.dbms.iter_query() only runs SELECT statements: {stmt}')
+
+    return _iter_rows(stmt, parameters, arraysize, row_type)
+
+
+def execute(stmt: str, parameters: tuple = ()) -> int:
+
+    # Runs a single SQL statement that the table-level functions can't express, e.g. a set-based
+    # INSERT ... SELECT or UPDATE ... FROM across tables, and returns the number of rows it changed. TEMP
+    # tables only live as long as their connection, so statements that share one must run in a transaction.
+
     with _connect() as crs:
-        # confirm the table contains the given column
-        crs.execute(f"pragma table_info('{table_name}');")
-        rows = crs.fetchall()
-        col_names = [str(row[1]) for row in rows]
-        if column_name not in col_names:
-            raise UndefinedColumnName(column_name)
+        try:
+            crs.execute(stmt, parameters)
+        except _sql.IntegrityError as e:
+            raise IntegrityError(e)
+        except _sql.OperationalError as e:
+            raise DatabaseException(f'store.dbms.execute() sqlite3.OperationalError: {e}')
+        rowcount = crs.rowcount
+
+    return rowcount
+
 
+def execute_many(stmt: str, rows: list[tuple | _Row]) -> int:
+
+    with _connect() as crs:
+        try:
+            crs.executemany(stmt, rows)
+        except _sql.IntegrityError as e:
+            raise IntegrityError(e)
+        except _sql.OperationalError as e:
+            raise DatabaseException(f'store.dbms.execute_many() sqlite3.OperationalError: {e}')
+        rowcount = crs.rowcount
+
+    return rowcount
+
+
+def backup_database(target: str, source: _Optional[str] = None, pages: int = _BACKUP_PAGES,
+                    pause: float = _BACKUP_PAUSE) -> None:
+
+    # Copies the database (or the one at source) to target with SQLite's online backup API rather than copying
+    # the file, so the copy is always a consistent snapshot even if another connection is writing. The copy is
+    # made a few pages at a time with a pause between steps, and the source is only locked while a step runs,
+    # so readers and writers aren't held up for the length of the backup. A write made by another connection
+    # part way through restarts the backup. The copy is made to a temporary file that is moved to target once
+    # it is complete, so target is never left holding half a backup.
+
+    source = source if source else _files.database
+    if not _exists(source):
+        raise FileNotFoundError(source)
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        if remaining:
+            _sleep(pause)
+        return
+
+    temp_file = f'{target}.{_getpid()}.tmp'
+    src = _sql.connect(source)
+    dst = _sql.connect(temp_file)
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+        dst.close()
+        _replace(temp_file, target)
+    finally:
+        src.close()
+        dst.close()
+        if _exists(temp_file):
+            _remove(temp_file)
+
+    return
+
+
+def fetch_distinct(table_name: str, column_name: str) -> list:
+
+    _validate_table_name(table_name)
+
+    # confirm the table contains the given column
+    if column_name not in _table_definitions()[table_name].keys():
+        raise UndefinedColumnName(column_name)
+
+    with _connect() as crs:
         # get the distinct values
         stmt = f'SELECT DISTINCT {column_name} FROM {table_name} ORDER BY {column_name}'
         crs.execute(stmt)
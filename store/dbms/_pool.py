@@ -0,0 +1,95 @@
+import sqlite3 as _sql
+from threading import Lock as _Lock
+from typing import Optional as _Optional
+
+
+_MAX_IDLE_CONNECTIONS = 4
+_CACHED_STATEMENTS = 256  # size of each connection's prepared statement cache
+
+
+class PoolStatistics:
+
+    def __init__(self, hits: int, misses: int, idle: int):
+        self._hits: int = hits
+        self._misses: int = misses
+        self._idle: int = idle
+        return
+
+    def __repr__(self):
+        return f'PoolStatistics(hits={self.hits}, misses={self.misses}, idle={self.idle})'
+
+    @property
+    def hits(self) -> int: return self._hits
+
+    @property
+    def misses(self) -> int: return self._misses
+
+    @property
+    def idle(self) -> int: return self._idle
+
+
+class ConnectionPool:
+
+    # Connections are handed out to one caller at a time and returned to the pool when the caller is done
+    # with them, so a connection is never used by two threads at once even though it may be used by
+    # different threads over its lifetime (hence check_same_thread=False).
+
+    def __init__(self, max_idle: int = _MAX_IDLE_CONNECTIONS):
+        self._lock = _Lock()
+        self._max_idle: int = max_idle
+        self._idle: list[_sql.Connection] = []
+        self._database: _Optional[str] = None
+        self._hits: int = 0
+        self._misses: int = 0
+        return
+
+    def _close_idle(self) -> None:
+        for connection in self._idle:
+            connection.close()
+        self._idle = []
+        return
+
+    def acquire(self, database: str) -> _sql.Connection:
+
+        with self._lock:
+            # Pooled connections are only good for the database they were opened on; if the database
+            # path has changed since they were pooled, throw them away.
+            if database != self._database:
+                self._close_idle()
+                self._database = database
+            if self._idle:
+                self._hits += 1
+                return self._idle.pop()
+            self._misses += 1
+
+        return _sql.connect(database, check_same_thread=False, cached_statements=_CACHED_STATEMENTS)
+
+    def release(self, connection: _sql.Connection, database: str) -> None:
+
+        if connection.in_transaction:
+            connection.rollback()
+
+        with self._lock:
+            if database == self._database and len(self._idle) < self._max_idle:
+                self._idle.append(connection)
+                return
+
+        connection.close()
+        return
+
+    def clear(self) -> None:
+        with self._lock:
+            self._close_idle()
+            self._database = None
+        return
+
+    @property
+    def statistics(self) -> PoolStatistics:
+        with self._lock:
+            return PoolStatistics(self._hits, self._misses, len(self._idle))
+
+    def reset_statistics(self) -> None:
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+        return
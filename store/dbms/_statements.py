@@ -0,0 +1,44 @@
+from functools import lru_cache as _lru_cache
+
+
+# The SQL text for each statement depends only on the table and the set of columns it touches; the values
+# themselves are always bound as parameters. That keeps the number of distinct statement texts small, so
+# the texts built here are reused and sqlite3's per-connection prepared statement cache gets hits.
+
+_STATEMENT_CACHE_SIZE = 256
+MAX_PARAMETERS = 500  # comfortably under SQLite's default limit on the number of parameters in a statement
+
+
+@_lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def insert_statement(table_name: str, columns: tuple[str, ...]) -> str:
+    values = ', '.join(['?'] * len(columns))
+    return f'INSERT INTO {table_name} ({", ".join(columns)}) VALUES ({values})'
+
+
+@_lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def insert_returning_statement(table_name: str, columns: tuple[str, ...], num_rows: int, key_column: str) -> str:
+    # Inserts num_rows rows at once and hands back each new row's row id along with its key_column value
+    values = ', '.join([f'({", ".join(["?"] * len(columns))})'] * num_rows)
+    return f'INSERT INTO {table_name} ({", ".join(columns)}) VALUES {values} RETURNING _ROWID_, {key_column}'
+
+
+@_lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def update_statement(table_name: str, columns: tuple[str, ...]) -> str:
+    column_set = ', '.join([f'{c} = ?' for c in columns])
+    return f'UPDATE {table_name} SET {column_set} WHERE _ROWID_ = ?'
+
+
+@_lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def delete_statement(table_name: str) -> str:
+    return f'DELETE FROM {table_name} WHERE _ROWID_ = ?'
+
+
+@_lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def select_statement(table_name: str, columns: tuple[str, ...], where_clause: str) -> str:
+    col_names = ', '.join(('_ROWID_',) + columns)
+    return f'SELECT {col_names} FROM {table_name} WHERE {where_clause}'
+
+
+@_lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def row_id_in_statement(table_name: str, num_row_ids: int) -> str:
+    return f'SELECT _ROWID_ FROM {table_name} WHERE _ROWID_ IN ({", ".join(["?"] * num_row_ids)})'
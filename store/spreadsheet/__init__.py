@@ -1,5 +1,19 @@
 
 from numbers_parser import Document as _Document
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from pathlib import Path as _Path
+from . import _cache
+from typing import Callable as _Callable
+from typing import Iterator as _Iterator
+from typing import Optional as _Optional
+
+try:
+    # numbers_parser internals, see _open_model(); without them everything falls back to the public Document
+    from numbers_parser.document import Sheet as _NumbersSheet
+    from numbers_parser.document import _NumbersModel
+except ImportError:
+    _NumbersSheet = None
+    _NumbersModel = None
 
 
 class Row(list):
@@ -13,6 +27,9 @@ class Table:
         self.columns: list[str] = []
         self.rows: list[Row] = []
 
+    def iter_rows(self) -> _Iterator[Row]:
+        return iter(self.rows)
+
 
 class Sheet:
 
@@ -27,23 +44,186 @@ class Workbook:
         self.sheets: list[Sheet] = []
 
 
-def import_spreadsheet(path: str):
+# The lazy counterparts of Workbook, Sheet and Table returned by open_spreadsheet(). Nothing decoded is kept on
+# them: a LazyWorkbook only knows its sheets' names, each access to a LazySheet's tables decodes that sheet afresh,
+# and a LazyTable lets go of its decoded table once its rows have been read. Reading a workbook sheet by sheet
+# (without holding on to the tables of earlier sheets) therefore needs about one decoded sheet's worth of memory;
+# numbers_parser decodes a sheet's tables all at once, so a single sheet is as small as it gets. Its objects refer to
+# each other, though, so a sheet that has been let go of is only freed once the cycle collector runs; a reader
+# that wants the bound to hold strictly collects between sheets (as store._pipeline does).
+
+class LazyTable:
+
+    def __init__(self, table):
+        self._table = table
+        self.name: str = table.name
+        self.columns: list[str] = list(next(table.iter_rows(max_row=0, values_only=True)))
+
+    def iter_rows(self) -> _Iterator[list]:
+
+        # The rows can only be read once; the decoded table is dropped as soon as they have been
+        if self._table is None:
+            raise RuntimeError(f'the rows of table "{self.name}" have already been read')
+        table, self._table = self._table, None
+        for row in table.iter_rows(min_row=1, values_only=True):
+            yield list(row)
+
+        return
+
+
+class LazySheet:
+
+    def __init__(self, name: str, load: _Callable[[], object]):
+        self._load = load  # returns the numbers_parser sheet, decoded
+        self.name: str = name
+
+    @property
+    def tables(self) -> list[LazyTable]:
+        return [LazyTable(table) for table in self._load().tables]
+
+
+class LazyWorkbook:
+
+    def __init__(self, path: str):
+        self._path: str = path
+        self._sheet_names: _Optional[list[str]] = None
+
+    @property
+    def sheets(self) -> list[LazySheet]:
+
+        if _NumbersModel is None:
+            # Without numbers_parser's internals a sheet can't be decoded on its own, so the whole document is decoded
+            # up front instead
+            doc = _Document(self._path)
+            return [LazySheet(sheet.name, lambda sheet=sheet: sheet) for sheet in doc.sheets]
+
+        if self._sheet_names is None:
+            self._sheet_names = _sheet_names(self._path)
+
+        return [LazySheet(name, lambda index=index: _numbers_sheet(self._path, index))
+                for index, name in enumerate(self._sheet_names)]
+
+
+# numbers_parser's Document decodes the cells of every table in every sheet as soon as it is opened, which is
+# where nearly all the time spent parsing a spreadsheet goes. Opening the document's model on its own is cheap,
+# though, and a single sheet (and so only its tables' cells) can then be decoded from it. That is what lets
+# LazyWorkbook put off decoding a sheet until it is used and lets import_spreadsheets() parse the sheets of a
+# workbook in separate processes. Both rely on numbers_parser internals (_NumbersModel and constructing a Sheet
+# from a model and sheet id directly); if those can't be imported, the public Document is used instead.
+#
+# A model keeps every table decoded from it for as long as it lives, so each sheet is decoded from a model of its
+# own that goes away along with the sheet's tables.
+
+def _open_model(path: str) -> _NumbersModel:
+    return _NumbersModel(_Path(path), None)
+
+
+def _sheet_names(path: str) -> list[str]:
+    if _NumbersModel is None:
+        return [sheet.name for sheet in _Document(path).sheets]
+    model = _open_model(path)
+    return [model.sheet_name(sheet_id) for sheet_id in model.sheet_ids()]
+
+
+def _numbers_sheet(path: str, index: int):
+    model = _open_model(path)
+    return _NumbersSheet(model, model.sheet_ids()[index])
+
+
+def _sheet(numbers_sheet: _NumbersSheet) -> Sheet:
+
+    sheet = Sheet(numbers_sheet.name)
+
+    for table in numbers_sheet.tables:
+        rows = table.rows(values_only=True)
+        next_table = Table(table.name)
+        next_table.columns = rows[0]
+        next_table.rows = [row for row in rows[1:]]
+        sheet.tables.append(next_table)
+
+    return sheet
+
+
+def _parse_sheets(path: str, index: _Optional[int]) -> list[Sheet]:
+
+    # Runs in a worker process; parses just the index'th sheet of the spreadsheet at path, or all of its sheets if
+    # index is None
+    if index is None:
+        return _parse(path).sheets
+
+    return [_sheet(_numbers_sheet(path, index))]
+
+
+def _parse(path: str) -> Workbook:
 
     answer: Workbook = Workbook()
     doc = _Document(path)
 
     for sheet in doc.sheets:
+        answer.sheets.append(_sheet(sheet))
+
+    return answer
 
-        next_sheet = Sheet(sheet.name)
 
-        for table in sheet.tables:
+def import_spreadsheet(path: str, use_cache: bool = True) -> Workbook:
 
-            rows = table.rows(values_only=True)
-            next_table = Table(table.name)
-            next_table.columns = rows[0]
-            next_table.rows = [row for row in rows[1:]]
-            next_sheet.tables.append(next_table)
+    # Parsing a .numbers file is slow, so unless use_cache is False the parsed workbook is cached on disk and
+    # reused for as long as the spreadsheet is unchanged (see store.spreadsheet._cache)
+    if not use_cache:
+        return _parse(path)
 
-        answer.sheets.append(next_sheet)
+    return _cache.load(path, _parse)
 
-    return answer
+
+def import_spreadsheets(paths: list[str], processes: _Optional[int] = None, use_cache: bool = True) -> list[Workbook]:
+
+    # Imports several spreadsheets at once, parsing every sheet of every spreadsheet that isn't already cached in
+    # a pool of (at most "processes") worker processes. The workbooks are returned in the same order as paths,
+    # each with its sheets in spreadsheet order, no matter the order in which the workers finish.
+
+    workbooks: list[_Optional[Workbook]] = []
+    keys: list[_Optional[dict]] = []
+    for path in paths:
+        workbook, key = _cache.lookup(path) if use_cache else (None, None)
+        workbooks.append(workbook)
+        keys.append(key)
+
+    to_parse = [i for i, workbook in enumerate(workbooks) if workbook is None]
+
+    # (workbook index, sheet index) for every sheet that needs parsing; without numbers_parser's internals a sheet
+    # can't be parsed on its own, so each spreadsheet is parsed whole instead (a sheet index of None)
+    if _NumbersModel is None:
+        tasks = [(i, None) for i in to_parse]
+    else:
+        tasks = [(i, s) for i in to_parse for s in range(len(_sheet_names(paths[i])))]
+
+    if len(tasks) > 1:
+        with _ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_parse_sheets, paths[i], s) for i, s in tasks]
+            parsed = [future.result() for future in futures]
+    else:
+        parsed = [_parse_sheets(paths[i], s) for i, s in tasks]
+
+    for i in to_parse:
+        workbooks[i] = Workbook()
+    for (i, _), sheets in zip(tasks, parsed):
+        workbooks[i].sheets += sheets
+
+    if use_cache:
+        for i in to_parse:
+            _cache.store(paths[i], keys[i], workbooks[i])
+
+    return workbooks
+
+
+def clear_cache(path: str) -> None:
+    _cache.clear(path)
+    return
+
+
+def open_spreadsheet(path: str) -> LazyWorkbook:
+
+    # Like import_spreadsheet() but nothing is parsed up front (or cached): a sheet is decoded each time its tables
+    # are asked for and each table's rows are read once, through its iter_rows(). Use it for spreadsheets that are
+    # only read once, sheet by sheet, without keeping every sheet in memory at the same time.
+    return LazyWorkbook(path)
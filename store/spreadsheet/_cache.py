@@ -0,0 +1,120 @@
+import os as _os
+import pickle as _pickle
+import hashlib as _hashlib
+from typing import Any as _Any
+from typing import Callable as _Callable
+from typing import Optional as _Optional
+
+
+# Parsed workbooks are cached on disk in a ".cache" directory next to the spreadsheet they came from, one
+# pickle per spreadsheet. Each cache file records the size, mtime and SHA-256 of the spreadsheet it was made
+# from. A spreadsheet whose size and mtime are unchanged is taken to be unchanged; if only its mtime has moved
+# (e.g. it was copied or touched) the content hash decides. Anything else means the spreadsheet is parsed again
+# and the cache file rewritten.
+
+_CACHE_DIRECTORY = '.cache'
+_CACHE_FORMAT = 2  # bump whenever the cached Workbook/Sheet/Table structure changes
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+def cache_path(path: str) -> str:
+    directory, name = _os.path.split(_os.path.abspath(path))
+    return _os.path.join(directory, _CACHE_DIRECTORY, f'{name}.pickle')
+
+
+def _content_hash(path: str) -> str:
+    digest = _hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read(path: str) -> _Optional[dict]:
+
+    # A missing, unreadable or outdated cache file is simply a cache miss
+    try:
+        with open(cache_path(path), 'rb') as f:
+            entry = _pickle.load(f)
+    except (OSError, EOFError, _pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+    if not isinstance(entry, dict) or entry.get('format') != _CACHE_FORMAT:
+        return None
+
+    return entry
+
+
+def _write(path: str, entry: dict) -> None:
+
+    # Written to a temporary file first and moved into place so a reader never sees half a cache file. Not being
+    # able to write the cache (e.g. a read-only data directory) is not an error; the next load just parses again.
+    cache_file = cache_path(path)
+    temp_file = f'{cache_file}.{_os.getpid()}.tmp'
+    try:
+        _os.makedirs(_os.path.dirname(cache_file), exist_ok=True)
+        with open(temp_file, 'wb') as f:
+            _pickle.dump(entry, f, protocol=_pickle.HIGHEST_PROTOCOL)
+        _os.replace(temp_file, cache_file)
+    except OSError:
+        if _os.path.exists(temp_file):
+            _os.remove(temp_file)
+
+    return
+
+
+def lookup(path: str) -> tuple[_Optional[_Any], _Optional[dict]]:
+
+    # Returns the cached workbook for the spreadsheet at path (None if there isn't one or the spreadsheet has
+    # changed since it was cached) along with the key to cache a freshly parsed workbook under (see store()). A
+    # spreadsheet that can't be read is a miss with no key; parsing it raises whatever the parser raises for it.
+
+    try:
+        stat = _os.stat(path)
+        entry = _read(path)
+        if entry is not None and entry['key']['size'] == stat.st_size:
+            if entry['key']['mtime'] == stat.st_mtime_ns:
+                return entry['workbook'], entry['key']
+            content_hash = _content_hash(path)
+            if entry['key']['sha256'] == content_hash:
+                entry['key']['mtime'] = stat.st_mtime_ns
+                _write(path, entry)
+                return entry['workbook'], entry['key']
+        else:
+            content_hash = _content_hash(path)
+    except OSError:
+        return None, None
+
+    return None, {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': content_hash}
+
+
+def store(path: str, key: dict, workbook: _Any) -> None:
+
+    # The key is the one lookup() returned before the spreadsheet was parsed, so a spreadsheet that changes while
+    # it is being parsed is parsed again next time rather than being cached under its new size/mtime/hash
+    _write(path, {'format': _CACHE_FORMAT, 'key': key, 'workbook': workbook})
+
+    return
+
+
+def load(path: str, parse: _Callable[[str], _Any]) -> _Any:
+
+    # Returns the cached result of parse(path) if the spreadsheet hasn't changed since it was cached, otherwise
+    # calls parse(path) and caches what it returns
+
+    workbook, key = lookup(path)
+    if workbook is None:
+        workbook = parse(path)
+        if key is not None:
+            store(path, key, workbook)
+
+    return workbook
+
+
+def clear(path: str) -> None:
+
+    cache_file = cache_path(path)
+    if _os.path.exists(cache_file):
+        _os.remove(cache_file)
+
+    return
@@ -774,3 +774,372 @@ def test_null_values():
     assert row == [10, None, 10]
 
     return
+
+
+def test_connection_pool():
+
+    dbms.close_connections()
+    dbms.reset_pool_statistics()
+
+    # The first call has to open a connection; the calls that follow should reuse it
+    dbms.fetch_all('my_table')
+    stats = dbms.pool_statistics()
+    assert stats.misses == 1
+    assert stats.idle == 1
+
+    dbms.fetch_all('my_table')
+    dbms.fetch_distinct('distinct_values', column_name='col2')
+    stats = dbms.pool_statistics()
+    assert stats.misses == 1
+    assert stats.hits >= 2
+    assert stats.idle == 1
+
+    # Closing the pool's connections forces the next call to open a new one
+    dbms.close_connections()
+    assert dbms.pool_statistics().idle == 0
+    dbms.fetch_all('my_table')
+    assert dbms.pool_statistics().misses == 2
+
+    return
+
+
+def test_schema_catalog_tracks_schema_changes():
+
+    # Prime the schema catalog
+    dbms.fetch_all('my_table')
+
+    # Create a table behind store.dbms's back; the catalog should notice the schema version change
+    with CursorContextManager() as crs:
+        crs.execute('CREATE TABLE catalog_table (col1 TEXT, col2 INTEGER)')
+
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT, 'col2': dbms.ColumnTypes.INTEGER})
+    assert dbms.insert('catalog_table', cols, dbms.Row(['row 1', 1])) == 1
+    assert dbms.fetch_all('catalog_table') == [[1, 'row 1', 1]]
+
+    with CursorContextManager() as crs:
+        crs.execute('DROP TABLE catalog_table')
+
+    with pytest.raises(dbms.TableDoesNotExist) as excinfo:
+        dbms.fetch_all('catalog_table')
+    assert str(excinfo.value) == 'no such table: catalog_table'
+
+    return
+
+
+def _count_rows(table_name: str) -> int:
+    with CursorContextManager() as crs:
+        crs.execute(f'SELECT COUNT(*) FROM {table_name}')
+        return crs.fetchone()[0]
+
+
+def test_transaction():
+
+    table_name = 'transaction_values'
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT, 'col2': dbms.ColumnTypes.INTEGER})
+    dbms.create_table(table_name, cols)
+
+    # Work done in a transaction is not visible to other connections until the transaction commits
+    with dbms.transaction():
+        dbms.insert(table_name, cols, dbms.Row(['row 1', 1]))
+        dbms.insert_many(table_name, cols, [dbms.Row(['row 2', 2]), dbms.Row(['row 3', 3])])
+        assert len(dbms.fetch_all(table_name)) == 3
+        assert _count_rows(table_name) == 0
+    assert _count_rows(table_name) == 3
+
+    # An exception rolls back everything done in the transaction
+    with pytest.raises(RuntimeError):
+        with dbms.transaction():
+            dbms.update(table_name, cols, row_id=1, row=dbms.Row(['row 1 UPDATED', 100]))
+            dbms.delete(table_name, row_id=2)
+            raise RuntimeError('abandon the transaction')
+    assert dbms.fetch_all(table_name) == [[1, 'row 1', 1], [2, 'row 2', 2], [3, 'row 3', 3]]
+
+    # A failing nested transaction only undoes its own work
+    with dbms.transaction():
+        dbms.delete(table_name, row_id=3)
+        with pytest.raises(RuntimeError):
+            with dbms.transaction():
+                dbms.delete(table_name, row_id=2)
+                raise RuntimeError('abandon the nested transaction')
+        # ...as does a dbms call that fails part way through
+        with pytest.raises(dbms.InvalidRowId):
+            dbms.delete(table_name, row_id=99)
+    assert dbms.fetch_all(table_name) == [[1, 'row 1', 1], [2, 'row 2', 2]]
+
+    return
+
+
+def test_parameterized_statements():
+
+    table_name = 'quoted_values'
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT, 'col2': dbms.ColumnTypes.INTEGER})
+    dbms.create_table(table_name, cols)
+
+    dbms.insert_many(table_name, cols, [dbms.Row(['row 1', 1]), dbms.Row(['row 2', 2]), dbms.Row(['row 3', 3])])
+
+    # Text containing quotes must survive an update intact
+    quoted = 'it\'s a "quoted" value'
+    dbms.update(table_name, cols, row_id=2, row=dbms.Row([quoted, None]))
+
+    rows = dbms.fetch_where(table_name, cols, where_clause='col1 = ?', parameters=(quoted,))
+    assert rows == [[2, quoted, None]]
+
+    rows = dbms.fetch_where(table_name, cols, where_clause='col2 >= ?', parameters=(1,))
+    assert rows == [[1, 'row 1', 1], [3, 'row 3', 3]]
+
+    dbms.delete(table_name, row_id=1)
+    assert dbms.fetch_all(table_name) == [[2, quoted, None], [3, 'row 3', 3]]
+
+    return
+
+
+def test_update_many_and_delete_many():
+
+    table_name = 'bulk_values'
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT, 'col2': dbms.ColumnTypes.INTEGER})
+    dbms.create_table(table_name, cols)
+    dbms.insert_many(table_name, cols, [dbms.Row([f'row {i}', i]) for i in range(1, 11)])
+
+    dbms.update_many(table_name, cols, [(i, dbms.Row([f'row {i} UPDATED', i * 10])) for i in range(1, 11, 2)])
+    rows = dbms.fetch_all(table_name)
+    assert rows[0] == [1, 'row 1 UPDATED', 10]
+    assert rows[1] == [2, 'row 2', 2]
+    assert rows[8] == [9, 'row 9 UPDATED', 90]
+
+    # If any row id doesn't exist none of the updates are applied
+    with pytest.raises(dbms.DatabaseException) as excinfo:
+        dbms.update_many(table_name, cols, [(2, dbms.Row(['not applied', 0])), (50, dbms.Row(['no such row', 0]))])
+    assert str(excinfo.value) == '1 of 2 updates performed on table bulk_values; no records with row ids [50]'
+    assert dbms.fetch_all(table_name)[1] == [2, 'row 2', 2]
+
+    dbms.delete_many(table_name, [2, 4, 6])
+    assert [r[0] for r in dbms.fetch_all(table_name)] == [1, 3, 5, 7, 8, 9, 10]
+
+    # Likewise for deletes
+    with pytest.raises(dbms.InvalidRowId) as excinfo:
+        dbms.delete_many(table_name, [1, 2, 3, 4])
+    assert str(excinfo.value) == 'no rows with an id of 2, 4 exists in table bulk_values'
+    assert [r[0] for r in dbms.fetch_all(table_name)] == [1, 3, 5, 7, 8, 9, 10]
+
+    return
+
+
+def test_iter_all_and_iter_where():
+
+    table_name = 'streamed_values'
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT, 'col2': dbms.ColumnTypes.INTEGER})
+    dbms.create_table(table_name, cols)
+    dbms.insert_many(table_name, cols, [dbms.Row([f'row {i}', i % 7]) for i in range(1, 1001)])
+
+    # Stream with an arraysize that doesn't evenly divide the number of rows
+    assert list(dbms.iter_all(table_name, arraysize=64)) == dbms.fetch_all(table_name)
+    assert list(dbms.iter_where(table_name, cols, 'col2 = ?', parameters=(3,), arraysize=10)) == \
+        dbms.fetch_where(table_name, cols, 'col2 = ?', parameters=(3,))
+
+    # Validation happens when the iterator is created, not when it is first advanced
+    with pytest.raises(dbms.TableDoesNotExist):
+        dbms.iter_all('bad_table')
+
+    # Abandoning an iterator part way through gives its connection back to the pool
+    dbms.close_connections()
+    rows = dbms.iter_all(table_name, arraysize=16)
+    assert next(rows) == [1, 'row 1', 1]
+    assert dbms.pool_statistics().idle == 0
+    rows.close()
+    assert dbms.pool_statistics().idle == 1
+
+    # Inside a transaction an iterator sees the transaction's uncommitted changes
+    with dbms.transaction():
+        dbms.delete_many(table_name, list(range(1, 1001, 2)))
+        assert sum(1 for _ in dbms.iter_all(table_name)) == 500
+
+    return
+
+
+def test_record_row_type():
+
+    rows = dbms.fetch_all('my_table', row_type=dbms.Record)
+    assert rows == [tuple(r) for r in dbms.fetch_all('my_table')]
+
+    record = rows[0]
+    assert isinstance(record, dbms.Record) and isinstance(record, tuple)
+    assert record.fields == ('row_id', 'col1', 'col2', 'col3')
+    assert (record.row_id, record.col1, record.col2, record.col3) == (1, 'row-1 col-1', 'row-1 col-2', 1)
+    assert record['col2'] == record[2] == 'row-1 col-2'
+    assert record.as_row() == [1, 'row-1 col-1', 'row-1 col-2', 1]
+
+    with pytest.raises(dbms.UndefinedColumnName):
+        record['bad_name']
+    with pytest.raises(TypeError):
+        record[1] = 'records are immutable'
+
+    cols = dbms.ColumnDefinitions({'col3': dbms.ColumnTypes.INTEGER})
+    records = dbms.fetch_where('my_table', cols, 'col3 > ?', parameters=(50,), row_type=dbms.Record)
+    assert [(r.row_id, r.col3) for r in records] == [(3, 100), (4, 1999)]
+    assert [r.col3 for r in dbms.iter_where('my_table', cols, '1 = 1', row_type=dbms.Record)] == [1, 2, 100, 1999, 5]
+
+    with pytest.raises(TypeError):
+        dbms.fetch_all('my_table', row_type=dict)
+
+    return
+
+
+def test_create_table_with_indexes():
+
+    with pytest.raises(dbms.UndefinedColumnName) as excinfo:
+        dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT}, indexes=['col2'])
+    assert str(excinfo.value) == 'undefined column name: col2'
+
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT,
+                                   'col2': dbms.ColumnTypes.TEXT,
+                                   'col3': dbms.ColumnTypes.INTEGER},
+                                  indexes=['col3', ('col1', 'col2')])
+    assert cols.indexes == [('col3',), ('col1', 'col2')]
+
+    dbms.create_table('indexed_table', cols)
+
+    def _indexes(table_name: str) -> dict[str, str]:
+        with CursorContextManager() as crs:
+            crs.execute("SELECT name, sql FROM sqlite_schema WHERE type = 'index' AND tbl_name = ?", (table_name,))
+            return {r[0]: r[1] for r in crs.fetchall()}
+
+    assert _indexes('indexed_table') == {
+        'indexed_table_col3_idx': 'CREATE INDEX indexed_table_col3_idx ON indexed_table (col3)',
+        'indexed_table_col1_col2_idx': 'CREATE INDEX indexed_table_col1_col2_idx ON indexed_table (col1, col2)',
+    }
+
+    # Nothing to add to a table that already has all its indexes...
+    assert dbms.create_indexes('indexed_table', cols) == []
+
+    # ...but a table created before its indexes were declared gets the missing ones
+    assert dbms.create_indexes('my_table', cols) == ['my_table_col3_idx', 'my_table_col1_col2_idx']
+    assert sorted(_indexes('my_table').keys()) == ['my_table_col1_col2_idx', 'my_table_col3_idx']
+    assert dbms.create_indexes('my_table', cols) == []
+
+    return
+
+
+def test_add_columns():
+
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT,
+                                   'col2': dbms.ColumnTypes.TEXT,
+                                   'col3': dbms.ColumnTypes.INTEGER})
+    dbms.create_table('growing_table', cols)
+    dbms.insert('growing_table', cols, dbms.Row(['a', 'b', 1]))
+
+    more_cols = dbms.ColumnDefinitions(dict(cols) | {'col4': dbms.ColumnTypes.TEXT, 'col5': dbms.ColumnTypes.INTEGER})
+    assert dbms.add_columns('growing_table', more_cols) == ['col4', 'col5']
+    assert dbms.add_columns('growing_table', more_cols) == []
+
+    # Existing rows get NULL in the new columns; the new columns can be used straight away
+    assert dbms.fetch_all('growing_table') == [[1, 'a', 'b', 1, None, None]]
+    dbms.insert('growing_table', more_cols, dbms.Row(['c', 'd', 2, 'e', 3]))
+    assert dbms.fetch_all('growing_table')[1] == [2, 'c', 'd', 2, 'e', 3]
+
+    with pytest.raises(dbms.TableDoesNotExist):
+        dbms.add_columns('no_such_table', more_cols)
+
+    return
+
+
+def test_iter_query():
+
+    stmt = 'SELECT a.col1, b.col1 AS b_col1 FROM my_table AS a JOIN bulk_values AS b ON b._ROWID_ = a._ROWID_ WHERE a.col3 < ?'
+    assert list(dbms.iter_query(stmt, parameters=(50,))) == [['row-1 col-1', 'row 1 UPDATED'],
+                                                            ['row-5 col-1', 'row 5 UPDATED']]
+    assert [r.b_col1 for r in dbms.iter_query(stmt, parameters=(3,), row_type=dbms.Record)] == ['row 1 UPDATED']
+
+    with pytest.raises(dbms.DatabaseException):
+        dbms.iter_query('DELETE FROM my_table')
+
+    return
+
+
+def test_insert_many_in_chunks():
+
+    cols = dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT, 'col2': dbms.ColumnTypes.INTEGER})
+    dbms.create_table('chunked_table', cols)
+
+    # Rows can come from a generator; progress is reported after every chunk
+    progress = []
+    dbms.insert_many('chunked_table', cols, (dbms.Row([f'row {i}', i]) for i in range(1234)), chunk_size=100,
+                     progress=progress.append)
+    assert progress == list(range(100, 1300, 100)) + [1234]
+    assert _count_rows('chunked_table') == 1234
+    assert dbms.fetch_all('chunked_table')[-1] == [1234, 'row 1233', 1233]
+
+    # Each chunk is validated before it is inserted; an invalid row in a later chunk undoes the earlier ones
+    def rows_with_a_bad_one():
+        for i in range(250):
+            yield dbms.Row([f'more {i}', i if i != 220 else 'not an integer'])
+
+    progress = []
+    with pytest.raises(TypeError):
+        dbms.insert_many('chunked_table', cols, rows_with_a_bad_one(), chunk_size=100, progress=progress.append)
+    assert progress == [100, 200]
+    assert _count_rows('chunked_table') == 1234
+
+    return
+
+
+def test_insert_many_return_ids():
+
+    cols = dbms.ColumnDefinitions({'name': dbms.ColumnTypes.TEXT,
+                                   'col2': dbms.ColumnTypes.INTEGER,
+                                   'col3': dbms.ColumnTypes.INTEGER},
+                                  unique_column='name')
+    dbms.create_table('keyed_table', cols)
+    dbms.insert('keyed_table', cols, dbms.Row(['first', 0, 0]))
+
+    # More rows than fit in one INSERT ... RETURNING statement and more than one chunk
+    rows = [dbms.Row([f'name {i}', i, i * 2]) for i in range(1000)]
+    row_ids = dbms.insert_many('keyed_table', cols, rows, chunk_size=400, return_ids=True)
+
+    assert len(row_ids) == 1000
+    with CursorContextManager() as crs:
+        crs.execute('SELECT name, _ROWID_ FROM keyed_table WHERE name != "first"')
+        assert row_ids == dict(crs.fetchall())
+    assert row_ids['name 0'] == 2 and row_ids['name 999'] == 1001
+
+    # The row ids can only be keyed by a unique column
+    with pytest.raises(dbms.DatabaseException):
+        dbms.insert_many('my_table', dbms.ColumnDefinitions({'col1': dbms.ColumnTypes.TEXT}), [], return_ids=True)
+
+    # A failed insert still inserts nothing
+    with pytest.raises(dbms.IntegrityError):
+        dbms.insert_many('keyed_table', cols, [dbms.Row(['new 1', 1, 1]), dbms.Row(['name 5', 5, 5])],
+                         return_ids=True)
+    assert _count_rows('keyed_table') == 1001
+
+    return
+
+
+def test_backup_database(tmp_path):
+
+    backup_file = str(tmp_path / 'backup.sqlite3')
+    num_rows = len(dbms.fetch_all('my_table'))
+
+    # A write that hasn't been committed yet isn't in the backup, and a backup made one page at a time still
+    # comes out whole
+    writer = sql.connect(_files.database)
+    try:
+        writer.execute('BEGIN')
+        writer.execute("INSERT INTO my_table (col1, col2, col3) VALUES ('uncommitted', 'row', 0)")
+        dbms.backup_database(backup_file, pages=1, pause=0)
+    finally:
+        writer.rollback()
+        writer.close()
+
+    backup = sql.connect(backup_file)
+    try:
+        assert backup.execute('PRAGMA integrity_check').fetchall() == [('ok',)]
+        assert backup.execute('SELECT COUNT(*) FROM my_table').fetchall()[0][0] == num_rows
+        assert backup.execute("SELECT COUNT(*) FROM my_table WHERE col1 = 'uncommitted'").fetchall()[0][0] == 0
+    finally:
+        backup.close()
+    assert os.listdir(tmp_path) == ['backup.sqlite3']
+
+    with pytest.raises(FileNotFoundError):
+        dbms.backup_database(backup_file, source=str(tmp_path / 'missing.sqlite3'))
+
+    return
@@ -1,6 +1,21 @@
 
+import gc
+import os
+import shutil
+import tracemalloc
+import types
+import pytest
+from numbers_parser import Document
+from numbers_parser.exceptions import FileError
+import store.spreadsheet as spreadsheet
 from store.spreadsheet import import_spreadsheet
+from store.spreadsheet import clear_cache
+from store.spreadsheet import open_spreadsheet
+from store.spreadsheet import import_spreadsheets
+from store.spreadsheet import _cache
 from store._data_files import DataFiles as _files
+from store._types import KanaWorkbook
+from store._types import VocabWorkbook
 
 
 def test_import_vocab():
@@ -58,3 +73,183 @@ def test_import_vocab():
                     assert cell == f'S{sidx}-T{tidx}-C{cidx}-R{ridx}'
 
     return
+
+
+def _workbook_contents(workbook) -> list:
+    return [(sheet.name, [(table.name, table.columns, table.rows) for table in sheet.tables])
+            for sheet in workbook.sheets]
+
+
+def test_import_spreadsheet_cache(tmp_path, monkeypatch):
+
+    path = str(tmp_path / 'workbook.numbers')
+    shutil.copy(_files.pytest_spreadsheet, path)
+
+    # The first import parses the spreadsheet and caches the result next to it
+    workbook = import_spreadsheet(path)
+    assert os.path.exists(_cache.cache_path(path))
+    assert _cache.cache_path(path) == str(tmp_path / '.cache' / 'workbook.numbers.pickle')
+    assert _workbook_contents(workbook) == _workbook_contents(import_spreadsheet(path, use_cache=False))
+
+    # Later imports of the unchanged spreadsheet come from the cache, even once its mtime has moved on
+    def no_parsing(_path):
+        raise AssertionError('spreadsheet parsed')
+
+    monkeypatch.setattr(spreadsheet, '_Document', no_parsing)
+    assert _workbook_contents(import_spreadsheet(path)) == _workbook_contents(workbook)
+    os.utime(path, ns=(0, 0))
+    assert _workbook_contents(import_spreadsheet(path)) == _workbook_contents(workbook)
+    monkeypatch.undo()
+
+    # A changed spreadsheet is parsed again
+    shutil.copy(_files.vocab_spreadsheet, path)
+    vocab_workbook = import_spreadsheet(path)
+    assert _workbook_contents(vocab_workbook) == \
+           _workbook_contents(import_spreadsheet(_files.vocab_spreadsheet, use_cache=False))
+
+    # A corrupt cache file is ignored and replaced
+    with open(_cache.cache_path(path), 'wb') as f:
+        f.write(b'not a pickle')
+    assert _workbook_contents(import_spreadsheet(path)) == _workbook_contents(vocab_workbook)
+
+    clear_cache(path)
+    assert not os.path.exists(_cache.cache_path(path))
+
+    return
+
+
+def test_import_missing_spreadsheet(tmp_path):
+
+    # A missing spreadsheet is reported the same way whether or not the cache is used
+    path = str(tmp_path / 'missing.numbers')
+    for import_missing in [lambda: import_spreadsheet(path), lambda: import_spreadsheet(path, use_cache=False),
+                           lambda: import_spreadsheets([path]), lambda: import_spreadsheets([path], use_cache=False),
+                           lambda: open_spreadsheet(path).sheets]:
+        with pytest.raises(FileError):
+            import_missing()
+    assert not os.path.exists(tmp_path / '.cache')
+
+    return
+
+
+def test_open_spreadsheet():
+
+    eager = import_spreadsheet(_files.pytest_spreadsheet, use_cache=False)
+    lazy = open_spreadsheet(_files.pytest_spreadsheet)
+
+    assert [s.name for s in lazy.sheets] == [s.name for s in eager.sheets]
+
+    for lazy_sheet, eager_sheet in zip(lazy.sheets, eager.sheets):
+        lazy_tables = lazy_sheet.tables
+        assert [t.name for t in lazy_tables] == [t.name for t in eager_sheet.tables]
+        for lazy_table, eager_table in zip(lazy_tables, eager_sheet.tables):
+            assert lazy_table.columns == eager_table.columns
+            rows = lazy_table.iter_rows()
+            assert isinstance(rows, types.GeneratorType)
+            assert list(rows) == eager_table.rows
+
+            # A table's rows are read once, after which the decoded table is gone
+            assert lazy_table._table is None
+            with pytest.raises(RuntimeError):
+                list(lazy_table.iter_rows())
+
+        # Asking for a sheet's tables again decodes the sheet again
+        assert [list(t.iter_rows()) for t in lazy_sheet.tables] == [t.rows for t in eager_sheet.tables]
+
+    # The store's workbook classes read either kind of workbook
+    assert [w.kana for w in VocabWorkbook(open_spreadsheet(_files.vocab_spreadsheet)).words] == \
+           [w.kana for w in VocabWorkbook().words]
+    assert list(KanaWorkbook(open_spreadsheet(_files.kana_spreadsheet)).kana.keys()) == \
+           list(KanaWorkbook().kana.keys())
+
+    return
+
+
+def _write_workbook(path: str, num_sheets: int, rows_per_sheet: int) -> None:
+
+    doc = Document(num_header_rows=1, num_header_cols=0, num_rows=rows_per_sheet + 1, num_cols=4)
+    for s in range(num_sheets):
+        if s:
+            doc.add_sheet(f'Sheet {s + 1}', 'Table 1', num_rows=rows_per_sheet + 1, num_cols=4)
+        table = doc.sheets[s].tables[0]
+        for c in range(4):
+            table.write(0, c, f'C{c}')
+            for r in range(1, rows_per_sheet + 1):
+                table.write(r, c, f'S{s}-C{c}-R{r}')
+    doc.save(path)
+
+    return
+
+
+def _peak_memory(read) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        read()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_open_spreadsheet_memory(tmp_path):
+
+    one_sheet = str(tmp_path / 'one_sheet.numbers')
+    four_sheets = str(tmp_path / 'four_sheets.numbers')
+    _write_workbook(one_sheet, 1, 100)
+    _write_workbook(four_sheets, 4, 100)
+
+    def read(path: str) -> None:
+        for sheet in open_spreadsheet(path).sheets:
+            for table in sheet.tables:
+                for _ in table.iter_rows():
+                    pass
+            gc.collect()
+        return
+
+    # Reading a workbook sheet by sheet takes about as much memory as reading one of its sheets, not all of them
+    assert _peak_memory(lambda: read(four_sheets)) < 1.5 * _peak_memory(lambda: read(one_sheet))
+
+    return
+
+
+def test_open_spreadsheet_without_numbers_internals(monkeypatch):
+
+    # Without numbers_parser's internals, spreadsheets are opened (and parsed) through the public Document
+    expected = _workbook_contents(import_spreadsheet(_files.pytest_spreadsheet, use_cache=False))
+    monkeypatch.setattr(spreadsheet, '_NumbersModel', None)
+    monkeypatch.setattr(spreadsheet, '_NumbersSheet', None)
+
+    lazy = open_spreadsheet(_files.pytest_spreadsheet)
+    assert [(s.name, [(t.name, t.columns, list(t.iter_rows())) for t in s.tables]) for s in lazy.sheets] == expected
+    assert [_workbook_contents(w) for w in import_spreadsheets([_files.pytest_spreadsheet], use_cache=False)] == \
+           [expected]
+
+    return
+
+
+def test_import_spreadsheets(tmp_path):
+
+    paths = [str(tmp_path / 'pytest_workbook.numbers'), str(tmp_path / 'vocabulary.numbers'),
+             str(tmp_path / 'kana.numbers')]
+    for source, path in zip([_files.pytest_spreadsheet, _files.vocab_spreadsheet, _files.kana_spreadsheet], paths):
+        shutil.copy(source, path)
+    expected = [_workbook_contents(import_spreadsheet(path, use_cache=False)) for path in paths]
+
+    # Sheets parsed by the worker processes are put back together in spreadsheet order
+    workbooks = import_spreadsheets(paths, processes=2, use_cache=False)
+    assert [_workbook_contents(w) for w in workbooks] == expected
+    assert not os.path.exists(tmp_path / '.cache')
+
+    # Spreadsheets already in the cache aren't parsed again; the rest are parsed and cached
+    import_spreadsheet(paths[1])
+    cached = _cache.lookup(paths[1])[0]
+    workbooks = import_spreadsheets(paths, processes=2)
+    assert [_workbook_contents(w) for w in workbooks] == expected
+    assert _workbook_contents(cached) == expected[1]
+    assert all([_cache.lookup(path)[0] is not None for path in paths])
+
+    # The store's workbook classes take the parsed workbooks as they are
+    assert [w.kana for w in VocabWorkbook(workbooks[1]).words] == [w.kana for w in VocabWorkbook().words]
+    assert list(KanaWorkbook(workbooks[2]).kana.keys()) == list(KanaWorkbook().kana.keys())
+
+    return
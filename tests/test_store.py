@@ -1,9 +1,26 @@
 
+import os
+import sqlite3
+import pytest
+from numbers_parser.exceptions import FileError
 from conftest import CursorContextManager
+import store._impl as _impl
+import store._pipeline as _pipeline
+import store._staging as _staging
+import store._backups as _backups
 from store import create_tables
+from store import create_indexes
+from store import upgrade_tables
 from store import populate_tables
 from store import update_database
 from store._data_files import DataFiles as _files
+from store._types import VocabDatabase
+from store._types import VocabWorkbook
+from store._types import VocabWorkbookRecord
+from store._types import KanaWorkbook
+from store._types import KanaWorkbookRecord
+from store._plan import plan_kana_changes
+from store._plan import plan_vocabulary_changes
 from typing import Optional
 
 
@@ -17,9 +34,10 @@ def test_store_create_tables():
         rows = crs.fetchall()
         rows = [r[0] for r in rows]
 
-        assert len(rows) == 8
+        assert len(rows) == 9
         assert 'vocab' in rows
         assert 'vocab_notes' in rows
+        assert 'tags' in rows
         assert 'vocab_tags' in rows
         assert 'kana' in rows
         assert 'kana_notes' in rows
@@ -30,7 +48,7 @@ def test_store_create_tables():
         assert len(rows) == 1 and len(rows[0]) == 1
         assert rows[0][0] == 'CREATE TABLE vocab (english_w TEXT, romaji_w TEXT, kana_w TEXT NOT NULL UNIQUE, ' \
                              'kanji_w TEXT, part_of_speech TEXT, quizzed INTEGER, correct INTEGER, ' \
-                             'consecutive_correct INTEGER, consecutive_incorrect INTEGER)'
+                             'consecutive_correct INTEGER, consecutive_incorrect INTEGER, fingerprint TEXT)'
 
         crs.execute("SELECT sql FROM sqlite_schema WHERE name = 'vocab_notes'")
         rows = crs.fetchall()
@@ -40,7 +58,12 @@ def test_store_create_tables():
         crs.execute("SELECT sql FROM sqlite_schema WHERE name = 'vocab_tags'")
         rows = crs.fetchall()
         assert len(rows) == 1 and len(rows[0]) == 1
-        assert rows[0][0] == 'CREATE TABLE vocab_tags (word_id INTEGER, tag TEXT)'
+        assert rows[0][0] == 'CREATE TABLE vocab_tags (word_id INTEGER, tag_id INTEGER)'
+
+        crs.execute("SELECT sql FROM sqlite_schema WHERE name = 'tags'")
+        rows = crs.fetchall()
+        assert len(rows) == 1 and len(rows[0]) == 1
+        assert rows[0][0] == 'CREATE TABLE tags (tag TEXT NOT NULL UNIQUE)'
 
         crs.execute("SELECT sql FROM sqlite_schema WHERE name = 'kana'")
         rows = crs.fetchall()
@@ -54,6 +77,19 @@ def test_store_create_tables():
         assert len(rows) == 1 and len(rows[0]) == 1
         assert rows[0][0] == 'CREATE TABLE kana_notes (kana_id INTEGER, katakana_note TEXT, hiragana_note TEXT)'
 
+        # Confirm the secondary indexes declared in the table schemas were created
+        crs.execute("SELECT name, sql FROM sqlite_schema WHERE type = 'index' AND sql IS NOT NULL")
+        rows = {r[0]: r[1] for r in crs.fetchall()}
+        assert rows['vocab_notes_word_id_idx'] == 'CREATE INDEX vocab_notes_word_id_idx ON vocab_notes (word_id)'
+        assert rows['vocab_tags_word_id_tag_id_idx'] == \
+               'CREATE INDEX vocab_tags_word_id_tag_id_idx ON vocab_tags (word_id, tag_id)'
+        assert rows['vocab_tags_tag_id_idx'] == 'CREATE INDEX vocab_tags_tag_id_idx ON vocab_tags (tag_id)'
+        assert rows['kana_category_idx'] == 'CREATE INDEX kana_category_idx ON kana (category)'
+        assert rows['kana_notes_kana_id_idx'] == 'CREATE INDEX kana_notes_kana_id_idx ON kana_notes (kana_id)'
+
+    # Nothing is missing, so there are no indexes to add
+    assert create_indexes() == []
+
     return
 
 
@@ -114,10 +150,12 @@ def test_verify_vocab_tables():
     assert len(vocab_tag_rows) == 150
 
     # Assure rows in "vocab" are as expected
+    workbook = VocabWorkbook()
     for i, row in enumerate(vocab_rows):
         pos = ['pos-a', 'pos-b', 'pos-c', 'pos-d', None][i % 5]
         i += 1
-        assert row[1:] == (f'english {i}', f'romaji {i}', f'kana {i}', f'kanji {i}', pos, 0, 0, 0, 0)
+        assert row[1:-1] == (f'english {i}', f'romaji {i}', f'kana {i}', f'kanji {i}', pos, 0, 0, 0, 0)
+        assert row[-1] == workbook.word_map[f'kana {i}'].fingerprint
 
     # Assure rows in "vocab_notes" are as expected
     note_map = {r[0]: r[1] for r in vocab_notes_rows}
@@ -134,7 +172,8 @@ def test_verify_vocab_tables():
             word_idx = int(str(row[1]).split(' ')[-1])
             m = word_idx % 4
             if m:
-                crs.execute(f'SELECT * FROM vocab_tags WHERE word_id = {row[0]}')
+                crs.execute(f'SELECT vt.word_id, t.tag FROM vocab_tags AS vt JOIN tags AS t ON t._ROWID_ = vt.tag_id '
+                            f'WHERE vt.word_id = {row[0]}')
                 rows = crs.fetchall()
                 assert len(rows) == m
                 expected = [f'tag-{"abc"[i]}' for i in range(m)]
@@ -331,7 +370,8 @@ def _verify_changed_row(expected_vocab: list,
         if not note_ok:
             return False
 
-        crs.execute(f'SELECT * FROM vocab_tags WHERE word_id = {word_id}')
+        crs.execute(f'SELECT vt.word_id, t.tag FROM vocab_tags AS vt JOIN tags AS t ON t._ROWID_ = vt.tag_id '
+                    f'WHERE vt.word_id = {word_id} ORDER BY vt._ROWID_')
         rows = crs.fetchall()
         if expected_tags:
             for i, expected_tag in enumerate(expected_tags):
@@ -383,3 +423,472 @@ def test_update_database_verify_update():
                                expected_note='note 92', expected_tags=None)
 
     return
+
+
+def test_vocab_database():
+
+    database = VocabDatabase()
+
+    with CursorContextManager() as crs:
+        crs.execute('SELECT _ROWID_, english_w, romaji_w, kana_w, kanji_w, part_of_speech FROM vocab')
+        vocab_rows = crs.fetchall()
+        crs.execute('SELECT _ROWID_, word_id, note FROM vocab_notes')
+        note_rows = {r[1]: r for r in crs.fetchall()}
+        crs.execute('SELECT vt._ROWID_, vt.word_id, t.tag FROM vocab_tags AS vt JOIN tags AS t ON t._ROWID_ = vt.tag_id '
+                    'ORDER BY vt._ROWID_')
+        tag_rows = crs.fetchall()
+
+    assert len(database.words) == len(vocab_rows)
+    for row in vocab_rows:
+        db_word = database.word_map[row[3]]
+        assert (db_word.word_id, db_word.english, db_word.romaji, db_word.kana, db_word.kanji,
+                db_word.part_of_speech) == row
+        if row[0] in note_rows.keys():
+            assert (db_word.note.row_id, db_word.note.word_id, db_word.note.value) == note_rows[row[0]]
+        else:
+            assert db_word.note is None
+        expected_tags = [r for r in tag_rows if r[1] == row[0]]
+        if expected_tags:
+            assert [(t.row_id, t.word_id, t.value) for t in db_word.tags] == expected_tags
+        else:
+            assert db_word.tags is None
+
+    return
+
+
+def test_update_database_dry_run():
+
+    # By now the database holds the contents of test_vocabulary_update.numbers; planning a sync against the
+    # original test_vocabulary.numbers should report the changes that undo that update without applying them
+    with CursorContextManager() as crs:
+        crs.execute('SELECT _ROWID_, * FROM vocab')
+        vocab_before = crs.fetchall()
+
+    plan = update_database(dry_run=True).vocabulary
+
+    assert sorted([w.kana for w in plan.adds]) == ['kana 33', 'kana 45', 'kana 69']
+    assert sorted([w.kana for w in plan.deletes]) == ['NEW KANA 1', 'NEW KANA 2', 'NEW KANA 3']
+    updates = {u.wb_word.kana: u for u in plan.updates}
+    assert sorted(updates.keys()) == ['kana 10', 'kana 25', 'kana 38', 'kana 46', 'kana 51', 'kana 65', 'kana 76',
+                                      'kana 92']
+    assert updates['kana 38'].vocab_changed and updates['kana 38'].note_changed
+    assert updates['kana 38'].tags_added == ['tag-a']
+    assert sorted([t.value for t in updates['kana 38'].tags_deleted]) == ['tag-c', 'tag-d']
+    assert not updates['kana 65'].vocab_changed and not updates['kana 65'].note_changed
+    assert [t.value for t in updates['kana 65'].tags_deleted] == ['NEW-TAG-1']
+    assert str(plan).startswith('3 words to add, 3 words to delete, 8 words to update')
+
+    with CursorContextManager() as crs:
+        crs.execute('SELECT _ROWID_, * FROM vocab')
+        assert crs.fetchall() == vocab_before
+
+    return
+
+
+def _vocab_snapshot() -> dict[str, tuple]:
+
+    # Every word keyed by kana along with its note and set of tags; row ids are left out so that two databases
+    # with the same content compare equal
+    with CursorContextManager() as crs:
+        crs.execute('SELECT _ROWID_, * FROM vocab')
+        vocab_rows = crs.fetchall()
+        crs.execute('SELECT word_id, note FROM vocab_notes')
+        notes = {r[0]: r[1] for r in crs.fetchall()}
+        crs.execute('SELECT vt.word_id, t.tag FROM vocab_tags AS vt JOIN tags AS t ON t._ROWID_ = vt.tag_id')
+        tags: dict[int, set] = {}
+        for word_id, tag in crs.fetchall():
+            tags.setdefault(word_id, set()).add(tag)
+
+    return {r[3]: (r[1:], notes.get(r[0]), tags.get(r[0], set())) for r in vocab_rows}
+
+
+def test_update_database_in_sql():
+
+    original_vocab_spreadsheet_file = _files.vocab_spreadsheet
+    path = '/'.join(original_vocab_spreadsheet_file.split('/')[:-1])
+
+    # Give a word some quiz metrics; the sync must leave them alone
+    with CursorContextManager() as crs:
+        crs.execute('UPDATE vocab SET quizzed = 5, correct = 4 WHERE kana_w = "kana 10"')
+
+    # The database currently holds test_vocabulary_update.numbers; sync it back to test_vocabulary.numbers in
+    # SQL, then back again, comparing each time with what the Python change planner produces
+    for spreadsheet in ['test_vocabulary', 'test_vocabulary_update']:
+        _files.vocab_spreadsheet = f'{path}/{spreadsheet}.numbers'
+
+        expected = update_database(dry_run=True).vocabulary
+        assert update_database(in_sql=True).vocabulary is None
+
+        # Nothing should be left for the planner to do
+        assert update_database(dry_run=True).is_empty
+
+        snapshot = _vocab_snapshot()
+        assert all([w.kana in snapshot for w in expected.adds])
+        assert not any([w.kana in snapshot for w in expected.deletes])
+        assert snapshot['kana 10'][0][5:9] == (5, 4, 0, 0)
+
+    _files.vocab_spreadsheet = original_vocab_spreadsheet_file
+
+    return
+
+
+def test_sync_paths_agree(tmp_path):
+
+    # An empty note and a tag given twice are handled the same way by the Python and SQL syncs (and by populate):
+    # no vocab_notes row and one vocab_tags row
+    workbook = VocabWorkbook()
+    workbook.word_map['odd kana'] = VocabWorkbookRecord(['odd english', 'odd romaji', 'odd kana', None, 'noun',
+                                                         'tag-x; tag-y; tag-x', ''])
+
+    def odd_word_rows() -> tuple:
+        with CursorContextManager() as crs:
+            crs.execute('SELECT COUNT(*) FROM vocab_notes AS n JOIN vocab AS v ON v._ROWID_ = n.word_id '
+                        'WHERE v.kana_w = "odd kana"')
+            notes = crs.fetchall()[0][0]
+            crs.execute('SELECT t.tag FROM vocab_tags AS vt JOIN vocab AS v ON v._ROWID_ = vt.word_id '
+                        'JOIN tags AS t ON t._ROWID_ = vt.tag_id WHERE v.kana_w = "odd kana" ORDER BY t.tag')
+            return notes, [r[0] for r in crs.fetchall()]
+
+    original_database_file = _files.database
+    snapshots = []
+    try:
+        for name, sync in [('python', lambda: plan_vocabulary_changes(workbook).apply()),
+                           ('sql', lambda: _staging.sync_vocabulary(workbook)),
+                           ('populate', lambda: _impl._populate_vocabulary(workbook))]:
+            _files.database = str(tmp_path / f'{name}.sqlite3')
+            create_tables()
+            sync()
+            assert odd_word_rows() == (0, ['tag-x', 'tag-y'])
+            assert plan_vocabulary_changes(workbook).is_empty
+            snapshots.append(_vocab_snapshot())
+    finally:
+        _files.database = original_database_file
+
+    assert snapshots[1] == snapshots[0] and snapshots[2] == snapshots[0]
+
+    return
+
+
+def test_upgrade_tables():
+
+    # Start from a database in line with test_vocabulary.numbers
+    update_database()
+
+    # Words from before the vocab table had a fingerprint column have no fingerprint; a sync still compares
+    # them in full (and finds nothing to do) and upgrading the tables fingerprints them
+    with CursorContextManager() as crs:
+        crs.execute('SELECT kana_w, fingerprint FROM vocab')
+        fingerprints_before = dict(crs.fetchall())
+        crs.execute('UPDATE vocab SET fingerprint = NULL WHERE _ROWID_ % 2 = 0')
+
+    assert update_database(dry_run=True).is_empty
+    assert upgrade_tables() == []
+
+    with CursorContextManager() as crs:
+        crs.execute('SELECT kana_w, fingerprint FROM vocab')
+        assert dict(crs.fetchall()) == fingerprints_before
+
+    # Only the words whose fingerprints don't match the workbook are loaded in full
+    workbook = VocabWorkbook()
+    assert VocabDatabase(workbook).word_map == {}
+    with CursorContextManager() as crs:
+        crs.execute('UPDATE vocab SET fingerprint = "stale" WHERE kana_w = "kana 20"')
+    database = VocabDatabase(workbook)
+    assert list(database.word_map.keys()) == ['kana 20']
+    assert len(database.fingerprints) == len(workbook.words)
+    assert database.word_map['kana 20'].content_fingerprint() == workbook.word_map['kana 20'].fingerprint
+
+    plan = update_database()
+    assert plan.is_empty and plan.vocabulary.is_empty
+    assert VocabDatabase(workbook).word_map == {}
+
+    return
+
+
+def test_upgrade_tables_interns_tags():
+
+    # Start from a database in line with test_vocabulary.numbers and turn its tags back into the legacy layout,
+    # a vocab_tags table holding each tag's text and no tags table
+    update_database()
+    legacy_tag_rows = [
+        'CREATE TABLE vocab_tags_legacy (word_id INTEGER, tag TEXT)',
+        'INSERT INTO vocab_tags_legacy (_ROWID_, word_id, tag) SELECT vt._ROWID_, vt.word_id, t.tag '
+        'FROM vocab_tags AS vt JOIN tags AS t ON t._ROWID_ = vt.tag_id',
+        'DROP TABLE vocab_tags',
+        'DROP TABLE tags',
+        'ALTER TABLE vocab_tags_legacy RENAME TO vocab_tags',
+        'CREATE INDEX vocab_tags_word_id_idx ON vocab_tags (word_id)',
+    ]
+    with CursorContextManager() as crs:
+        crs.execute('SELECT vt._ROWID_, vt.word_id, t.tag FROM vocab_tags AS vt JOIN tags AS t ON t._ROWID_ = vt.tag_id '
+                    'ORDER BY vt._ROWID_')
+        tag_rows_before = crs.fetchall()
+        for stmt in legacy_tag_rows:
+            crs.execute(stmt)
+        # A tag left behind by a deleted word is dropped by the next sync
+        crs.execute('INSERT INTO vocab_tags (word_id, tag) VALUES (-1, "orphan")')
+
+    added = upgrade_tables()
+    assert added == ['tags', 'vocab_tags.tag_id']
+
+    # The legacy table and index are gone and tag rows keep their row ids and word ids
+    with CursorContextManager() as crs:
+        crs.execute("SELECT name FROM sqlite_schema WHERE name LIKE 'vocab_tags%' ORDER BY name")
+        assert [r[0] for r in crs.fetchall()] == ['vocab_tags', 'vocab_tags_tag_id_idx', 'vocab_tags_word_id_tag_id_idx']
+        crs.execute('SELECT vt._ROWID_, vt.word_id, t.tag FROM vocab_tags AS vt JOIN tags AS t ON t._ROWID_ = vt.tag_id '
+                    'WHERE vt.word_id <> -1 ORDER BY vt._ROWID_')
+        assert crs.fetchall() == tag_rows_before
+
+    with CursorContextManager() as crs:
+        crs.execute('DELETE FROM vocab_tags WHERE word_id = -1')
+    assert update_database(dry_run=True).is_empty
+    update_database(in_sql=True)
+    with CursorContextManager() as crs:
+        crs.execute('SELECT COUNT(*) FROM tags WHERE tag = "orphan"')
+        assert crs.fetchall()[0][0] == 0
+
+    return
+
+
+def test_populate_tables_pipelined(tmp_path, monkeypatch):
+
+    # Populate one fresh database the usual way and another through the pipeline, in chunks small enough that
+    # the parser has to wait for the writer; both should end up with the same content
+    original_database_file = _files.database
+    snapshots = []
+    try:
+        for name, pipelined in [('usual', False), ('pipelined', True)]:
+            _files.database = str(tmp_path / f'{name}.sqlite3')
+            create_tables()
+            monkeypatch.setattr(_pipeline, '_CHUNK_SIZE', 7)
+            monkeypatch.setattr(_pipeline, '_QUEUE_SIZE', 2)
+            populate_tables(pipelined=pipelined)
+            snapshots.append(_vocab_snapshot())
+
+        assert len(snapshots[1]) == 100
+        assert snapshots[1] == snapshots[0]
+
+        # A spreadsheet that can't be parsed leaves nothing behind
+        _files.database = str(tmp_path / 'failed.sqlite3')
+        create_tables()
+        with pytest.raises(FileError):
+            _pipeline.populate_vocabulary(str(tmp_path / 'no_such_spreadsheet.numbers'))
+        with CursorContextManager() as crs:
+            crs.execute('SELECT COUNT(*) FROM vocab')
+            assert crs.fetchall()[0][0] == 0
+    finally:
+        _files.database = original_database_file
+
+    return
+
+
+def test_update_kana():
+
+    def kana_rows() -> dict[str, tuple]:
+        with CursorContextManager() as crs:
+            crs.execute('SELECT k.romaji, k.hiragana, k.katakana, k.category, k.quizzed, k.correct, '
+                        'n.katakana_note, n.hiragana_note '
+                        'FROM kana AS k LEFT JOIN kana_notes AS n ON n.kana_id = k._ROWID_')
+            return {r[0]: r[1:] for r in crs.fetchall()}
+
+    # Nothing to do while the database matches the kana workbook
+    assert plan_kana_changes().is_empty
+    before = kana_rows()
+
+    # Make some changes to (an in-memory copy of) the kana workbook
+    workbook = KanaWorkbook()
+    basic = [k for k in workbook.kana.values() if k.category == 'Basic' and k.romaji != 'n/m']
+    other = [k for k in workbook.kana.values() if k.category != 'Basic']
+    basic[0]._row[4] = 'A NEW HIRAGANA NOTE'
+    other[0]._row[2] = 'NEW KATAKANA'
+    other[1]._row[4], other[1]._row[5] = 'A NOTE', 'ANOTHER NOTE'
+    deleted = basic[1].romaji
+    del workbook.kana[deleted]
+    workbook.kana['new romaji'] = KanaWorkbookRecord(['new romaji', 'h', 'k', 'Dakuten', None, None])
+
+    # The quiz metrics of changed characters are kept
+    with CursorContextManager() as crs:
+        crs.execute('UPDATE kana SET quizzed = 3, correct = 2 WHERE romaji IN (?, ?)',
+                    (basic[0].romaji, other[0].romaji))
+
+    plan = plan_kana_changes(workbook)
+    assert [k.romaji for k in plan.adds] == ['new romaji']
+    assert [k.romaji for k in plan.deletes] == [deleted]
+    updates = {u.wb_kana.romaji: u for u in plan.updates}
+    assert sorted(updates.keys()) == sorted([basic[0].romaji, other[0].romaji, other[1].romaji])
+    assert updates[basic[0].romaji].note_changed and not updates[basic[0].romaji].kana_changed
+    assert updates[other[0].romaji].kana_changed and not updates[other[0].romaji].note_changed
+    assert str(plan).startswith('1 kana to add, 1 kana to delete, 3 kana to update')
+    plan.apply()
+
+    after = kana_rows()
+    assert plan_kana_changes(workbook).is_empty
+    assert deleted not in after
+    assert after['new romaji'] == ('h', 'k', 'Dakuten', 0, 0, None, None)
+    assert after[basic[0].romaji] == before[basic[0].romaji][:3] + (3, 2, 'A NEW HIRAGANA NOTE',
+                                                                     before[basic[0].romaji][-1])
+    assert after[other[0].romaji] == (before[other[0].romaji][0], 'NEW KATAKANA') + before[other[0].romaji][2:3] + \
+           (3, 2, None, None)
+    assert after[other[1].romaji][-2:] == ('A NOTE', 'ANOTHER NOTE')
+
+    # update_database() puts the kana tables back in line with the workbook, keeping the metrics
+    update_database()
+    assert plan_kana_changes().is_empty
+    after = kana_rows()
+    assert after[basic[0].romaji] == before[basic[0].romaji][:3] + (3, 2) + before[basic[0].romaji][-2:]
+    assert sorted(after.keys()) == sorted(before.keys())
+
+    return
+
+
+def test_populate_kana_without_notes(tmp_path):
+
+    # A Basic kana with neither a hiragana nor a katakana note gets a kana row but no kana_notes row, and a
+    # sync finds nothing to change afterwards
+    workbook = KanaWorkbook()
+    workbook.kana['no notes'] = KanaWorkbookRecord(['no notes', 'h', 'k', 'Basic', None, None])
+
+    original_database_file = _files.database
+    try:
+        _files.database = str(tmp_path / 'kana.sqlite3')
+        create_tables()
+        _impl._populate_kana(workbook)
+        with CursorContextManager() as crs:
+            crs.execute('SELECT k.category, n._ROWID_ FROM kana AS k LEFT JOIN kana_notes AS n ON n.kana_id = k._ROWID_ '
+                        'WHERE k.romaji = "no notes"')
+            assert crs.fetchall() == [('Basic', None)]
+        assert plan_kana_changes(workbook).is_empty
+    finally:
+        _files.database = original_database_file
+
+    return
+
+
+def test_update_database_dry_run_kana():
+
+    # Take the database out of line with the kana workbook; a dry run reports the kana changes along with the
+    # (empty) vocabulary plan without applying either
+    assert update_database(dry_run=True).is_empty
+    with CursorContextManager() as crs:
+        crs.execute('SELECT romaji FROM kana ORDER BY _ROWID_ LIMIT 2')
+        changed, deleted = [r[0] for r in crs.fetchall()]
+        crs.execute('UPDATE kana SET katakana = "CHANGED" WHERE romaji = ?', (changed,))
+        crs.execute('DELETE FROM kana WHERE romaji = ?', (deleted,))
+        crs.execute('INSERT INTO kana (romaji, hiragana, katakana, category, quizzed, correct, consecutive_correct, '
+                    'consecutive_incorrect) VALUES ("extra romaji", "h", "k", "Basic", 0, 0, 0, 0)')
+        crs.execute('SELECT _ROWID_, * FROM kana')
+        kana_before = crs.fetchall()
+
+    plan = update_database(dry_run=True)
+
+    assert not plan.is_empty
+    assert plan.vocabulary.is_empty
+    assert [k.romaji for k in plan.kana.adds] == [deleted]
+    assert [k.romaji for k in plan.kana.deletes] == ['extra romaji']
+    assert [(u.wb_kana.romaji, u.kana_changed, u.note_changed) for u in plan.kana.updates] == [(changed, True, False)]
+    assert str(plan).startswith('1 kana to add, 1 kana to delete, 1 kana to update')
+
+    with CursorContextManager() as crs:
+        crs.execute('SELECT _ROWID_, * FROM kana')
+        assert crs.fetchall() == kana_before
+
+    # Applying the plan puts the kana back
+    assert update_database().kana.updates
+    assert update_database(dry_run=True).is_empty
+
+    return
+
+
+def test_backups(tmp_path):
+
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    backup_path = data_path / 'backups'
+    database = data_path / 'words.sqlite3'
+    spreadsheet = data_path / 'words.numbers'
+    with sqlite3.connect(database) as connection:
+        connection.execute('CREATE TABLE words (word TEXT)')
+    connection.close()
+    spreadsheet.write_bytes(b'version 1')
+
+    assert _backups.backup(str(data_path), 't1', keep=2) == ['words-t1.numbers.xz', 'words-t1.sqlite3.xz']
+
+    # Nothing has changed, so nothing is backed up; touching a file without changing it doesn't make a backup either
+    assert _backups.backup(str(data_path), 't2', keep=2) == []
+    os.utime(spreadsheet, ns=(0, 0))
+    assert _backups.backup(str(data_path), 't3', keep=2) == []
+    assert _backups.read_manifest(str(backup_path))['files']['words.numbers'][-1]['mtime'] == 0
+
+    # Content that has been backed up before is hard linked to the copy already in the store
+    spreadsheet.write_bytes(b'version 2')
+    assert _backups.backup(str(data_path), 't4', keep=2) == ['words-t4.numbers.xz']
+    spreadsheet.write_bytes(b'version 1')
+    assert _backups.backup(str(data_path), 't5', keep=2, compression='gz') == ['words-t5.numbers.gz']
+    manifest = _backups.read_manifest(str(backup_path))
+    assert os.path.samefile(backup_path / 'words-t5.numbers.gz', backup_path / manifest['files']['words.numbers'][-1]['object'])
+
+    # Only the newest two backups of each file are kept, and objects no backup refers to are removed
+    assert [e['file'] for e in manifest['files']['words.numbers']] == ['words-t4.numbers.xz', 'words-t5.numbers.gz']
+    assert [e['file'] for e in manifest['files']['words.sqlite3']] == ['words-t1.sqlite3.xz']
+    assert len(list((backup_path / 'objects').glob('*/*'))) == 3
+    assert sorted(p.name for p in backup_path.glob('words-*')) == \
+           ['words-t1.sqlite3.xz', 'words-t4.numbers.xz', 'words-t5.numbers.gz']
+
+    # Backups are compressed and restore to what was backed up
+    _backups.restore(str(backup_path / 'words-t4.numbers.xz'), str(tmp_path / 'restored.numbers'))
+    assert (tmp_path / 'restored.numbers').read_bytes() == b'version 2'
+    _backups.restore(str(backup_path / 'words-t5.numbers.gz'), str(tmp_path / 'restored.numbers'))
+    assert (tmp_path / 'restored.numbers').read_bytes() == b'version 1'
+    _backups.restore(str(backup_path / 'words-t1.sqlite3.xz'), str(tmp_path / 'restored.sqlite3'))
+    with sqlite3.connect(tmp_path / 'restored.sqlite3') as connection:
+        assert connection.execute('SELECT name FROM sqlite_schema').fetchall() == [('words',)]
+    connection.close()
+
+    return
+
+
+def test_backup_worker(tmp_path):
+
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    backup_path = data_path / 'backups'
+    database = data_path / 'words.sqlite3'
+    with sqlite3.connect(database) as connection:
+        connection.execute('CREATE TABLE words (word TEXT)')
+        connection.execute("INSERT INTO words VALUES ('before')")
+    connection.close()
+
+    # A job snapshots the database when it is made, so changes made before the worker gets to it aren't backed up
+    worker = _backups.BackupWorker()
+    finished = []
+    job = _backups.BackupJob(str(data_path), 't1', keep=2, on_done=finished.append)
+    with sqlite3.connect(database) as connection:
+        connection.execute("UPDATE words SET word = 'after'")
+    connection.close()
+    assert worker.submit(job) is job
+    assert job.wait(timeout=30) == ['words-t1.sqlite3.xz']
+    assert job.done and finished == [job]
+    assert [p.name for p in (backup_path / 'objects').glob('*.snapshot')] == []
+
+    _backups.restore(str(backup_path / 'words-t1.sqlite3.xz'), str(tmp_path / 'restored.sqlite3'))
+    with sqlite3.connect(tmp_path / 'restored.sqlite3') as connection:
+        assert connection.execute('SELECT word FROM words').fetchall() == [('before',)]
+    connection.close()
+
+    # A job that fails reports the failure rather than taking the worker down with it
+    spreadsheet = data_path / 'words.numbers'
+    spreadsheet.write_bytes(b'version 1')
+    failing = _backups.BackupJob(str(data_path), 't2', keep=2)
+    spreadsheet.unlink()
+    worker.submit(failing)
+    with pytest.raises(FileNotFoundError):
+        failing.wait(timeout=30)
+
+    # The database changed after the first job snapshotted it, so the next job backs it up again
+    assert worker.submit(_backups.BackupJob(str(data_path), 't3', keep=2)).wait(timeout=30) == ['words-t3.sqlite3.xz']
+    worker.wait()
+
+    with pytest.raises(ValueError):
+        _backups.BackupJob(str(data_path), 't4', keep=2, compression='zip')
+
+    return